@@ -1,11 +1,195 @@
-# Esta es una base de datos en memoria (un simple dict).
-# En producción, reemplaza esto con una conexión a Redis.
-db = {
-    # Almacenará los tokens mágicos generados
-    # "usuario@email.com": {
-    #     "token_hash": "hash_del_token",
-    #     "expires": "datetime_de_expiracion",
-    #     "used": False
-    # }
-    "magic_tokens": {}
-}
+import json
+import os
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+try:
+    import redis
+except ImportError:  # Solo hace falta con TOKEN_STORE_URL=redis://...
+    redis = None
+
+load_dotenv()
+
+# URL del almacén de tokens. Vacía = en memoria (solo sirve con un worker).
+# Con varios workers de uvicorn usa Redis, ej. "redis://:password@localhost:6379/0"
+# (o "rediss://..." con TLS)
+TOKEN_STORE_URL = os.getenv("TOKEN_STORE_URL", "")
+# Conexiones a Redis por worker como máximo
+TOKEN_STORE_MAX_CONNECTIONS = int(os.getenv("TOKEN_STORE_MAX_CONNECTIONS", 10))
+# Cada cuántos segundos el barrendero borra los tokens vencidos de la memoria
+TOKEN_STORE_SWEEP_INTERVAL = float(os.getenv("TOKEN_STORE_SWEEP_INTERVAL", 60))
+
+
+class TokenStore(ABC):
+    """
+    Almacén clave/valor con vencimiento para los tokens mágicos.
+    Los valores son dicts serializables a JSON, por ejemplo:
+    "magic_token:usuario@email.com": {"token_hash": "...", "expires": 1735689600.0}
+    """
+
+    @abstractmethod
+    def set(self, key: str, value: dict, ttl: float):
+        """Guarda 'value' y lo borra a los 'ttl' segundos."""
+
+    @abstractmethod
+    def add(self, key: str, value: dict, ttl: float) -> bool:
+        """Como set() pero solo si la clave no existe. Devuelve si la guardó."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[dict]:
+        """El valor guardado, o None si no existe o ya venció."""
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """Borra la clave. Devuelve si existía."""
+
+    def close(self):
+        pass
+
+
+class InMemoryTokenStore(TokenStore):
+    """
+    Almacén en memoria del proceso. Las claves se reparten en 'stripes'
+    (cada una con su propio lock) para que los hilos no compitan por un solo
+    lock, y un hilo de fondo borra las entradas vencidas.
+    """
+
+    def __init__(self, stripes: int = 16, sweep_interval: float = TOKEN_STORE_SWEEP_INTERVAL):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._shards: List[dict] = [{} for _ in range(stripes)]  # clave -> (vence, json)
+        self._stop = threading.Event()
+
+        if sweep_interval > 0:
+            threading.Thread(
+                target=self._sweep_forever,
+                args=(sweep_interval,),
+                name="token-store-sweeper",
+                daemon=True,
+            ).start()
+
+    def _stripe(self, key: str) -> int:
+        return zlib.crc32(key.encode()) % len(self._shards)
+
+    def set(self, key: str, value: dict, ttl: float):
+        i = self._stripe(key)
+        # Se guarda serializado para que nadie modifique el valor guardado
+        # por referencia (igual que en Redis)
+        with self._locks[i]:
+            self._shards[i][key] = (time.monotonic() + ttl, json.dumps(value))
+
+    def add(self, key: str, value: dict, ttl: float) -> bool:
+        i = self._stripe(key)
+        with self._locks[i]:
+            entry = self._shards[i].get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return False
+            self._shards[i][key] = (time.monotonic() + ttl, json.dumps(value))
+            return True
+
+    def get(self, key: str) -> Optional[dict]:
+        i = self._stripe(key)
+        with self._locks[i]:
+            entry = self._shards[i].get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._shards[i][key]
+                return None
+        return json.loads(value)
+
+    def delete(self, key: str) -> bool:
+        i = self._stripe(key)
+        with self._locks[i]:
+            entry = self._shards[i].pop(key, None)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def sweep(self) -> int:
+        """Borra las entradas vencidas, una stripe a la vez. Devuelve cuántas."""
+        removed = 0
+        for lock, shard in zip(self._locks, self._shards):
+            now = time.monotonic()
+            with lock:
+                expired = [key for key, (expires, _) in shard.items() if expires <= now]
+                for key in expired:
+                    del shard[key]
+            removed += len(expired)
+        return removed
+
+    def _sweep_forever(self, interval: float):
+        while not self._stop.wait(interval):
+            self.sweep()
+
+    def close(self):
+        self._stop.set()
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+
+class RedisTokenStore(TokenStore):
+    """
+    Almacén en Redis. Lo comparten todos los workers, así un token emitido
+    por uno se puede verificar en otro. Acepta redis:// y rediss:// (TLS).
+    Usa un pool acotado: con todas las conexiones prestadas, la siguiente
+    espera hasta 'timeout' segundos en vez de abrir una más.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        timeout: float = 5,
+        key_prefix: str = "etl-api:",
+        max_connections: int = TOKEN_STORE_MAX_CONNECTIONS,
+    ):
+        if redis is None:
+            raise RuntimeError("TOKEN_STORE_URL usa Redis pero falta el paquete redis")
+
+        self.key_prefix = key_prefix
+        self.pool = redis.BlockingConnectionPool.from_url(
+            url,
+            max_connections=max_connections,
+            timeout=timeout,
+            socket_timeout=timeout,
+            socket_connect_timeout=timeout,
+        )
+        self.client = redis.Redis(connection_pool=self.pool)
+
+    def _key(self, key: str) -> str:
+        return f"{self.key_prefix}{key}"
+
+    def set(self, key: str, value: dict, ttl: float):
+        self.client.set(self._key(key), json.dumps(value), px=max(int(ttl * 1000), 1))
+
+    def add(self, key: str, value: dict, ttl: float) -> bool:
+        stored = self.client.set(
+            self._key(key), json.dumps(value), px=max(int(ttl * 1000), 1), nx=True
+        )
+        return bool(stored)
+
+    def get(self, key: str) -> Optional[dict]:
+        value = self.client.get(self._key(key))
+        return None if value is None else json.loads(value)
+
+    def delete(self, key: str) -> bool:
+        return self.client.delete(self._key(key)) > 0
+
+    def close(self):
+        self.pool.disconnect()
+
+
+def create_token_store(url: str = TOKEN_STORE_URL) -> TokenStore:
+    if url.startswith(("redis://", "rediss://")):
+        return RedisTokenStore(url)
+    if url and url != "memory://":
+        raise ValueError(f"TOKEN_STORE_URL no soportada: {url}")
+    return InMemoryTokenStore()
+
+
+# Almacén de tokens mágicos de la aplicación
+token_store = create_token_store()
@@ -1,23 +1,68 @@
 import os
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Optional
 from dotenv import load_dotenv
-from fastapi import FastAPI, Depends, HTTPException, Security, status
-from fastapi.security import APIKeyHeader
-from pydantic import BaseModel, EmailStr, Field
+import hmac
+from fastapi import FastAPI, Depends, Header, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import EmailStr
 from .services.auth import create_magic_token, verify_magic_token, get_current_user
-from .services.email import send_magic_link_email
+from .services.email import (
+    enqueue_magic_link_email,
+    start_email_dispatcher,
+    stop_email_dispatcher,
+)
 from .schemas import TokenResponse, LogInData
-from .services.snowflake import get_snowflake_b2b_vs_b2c_deals
+from .services.cache import invalidate_query_cache
+from .services.metrics import (
+    CONTENT_TYPE,
+    PrometheusMiddleware,
+    is_metrics_request_allowed,
+    render_metrics,
+)
+from .services.snowflake import (
+    aget_snowflake_b2b_vs_b2c_deals,
+    get_snowflake_deals_by_day,
+    get_snowflake_deals_by_segment,
+    get_snowflake_deals_by_stage,
+    get_snowflake_leads_by_status,
+    run_query,
+    init_snowflake_pool,
+    close_snowflake_pool,
+    init_query_executor,
+    shutdown_query_executor,
+)
 
 load_dotenv()
 
 API_NAME = os.getenv("API_NAME")
 BASE_API_DOMAIN = os.getenv("BASE_API_DOMAIN")
+# Secreto compartido con el ETL para avisar que terminó una carga
+CACHE_INVALIDATION_TOKEN = os.getenv("CACHE_INVALIDATION_TOKEN")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Las conexiones a Snowflake se abren a demanda y se reutilizan entre requests
+    init_snowflake_pool()
+    # Las consultas corren en hilos aparte para no bloquear el event loop
+    init_query_executor()
+    # Los emails se mandan desde un hilo de fondo con una sesión SMTP reutilizada
+    start_email_dispatcher()
+    yield
+    stop_email_dispatcher()
+    shutdown_query_executor()
+    close_snowflake_pool()
 
 
 app = FastAPI(
     title=API_NAME,
     description="Una API simple para recibir datos de Snowflake.",
+    lifespan=lifespan,
 )
+# Latencia de cada request por ruta y status (se expone en GET /metrics)
+app.add_middleware(PrometheusMiddleware)
 
 
 @app.get("/")
@@ -32,11 +77,13 @@ async def login(
     login_data: LogInData,
 ):
     try:
-        magic_token = create_magic_token(login_data.email)
+        # El almacén de tokens puede ir a Redis: no se bloquea el event loop
+        magic_token = await run_in_threadpool(create_magic_token, login_data.email)
 
         magic_link = f"{BASE_API_DOMAIN}/verify-login?token={magic_token}&email={login_data.email}"
 
-        send_magic_link_email(email_to=login_data.email, magic_link=magic_link)
+        # Solo se encola: la respuesta no espera al servidor SMTP
+        enqueue_magic_link_email(email_to=login_data.email, magic_link=magic_link)
 
         return {
             "message": "Si tu email está registrado, recibirás un enlace de inicio de sesión."
@@ -55,7 +102,7 @@ async def login(
     tags=["Autenticación"],
 )
 async def verify_login(token: str, email: EmailStr):
-    return verify_magic_token(email, token)
+    return await run_in_threadpool(verify_magic_token, email, token)
 
 
 @app.get("/users/me")
@@ -65,6 +112,57 @@ async def read_users_me(current_user: str = Depends(get_current_user)):
 
 
 @app.get("/metrics/snowflake/deals/b2b-vs-b2c")
-async def read_users_me(current_user: str = Depends(get_current_user)):
-    result = get_snowflake_b2b_vs_b2c_deals()
+async def read_b2b_vs_b2c_deals(current_user: str = Depends(get_current_user)):
+    result = await aget_snowflake_b2b_vs_b2c_deals()
     return result
+
+
+@app.get("/metrics/snowflake/deals/by-segment")
+async def read_deals_by_segment(current_user: str = Depends(get_current_user)):
+    """Cantidad y monto de deals B2B (con empresa asociada) y B2C."""
+    return await run_query(get_snowflake_deals_by_segment)
+
+
+@app.get("/metrics/snowflake/deals/by-stage")
+async def read_deals_by_stage(current_user: str = Depends(get_current_user)):
+    return await run_query(get_snowflake_deals_by_stage)
+
+
+@app.get("/metrics/snowflake/deals/by-day")
+async def read_deals_by_day(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: str = Depends(get_current_user),
+):
+    """Deals creados por día. 'start' y 'end' (YYYY-MM-DD) son opcionales."""
+    return await run_query(
+        get_snowflake_deals_by_day,
+        start.isoformat() if start else None,
+        end.isoformat() if end else None,
+    )
+
+
+@app.get("/metrics/snowflake/leads/by-status")
+async def read_leads_by_status(current_user: str = Depends(get_current_user)):
+    return await run_query(get_snowflake_leads_by_status)
+
+
+@app.get("/metrics", include_in_schema=False)
+def read_prometheus_metrics(authorization: str = Header(default="")):
+    """Métricas de este proceso en formato Prometheus (latencias, pool, cachés)."""
+    if not is_metrics_request_allowed(authorization):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
+
+@app.post("/internal/cache/invalidate", include_in_schema=False)
+async def invalidate_cache(x_etl_token: str = Header(default="")):
+    """El ETL llama a este endpoint al terminar una carga para vaciar el caché."""
+    if not CACHE_INVALIDATION_TOKEN or not hmac.compare_digest(
+        x_etl_token, CACHE_INVALIDATION_TOKEN
+    ):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+
+    invalidate_query_cache()
+    return {"status": "Caché invalidado."}
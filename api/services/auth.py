@@ -1,14 +1,19 @@
+import hashlib
+import hmac
 import os
 import secrets
+import time
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+import jwt
 from passlib.context import CryptContext
 from pydantic import EmailStr
 
-from ..database import db
+from ..database import token_store
+from .cache import jwt_cache
+from .metrics import jwt_verify_duration, magic_token_verify_duration
 from ..schemas import TokenResponse
 
 load_dotenv()
@@ -18,14 +23,17 @@ JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM")
 JWT_ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
-# --- Configuración de Hashing (para el Magic Token) ---
-# Usamos bcrypt para hashear el magic token en la DB
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+MAGIC_TOKEN_EXPIRE_MINUTES = 15
 
+# --- Configuración de Hashing (para el Magic Token) ---
+# El magic token son 256 bits aleatorios: no hace falta un KDF lento como
+# bcrypt, alcanza con un HMAC-SHA256 con clave. Se guarda como
+# "hmac-sha256$<hex>" para distinguirlo de los hashes bcrypt anteriores.
+MAGIC_TOKEN_SECRET = os.getenv("MAGIC_TOKEN_SECRET") or JWT_SECRET_KEY
+MAGIC_TOKEN_HASH_PREFIX = "hmac-sha256$"
 
-def get_password_hash(password: str) -> str:
-    """Hashea una contraseña (o token) usando bcrypt."""
-    return pwd_context.hash(password)
+# bcrypt solo se usa para verificar los hashes guardados antes del cambio
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -33,6 +41,30 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def hash_magic_token(token: str) -> str:
+    """Digest HMAC-SHA256 del magic token (rápido, no bloquea el event loop)."""
+    if not MAGIC_TOKEN_SECRET:
+        raise RuntimeError("Falta MAGIC_TOKEN_SECRET (o JWT_SECRET_KEY) en .env")
+
+    digest = hmac.new(
+        MAGIC_TOKEN_SECRET.encode(), token.encode(), hashlib.sha256
+    ).hexdigest()
+    return f"{MAGIC_TOKEN_HASH_PREFIX}{digest}"
+
+
+def verify_magic_token_hash(token: str, token_hash: str) -> bool:
+    """
+    Compara en tiempo constante. Los hashes bcrypt guardados antes del cambio
+    se siguen aceptando: los tokens son de un solo uso y vencen en 15 minutos,
+    así que desaparecen solos.
+    """
+    if token_hash.startswith(MAGIC_TOKEN_HASH_PREFIX):
+        with magic_token_verify_duration.labels(scheme="hmac").time():
+            return hmac.compare_digest(hash_magic_token(token), token_hash)
+    with magic_token_verify_duration.labels(scheme="bcrypt").time():
+        return verify_password(token, token_hash)
+
+
 # --- Lógica de JWT ---
 
 # OAuth2PasswordBearer es una clase de FastAPI que "sabe"
@@ -55,6 +87,31 @@ def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     return encoded_jwt
 
 
+def decode_access_token(token: str) -> dict:
+    """
+    Verifica el JWT y devuelve su payload. Un dashboard manda el mismo token
+    muchas veces por minuto: después de verificarlo una vez se recuerda hasta
+    su 'exp'. Lanza jwt.InvalidTokenError si no es válido.
+    """
+    start = time.perf_counter()
+    payload = jwt_cache.get(token)
+    if payload is not None:
+        jwt_verify_duration.labels(cached="true").observe(time.perf_counter() - start)
+        return payload
+
+    try:
+        payload = jwt.decode(
+            token,
+            JWT_SECRET_KEY,
+            algorithms=[JWT_ALGORITHM],
+            options={"require": ["exp"]},
+        )
+    finally:
+        jwt_verify_duration.labels(cached="false").observe(time.perf_counter() - start)
+    jwt_cache.set(token, payload)
+    return payload
+
+
 # --- El "Middleware" de Seguridad (como una Dependencia) ---
 
 
@@ -70,7 +127,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        payload = decode_access_token(token)
 
         # 'sub' (subject) es el nombre estándar para el identificador del usuario
         email: str = payload.get("sub")
@@ -81,44 +138,60 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
         # Por ahora, solo devolvemos el email
         return email
 
-    except JWTError:
+    except jwt.InvalidTokenError:
         raise credentials_exception
 
 
+def magic_token_key(email: EmailStr) -> str:
+    return f"magic_token:{email}"
+
+
+def magic_token_used_key(email: EmailStr) -> str:
+    return f"magic_token:{email}:used"
+
+
 def create_magic_token(email: EmailStr) -> str:
 
     magic_token = secrets.token_urlsafe(32)
-    token_hash = get_password_hash(magic_token)
-    expires = datetime.now(timezone.utc) + timedelta(minutes=15)
-
-    db["magic_tokens"][email] = {
-        "token_hash": token_hash,
-        "expires": expires,
-        "used": False,
-    }
+    token_hash = hash_magic_token(magic_token)
+    expires_delta = timedelta(minutes=MAGIC_TOKEN_EXPIRE_MINUTES)
+    expires = datetime.now(timezone.utc) + expires_delta
+
+    # El almacén borra el token solo cuando vence
+    token_store.set(
+        magic_token_key(email),
+        {"token_hash": token_hash, "expires": expires.timestamp()},
+        ttl=expires_delta.total_seconds(),
+    )
+    # Un enlace nuevo reemplaza al anterior, aunque ya se haya usado
+    token_store.delete(magic_token_used_key(email))
 
     return magic_token
 
 
 def verify_magic_token(email: EmailStr, token: str) -> TokenResponse:
 
-    token_data = db["magic_tokens"].get(email)
+    token_data = token_store.get(magic_token_key(email))
 
     if not token_data:
         raise HTTPException(
             status_code=404, detail="Email no encontrado o token no solicitado"
         )
 
-    if token_data["used"]:
+    if token_store.get(magic_token_used_key(email)):
         raise HTTPException(status_code=400, detail="Este enlace ya fue utilizado")
 
-    if token_data["expires"] < datetime.now(timezone.utc):
+    remaining = token_data["expires"] - datetime.now(timezone.utc).timestamp()
+    if remaining <= 0:
         raise HTTPException(status_code=400, detail="El enlace ha expirado")
 
-    if not verify_password(token, token_data["token_hash"]):
+    if not verify_magic_token_hash(token, token_data["token_hash"]):
         raise HTTPException(status_code=400, detail="Token inválido")
 
-    token_data["used"] = True
+    # Marcarlo como usado es atómico (set-if-absent): si dos workers verifican
+    # el mismo enlace a la vez, solo uno entrega el JWT
+    if not token_store.add(magic_token_used_key(email), {"used": True}, ttl=remaining):
+        raise HTTPException(status_code=400, detail="Este enlace ya fue utilizado")
 
     expires_delta = timedelta(minutes=JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
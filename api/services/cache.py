@@ -0,0 +1,238 @@
+import functools
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from dotenv import load_dotenv
+
+from .metrics import cache_requests
+
+load_dotenv()
+
+# --- Configuración del caché de resultados ---
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", 300))
+QUERY_CACHE_MAXSIZE = int(os.getenv("QUERY_CACHE_MAXSIZE", 128))
+# Archivo que se reescribe en cada invalidación. Cada worker de uvicorn tiene
+# su propio caché: al ver que el archivo cambió, vacía el suyo.
+QUERY_CACHE_STAMP_FILE = os.getenv(
+    "QUERY_CACHE_STAMP_FILE", os.path.join(tempfile.gettempdir(), "etl_api_query_cache.stamp")
+)
+# JWT ya verificados que se recuerdan (uno por sesión activa)
+JWT_CACHE_MAXSIZE = int(os.getenv("JWT_CACHE_MAXSIZE", 1024))
+
+
+class _InFlight:
+    """Un cálculo en curso que otros hilos pueden esperar."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Caché en memoria con vencimiento (TTL) y desalojo LRU.
+    Si varios hilos piden la misma clave que no está en caché, solo uno
+    calcula el resultado y el resto espera ese mismo resultado (single-flight).
+    Con 'stamp_path' invalidate() avisa a los cachés de los otros procesos,
+    que se vacían en su próxima búsqueda.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = QUERY_CACHE_MAXSIZE,
+        ttl: float = QUERY_CACHE_TTL,
+        name: str = "query",
+        stamp_path: Optional[str] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Etiqueta "cache" de cache_requests_total
+        self.name = name
+        self._entries = OrderedDict()  # clave -> (vence, valor)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        # Sube con cada invalidación: un cálculo que empezó antes no se guarda
+        self._generation = 0
+        self.stamp_path = stamp_path
+        self._stamp = self._read_stamp()
+
+    def get_or_compute(
+        self, key: Hashable, compute: Callable[[], Any], should_cache=None
+    ) -> Any:
+        with self._lock:
+            self._sync_stamp()
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    cache_requests.labels(cache=self.name, result="hit").inc()
+                    return value
+                del self._entries[key]
+
+            inflight = self._inflight.get(key)
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight[key] = _InFlight()
+                generation = self._generation
+
+        cache_requests.labels(
+            cache=self.name, result="miss" if leader else "shared"
+        ).inc()
+        if not leader:
+            inflight.done.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            return inflight.result
+
+        try:
+            inflight.result = compute()
+        except BaseException as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if (
+                    inflight.error is None
+                    and generation == self._generation
+                    and (should_cache is None or should_cache(inflight.result))
+                ):
+                    self._set(key, inflight.result)
+            inflight.done.set()
+
+        return inflight.result
+
+    def _set(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Borra todo el caché de este proceso."""
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._entries.clear()
+        self._generation += 1
+
+    def invalidate(self):
+        """
+        Borra el caché de este proceso y reescribe 'stamp_path' para que los
+        demás procesos borren el suyo (ej. cuando el ETL terminó de cargar).
+        """
+        with self._lock:
+            self._clear()
+            if self.stamp_path:
+                # Reemplazo atómico: el archivo nuevo siempre es otro inodo
+                tmp_path = f"{self.stamp_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    f.write(str(time.time_ns()))
+                os.replace(tmp_path, self.stamp_path)
+                self._stamp = self._read_stamp()
+
+    def _read_stamp(self):
+        if not self.stamp_path:
+            return None
+        try:
+            info = os.stat(self.stamp_path)
+        except OSError:
+            return None
+        return info.st_ino, info.st_mtime_ns
+
+    def _sync_stamp(self):
+        """Si otro proceso invalidó desde la última búsqueda, vacía este caché."""
+        if not self.stamp_path:
+            return
+        stamp = self._read_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self._clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Caché compartido por las consultas a Snowflake (y entre workers, vía el archivo)
+query_cache = TTLCache(stamp_path=QUERY_CACHE_STAMP_FILE)
+
+
+def is_cacheable(result: Any) -> bool:
+    """Los errores ({"error": ...}) no se guardan: la próxima request reintenta."""
+    return not (isinstance(result, dict) and "error" in result)
+
+
+def cached_query(func):
+    """Decorador que guarda en 'query_cache' el resultado de una consulta."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__qualname__, args, tuple(sorted(kwargs.items())))
+        return query_cache.get_or_compute(
+            key, lambda: func(*args, **kwargs), should_cache=is_cacheable
+        )
+
+    return wrapper
+
+
+def invalidate_query_cache():
+    query_cache.invalidate()
+
+
+class VerifiedTokenCache:
+    """
+    LRU de JWT ya verificados -> payload. Cada entrada vence en el 'exp' del
+    token, así un token vencido nunca se acepta desde el caché. La clave es el
+    SHA-256 del token para no guardar los tokens en memoria tal cual.
+    """
+
+    def __init__(self, maxsize: int = JWT_CACHE_MAXSIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # digest -> (exp, payload)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                cache_requests.labels(cache="jwt", result="miss").inc()
+                return None
+            self._entries.move_to_end(key)
+        cache_requests.labels(cache="jwt", result="hit").inc()
+        return entry[1]
+
+    def set(self, token: str, payload: dict):
+        exp = payload.get("exp")
+        if exp is None:
+            return
+        with self._lock:
+            self._entries[self._key(token)] = (exp, payload)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# JWT verificados por get_current_user
+jwt_cache = VerifiedTokenCache()
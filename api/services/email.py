@@ -1,6 +1,12 @@
+import heapq
+import itertools
 import os
+import queue
 import smtplib
+import threading
+import time
 from email.message import EmailMessage
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,12 +15,25 @@ GMAIL_USER = os.getenv("GMAIL_USER")
 GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")
 API_NAME = os.getenv("API_NAME")
 
+# --- Configuración del servidor SMTP ---
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 30))
 
-def send_magic_link_email(email_to: str, magic_link: str):
-    if not GMAIL_USER or not GMAIL_APP_PASSWORD:
-        print("Error: GMAIL_USER o GMAIL_APP_PASSWORD no están en .env")
-        return False
+# --- Configuración del envío en segundo plano ---
+# Emails que pueden esperar en la cola; si se llena, los nuevos se descartan
+EMAIL_QUEUE_SIZE = int(os.getenv("EMAIL_QUEUE_SIZE", 1000))
+# Emails que se mandan seguidos por la misma sesión SMTP
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 50))
+EMAIL_MAX_RETRIES = int(os.getenv("EMAIL_MAX_RETRIES", 5))
+EMAIL_RETRY_BACKOFF = float(os.getenv("EMAIL_RETRY_BACKOFF", 1))
+# Segundos sin enviar nada tras los cuales se cierra la sesión SMTP
+# (Gmail corta las sesiones ociosas de todas formas)
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", 60))
 
+
+def build_magic_link_email(email_to: str, magic_link: str) -> EmailMessage:
     msg = EmailMessage()
     msg.set_content(
         f'Para usar la api "{API_NAME}" inicia sesión con:\n{magic_link}\n\n'
@@ -23,11 +42,41 @@ def send_magic_link_email(email_to: str, magic_link: str):
     msg["Subject"] = "Tu enlace de inicio de sesión"
     msg["From"] = GMAIL_USER
     msg["To"] = email_to
+    return msg
+
 
+def open_smtp_session(
+    host: str = SMTP_HOST,
+    port: int = SMTP_PORT,
+    user: Optional[str] = None,
+    password: Optional[str] = None,
+    starttls: bool = SMTP_STARTTLS,
+) -> smtplib.SMTP:
+    """Abre una sesión SMTP (con STARTTLS si se pide) y la autentica."""
+    session = smtplib.SMTP(host, port, timeout=SMTP_TIMEOUT)
     try:
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls()
-        server.login(GMAIL_USER, GMAIL_APP_PASSWORD)
+        if starttls:
+            session.starttls()
+        if user and password:
+            session.login(user, password)
+    except Exception:
+        session.close()
+        raise
+    return session
+
+
+def send_magic_link_email(email_to: str, magic_link: str):
+    """Envía un email abriendo y cerrando su propia conexión SMTP."""
+    if not GMAIL_USER or not GMAIL_APP_PASSWORD:
+        print("Error: GMAIL_USER o GMAIL_APP_PASSWORD no están en .env")
+        return False
+
+    msg = build_magic_link_email(email_to, magic_link)
+
+    try:
+        server = open_smtp_session(
+            SMTP_HOST, SMTP_PORT, GMAIL_USER, GMAIL_APP_PASSWORD, SMTP_STARTTLS
+        )
         server.send_message(msg)
         server.quit()
         print(f"Email enviado exitosamente a {email_to}")
@@ -35,3 +84,208 @@ def send_magic_link_email(email_to: str, magic_link: str):
     except Exception as e:
         print(f"Error al enviar email: {e}")
         return False
+
+
+class EmailDispatcher:
+    """
+    Envía emails desde un hilo de fondo. Las requests solo encolan el mensaje
+    (cola acotada) y responden enseguida. El hilo mantiene abierta una sesión
+    SMTP autenticada, manda los emails pendientes en tandas por esa misma
+    sesión y, si el servidor falla, reprograma el email con espera
+    exponencial sin frenar a los demás.
+    """
+
+    def __init__(
+        self,
+        host: str = SMTP_HOST,
+        port: int = SMTP_PORT,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = SMTP_STARTTLS,
+        queue_size: int = EMAIL_QUEUE_SIZE,
+        batch_size: int = EMAIL_BATCH_SIZE,
+        max_retries: int = EMAIL_MAX_RETRIES,
+        retry_backoff: float = EMAIL_RETRY_BACKOFF,
+        idle_timeout: float = SMTP_IDLE_TIMEOUT,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.idle_timeout = idle_timeout
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        # Emails a reintentar: (cuándo, orden, intento, email). Solo los usa el hilo.
+        self._retries: List[Tuple[float, int, int, EmailMessage]] = []
+        self._retry_order = itertools.count()
+        self._session: Optional[smtplib.SMTP] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.sent = 0
+        self.failed = 0
+
+    # --- Sesión SMTP ---
+
+    def _open_session(self) -> smtplib.SMTP:
+        return open_smtp_session(self.host, self.port, self.user, self.password, self.starttls)
+
+    def _close_session(self):
+        if self._session is None:
+            return
+        try:
+            self._session.quit()
+        except Exception:
+            self._session.close()
+        self._session = None
+
+    def _get_session(self) -> smtplib.SMTP:
+        if self._session is None:
+            self._session = self._open_session()
+        return self._session
+
+    # --- Cola ---
+
+    def enqueue(self, msg: EmailMessage) -> bool:
+        """Encola el email. Devuelve False si la cola está llena."""
+        try:
+            self._queue.put_nowait(msg)
+            return True
+        except queue.Full:
+            print(f"Cola de emails llena, se descarta el email a {msg['To']}")
+            return False
+
+    def _next_batch(self) -> List[Tuple[EmailMessage, int]]:
+        """Reintentos ya vencidos primero; después, emails nuevos de la cola."""
+        now = time.monotonic()
+        batch = []
+        while self._retries and self._retries[0][0] <= now and len(batch) < self.batch_size:
+            _, _, attempt, msg = heapq.heappop(self._retries)
+            batch.append((msg, attempt))
+
+        if not batch:
+            # Espera emails nuevos, pero no más allá del próximo reintento
+            timeout = 0.5
+            if self._retries:
+                timeout = min(timeout, max(self._retries[0][0] - now, 0))
+            try:
+                batch.append((self._queue.get(timeout=timeout), 0))
+            except queue.Empty:
+                return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append((self._queue.get_nowait(), 0))
+            except queue.Empty:
+                break
+        return batch
+
+    def _send(self, msg: EmailMessage, attempt: int = 0) -> bool:
+        """
+        Manda un email por la sesión abierta. Si falla lo reprograma para
+        dentro de retry_backoff * 2^intento segundos. Devuelve si el email
+        terminó (enviado o descartado).
+        """
+        try:
+            self._get_session().send_message(msg)
+            self.sent += 1
+            return True
+        except smtplib.SMTPRecipientsRefused as e:
+            # El destinatario no existe: reintentar no sirve
+            print(f"Email a {msg['To']} rechazado: {e}")
+        except Exception as e:
+            # La sesión puede haber quedado rota: se abre otra en el próximo envío
+            self._close_session()
+            if attempt < self.max_retries and not self._stop.is_set():
+                wait = self.retry_backoff * 2**attempt
+                print(f"Error al enviar email ({e}). Reintentando en {wait:.1f}s...")
+                heapq.heappush(
+                    self._retries,
+                    (time.monotonic() + wait, next(self._retry_order), attempt + 1, msg),
+                )
+                return False
+            print(f"Error al enviar email a {msg['To']}: {e}")
+        self.failed += 1
+        return True
+
+    def _drop_retries(self):
+        """Al detenerse, los emails que esperaban un reintento se dan por fallidos."""
+        while self._retries:
+            _, _, _, msg = heapq.heappop(self._retries)
+            print(f"Se descarta el email a {msg['To']}: el dispatcher se detuvo")
+            self.failed += 1
+            self._queue.task_done()
+
+    def _run(self):
+        last_sent = time.monotonic()
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self._stop.is_set():
+                    self._drop_retries()
+                    self._close_session()
+                    return
+                # Sin tráfico: se libera la sesión hasta el próximo email
+                if time.monotonic() - last_sent >= self.idle_timeout:
+                    self._close_session()
+                continue
+
+            for msg, attempt in batch:
+                # Un email reprogramado sigue pendiente para flush()
+                if self._send(msg, attempt):
+                    self._queue.task_done()
+            last_sent = time.monotonic()
+            print(f"Tanda de {len(batch)} email(s) procesada")
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="email-dispatcher", daemon=True
+        )
+        self._thread.start()
+
+    def flush(self):
+        """Espera a que se procesen todos los emails encolados."""
+        self._queue.join()
+
+    def stop(self, timeout: float = 30):
+        """Manda lo que quedó en la cola y cierra la sesión SMTP."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+# Dispatcher de la aplicación. Lo crea el lifespan de FastAPI al arrancar.
+_dispatcher: Optional[EmailDispatcher] = None
+
+
+def start_email_dispatcher() -> EmailDispatcher:
+    global _dispatcher
+    _dispatcher = EmailDispatcher(user=GMAIL_USER, password=GMAIL_APP_PASSWORD)
+    _dispatcher.start()
+    return _dispatcher
+
+
+def stop_email_dispatcher():
+    global _dispatcher
+    if _dispatcher is not None:
+        _dispatcher.stop()
+        _dispatcher = None
+
+
+def enqueue_magic_link_email(email_to: str, magic_link: str) -> bool:
+    """
+    Encola el email para el hilo de fondo. Sin dispatcher (ej. fuera de la
+    API) lo manda en el momento.
+    """
+    if _dispatcher is None:
+        return send_magic_link_email(email_to, magic_link)
+
+    if not GMAIL_USER or not GMAIL_APP_PASSWORD:
+        print("Error: GMAIL_USER o GMAIL_APP_PASSWORD no están en .env")
+        return False
+
+    return _dispatcher.enqueue(build_magic_link_email(email_to, magic_link))
@@ -0,0 +1,184 @@
+import hmac
+import os
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from dotenv import load_dotenv
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+load_dotenv()
+
+# Si está definido, GET /metrics exige "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Límites (en segundos) de los histogramas de latencia
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Registro de métricas de este proceso. Con varios workers de uvicorn cada uno
+# expone las suyas: Prometheus las distingue por la instancia scrapeada.
+registry = CollectorRegistry()
+
+# --- Métricas de la API ---
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Latencia de las requests HTTP por ruta, método y status.",
+    ("method", "route", "status"),
+    buckets=DEFAULT_BUCKETS,
+    registry=registry,
+)
+http_requests_in_progress = Gauge(
+    "http_requests_in_progress", "Requests HTTP en curso.", registry=registry
+)
+
+snowflake_query_duration = Histogram(
+    "snowflake_query_duration_seconds",
+    "Tiempo de cada consulta de métricas vista por el endpoint (caché, pool y Snowflake).",
+    ("query",),
+    buckets=DEFAULT_BUCKETS,
+    registry=registry,
+)
+snowflake_execute_duration = Histogram(
+    "snowflake_execute_duration_seconds",
+    "Tiempo de execute + fetch en Snowflake (solo cuando no hubo caché).",
+    ("outcome",),
+    buckets=DEFAULT_BUCKETS,
+    registry=registry,
+)
+mirror_query_duration = Histogram(
+    "mirror_query_duration_seconds",
+    "Tiempo de una consulta de métricas al espejo local (METRICS_BACKEND=mirror).",
+    ("outcome",),
+    buckets=DEFAULT_BUCKETS,
+    registry=registry,
+)
+snowflake_pool_wait = Histogram(
+    "snowflake_pool_acquire_duration_seconds",
+    "Tiempo esperando una conexión del pool (incluye abrir una nueva).",
+    buckets=DEFAULT_BUCKETS,
+    registry=registry,
+)
+snowflake_pool_acquires = Counter(
+    "snowflake_pool_acquires_total",
+    "Conexiones prestadas por el pool según su origen.",
+    ("result",),  # reused | new | failed | timeout
+    registry=registry,
+)
+
+cache_requests = Counter(
+    "cache_requests_total",
+    "Búsquedas en los cachés en memoria.",
+    ("cache", "result"),  # result: hit | miss | shared (esperó el cálculo de otro hilo)
+    registry=registry,
+)
+
+magic_token_verify_duration = Histogram(
+    "magic_token_verify_duration_seconds",
+    "Tiempo verificando el hash del magic token.",
+    ("scheme",),  # hmac | bcrypt
+    buckets=(0.00001, 0.0001, 0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1),
+    registry=registry,
+)
+jwt_verify_duration = Histogram(
+    "jwt_verify_duration_seconds",
+    "Tiempo verificando el JWT de la request.",
+    ("cached",),
+    buckets=(0.000001, 0.00001, 0.0001, 0.001, 0.01, 0.1),
+    registry=registry,
+)
+
+
+class CallbackGauge(Collector):
+    """
+    Gauge que se calcula al exponer las métricas (ej. conexiones libres del
+    pool) en lugar de mantenerlo a mano. 'read' devuelve {valores de las
+    etiquetas: valor}.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Iterable[str],
+        read: Callable[[], Dict[Tuple[str, ...], float]],
+        registry: CollectorRegistry = registry,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = list(labels)
+        self.read = read
+        registry.register(self)
+
+    def describe(self):
+        return [GaugeMetricFamily(self.name, self.documentation, labels=self.labels)]
+
+    def collect(self):
+        family = GaugeMetricFamily(self.name, self.documentation, labels=self.labels)
+        try:
+            values = self.read()
+        except Exception:
+            values = {}
+        for label_values, value in sorted(values.items()):
+            family.add_metric(list(label_values), value)
+        yield family
+
+
+class PrometheusMiddleware:
+    """
+    Middleware ASGI que mide cada request HTTP. La ruta se toma de la plantilla
+    (ej. /metrics/snowflake/deals/by-day), no de la URL, para que los query
+    params y los paths inexistentes no creen series nuevas.
+    """
+
+    def __init__(self, app, skip_paths: Iterable[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_progress.dec()
+            route = scope.get("route")
+            http_request_duration.labels(
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status_code),
+            ).observe(time.perf_counter() - start)
+
+
+def render_metrics() -> bytes:
+    """Todas las métricas en el formato de texto de Prometheus."""
+    return generate_latest(registry)
+
+
+def is_metrics_request_allowed(authorization: Optional[str]) -> bool:
+    """Sin METRICS_TOKEN el endpoint es abierto (pensado para la red interna)."""
+    if not METRICS_TOKEN:
+        return True
+    return hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}")
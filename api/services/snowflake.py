@@ -1,10 +1,53 @@
+import asyncio
+import functools
 import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
 from dotenv import load_dotenv
 from snowflake.connector import DictCursor
 import snowflake.connector
 
+from .cache import cached_query
+from .metrics import (
+    CallbackGauge,
+    mirror_query_duration,
+    snowflake_execute_duration,
+    snowflake_pool_acquires,
+    snowflake_pool_wait,
+    snowflake_query_duration,
+)
+
 load_dotenv()
 
+# --- Configuración del pool de conexiones ---
+SNOW_POOL_SIZE = int(os.getenv("SNOW_POOL_SIZE", 4))
+# Segundos que una conexión puede quedar sin uso antes de cerrarse
+SNOW_POOL_IDLE_TIMEOUT = float(os.getenv("SNOW_POOL_IDLE_TIMEOUT", 600))
+# Segundos sin uso a partir de los cuales se verifica la conexión con un SELECT 1
+SNOW_POOL_HEALTH_CHECK_AFTER = float(os.getenv("SNOW_POOL_HEALTH_CHECK_AFTER", 60))
+# Segundos que se espera una conexión libre antes de rendirse
+SNOW_POOL_ACQUIRE_TIMEOUT = float(os.getenv("SNOW_POOL_ACQUIRE_TIMEOUT", 30))
+# Consultas a Snowflake que pueden correr a la vez fuera del event loop.
+# Las que sobran esperan su turno sin bloquear al resto de la API.
+SNOW_QUERY_CONCURRENCY = int(os.getenv("SNOW_QUERY_CONCURRENCY", SNOW_POOL_SIZE))
+
+# --- Origen de las métricas ---
+# "snowflake" (por defecto) o "mirror": el archivo SQLite con las tablas de
+# resumen que publica el ETL en cada carga (ANALYTICS_MIRROR_PATH). El espejo
+# responde en milisegundos sin despertar el warehouse; Snowflake sigue siendo
+# la fuente de verdad.
+METRICS_BACKENDS = ("snowflake", "mirror")
+METRICS_BACKEND = os.getenv("METRICS_BACKEND", "snowflake")
+ANALYTICS_MIRROR_PATH = os.getenv("ANALYTICS_MIRROR_PATH")
+
+if METRICS_BACKEND not in METRICS_BACKENDS:
+    raise ValueError(f"METRICS_BACKEND inválido: {METRICS_BACKEND}")
+
 
 def get_snowflake_connection():
     try:
@@ -23,28 +66,422 @@ def get_snowflake_connection():
         return None
 
 
-def get_snowflake_b2b_vs_b2c_deals():
-    connection = get_snowflake_connection()
-    if connection is None:
-        return {"error": "No se pudo conectar a Snowflake"}
+class SnowflakeConnectionPool:
+    """
+    Pool de conexiones a Snowflake reutilizables entre requests.
+    Nunca hay más de 'size' conexiones abiertas; las que quedan sin uso más de
+    'idle_timeout' segundos se cierran, y antes de prestar una conexión que
+    estuvo quieta se verifica que siga viva.
+    """
+
+    def __init__(
+        self,
+        size: int = SNOW_POOL_SIZE,
+        idle_timeout: float = SNOW_POOL_IDLE_TIMEOUT,
+        health_check_after: float = SNOW_POOL_HEALTH_CHECK_AFTER,
+        connect=None,
+    ):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        # Se resuelve al usarla para que los tests puedan hacer patch
+        self.connect = connect or (lambda: get_snowflake_connection())
+
+        self._idle = deque()  # (conexión, último uso)
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._in_use = 0  # conexiones prestadas, protegido por _lock
+        self._closed = False
+        self._stop_reaper = threading.Event()
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        try:
+            if conn.is_closed():
+                return False
+            if time.monotonic() - last_used >= self.health_check_after:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("SELECT 1")
+                finally:
+                    cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception as e:
+            print(f"Error cerrando conexión a Snowflake: {e}")
+
+    def evict_idle(self):
+        """Cierra las conexiones que pasaron más de 'idle_timeout' sin uso."""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            while self._idle and now - self._idle[0][1] >= self.idle_timeout:
+                expired.append(self._idle.popleft()[0])
+        for conn in expired:
+            self._close(conn)
+
+    def start_reaper(self, interval: float = 30):
+        """Hilo de fondo que cierra las conexiones ociosas aunque no haya tráfico."""
+
+        def reap():
+            while not self._stop_reaper.wait(interval):
+                self.evict_idle()
+
+        threading.Thread(target=reap, name="snowflake-pool-reaper", daemon=True).start()
+
+    def acquire(self, timeout: float = SNOW_POOL_ACQUIRE_TIMEOUT):
+        """Presta una conexión (o None si no se pudo conectar)."""
+        with snowflake_pool_wait.time():
+            conn, result = self._acquire(timeout)
+        if conn is not None:
+            with self._lock:
+                self._in_use += 1
+        snowflake_pool_acquires.labels(result=result).inc()
+        return conn
+
+    def _acquire(self, timeout: float):
+        if self._closed:
+            raise RuntimeError("El pool de Snowflake está cerrado")
+        if not self._slots.acquire(timeout=timeout):
+            snowflake_pool_acquires.labels(result="timeout").inc()
+            raise TimeoutError("No hay conexiones a Snowflake disponibles")
+
+        self.evict_idle()
+
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                # La más reciente primero: es la que tiene menos chances de expirar
+                conn, last_used = self._idle.pop()
+
+            if self._is_healthy(conn, last_used):
+                return conn, "reused"
+            self._close(conn)
+
+        conn = self.connect()
+        if conn is None:
+            self._slots.release()
+            return None, "failed"
+        return conn, "new"
+
+    def stats(self):
+        """Conexiones libres y prestadas en este momento."""
+        with self._lock:
+            return {("idle",): len(self._idle), ("in_use",): self._in_use}
+
+    def release(self, conn, discard: bool = False):
+        """Devuelve una conexión al pool (o la cierra si 'discard')."""
+        if conn is None:
+            return
+        with self._lock:
+            self._in_use -= 1
+        if discard or self._closed:
+            self._close(conn)
+        else:
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        """Cierra todas las conexiones libres. Las prestadas se cierran al volver."""
+        self._closed = True
+        self._stop_reaper.set()
+        with self._lock:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        for conn in idle:
+            self._close(conn)
+
+
+# Pool de la aplicación. Lo crea el lifespan de FastAPI al arrancar.
+_pool: Optional[SnowflakeConnectionPool] = None
+
+CallbackGauge(
+    "snowflake_pool_connections",
+    "Conexiones del pool de Snowflake según su estado.",
+    ("state",),
+    read=lambda: _pool.stats() if _pool is not None else {},
+)
+
+
+def init_snowflake_pool(size: int = SNOW_POOL_SIZE) -> SnowflakeConnectionPool:
+    global _pool
+    _pool = SnowflakeConnectionPool(size=size)
+    _pool.start_reaper()
+    return _pool
+
+
+def close_snowflake_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+# Hilos donde corren las consultas (el conector de Snowflake es sincrónico)
+_query_executor: Optional[ThreadPoolExecutor] = None
+_query_executor_lock = threading.Lock()
+
+
+def init_query_executor(
+    max_workers: int = SNOW_QUERY_CONCURRENCY,
+) -> ThreadPoolExecutor:
+    global _query_executor
+    with _query_executor_lock:
+        if _query_executor is None:
+            _query_executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="snowflake-query"
+            )
+    return _query_executor
+
+
+def shutdown_query_executor():
+    global _query_executor
+    with _query_executor_lock:
+        if _query_executor is not None:
+            _query_executor.shutdown(wait=True)
+            _query_executor = None
+
+
+async def run_query(func, *args, **kwargs):
+    """Corre una consulta sincrónica en el executor y la espera sin bloquear el loop."""
+    executor = init_query_executor()
+    loop = asyncio.get_running_loop()
+    with snowflake_query_duration.labels(query=func.__name__).time():
+        return await loop.run_in_executor(
+            executor, functools.partial(func, *args, **kwargs)
+        )
+
+
+@contextmanager
+def borrow_connection():
+    """
+    Presta una conexión del pool. Si no hay pool (ej. fuera de la API)
+    abre una conexión nueva y la cierra al terminar.
+    """
+    if _pool is None:
+        connection = get_snowflake_connection()
+        try:
+            yield connection
+        finally:
+            if connection is not None:
+                connection.close()
+    else:
+        with _pool.connection() as connection:
+            yield connection
+
+
+def run_mirror_query(sql: str, params: Optional[dict] = None, fetch_all: bool = True):
+    """
+    Como run_metrics_query, pero contra el espejo local, con SQL de SQLite.
+    Se abre en cada consulta (es un archivo local, cuesta microsegundos), así
+    siempre se lee el último que publicó el ETL.
+    """
+    if not ANALYTICS_MIRROR_PATH or not os.path.exists(ANALYTICS_MIRROR_PATH):
+        return {"error": "No hay espejo local de métricas"}
 
-    cursor = connection.cursor(DictCursor)
     try:
-        SQL_QUERY = """
-            SELECT
-                COUNT(CASE WHEN DEALS."associated_company_id" IS NOT NULL THEN 1 END) AS total_deals_b2b,
-                COUNT(CASE WHEN DEALS."associated_company_id" IS NULL THEN 1 END)     AS total_deals_b2c,
-                COUNT(*) AS total_deals
-            FROM
-                DEALS;
-            """
-        cursor.execute(SQL_QUERY.strip())
-        result = cursor.fetchone()
-    except Exception as e:
-        print(f"Error en la consulta: {e}")
+        connection = sqlite3.connect(f"file:{ANALYTICS_MIRROR_PATH}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        return {"error": str(e)}
+
+    start = time.perf_counter()
+    try:
+        cursor = connection.execute(sql.strip(), params or {})
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        mirror_query_duration.labels(outcome="error").observe(time.perf_counter() - start)
+        print(f"Error en la consulta al espejo: {e}")
         return {"error": str(e)}
     finally:
-        cursor.close()
         connection.close()
+    mirror_query_duration.labels(outcome="ok").observe(time.perf_counter() - start)
+
+    if fetch_all:
+        return rows
+    return rows[0] if rows else None
+
+
+def run_metrics_query(
+    sql: str,
+    params: Optional[dict] = None,
+    fetch_all: bool = True,
+    mirror_sql: Optional[str] = None,
+):
+    """
+    Ejecuta una consulta de métricas y devuelve las filas como dicts
+    (o solo la primera fila si 'fetch_all' es False). Con METRICS_BACKEND=mirror
+    se corre 'mirror_sql' (la misma consulta escrita para SQLite, con los
+    mismos nombres de columna) contra el espejo local en vez de ir a Snowflake.
+    """
+    if METRICS_BACKEND == "mirror":
+        if mirror_sql is None:
+            return {"error": "Esta consulta no está disponible en el espejo local"}
+        return run_mirror_query(mirror_sql, params, fetch_all)
+
+    with borrow_connection() as connection:
+        if connection is None:
+            return {"error": "No se pudo conectar a Snowflake"}
+
+        cursor = connection.cursor(DictCursor)
+        start = time.perf_counter()
+        try:
+            if params is None:
+                cursor.execute(sql.strip())
+            else:
+                cursor.execute(sql.strip(), params)
+            result = cursor.fetchall() if fetch_all else cursor.fetchone()
+        except Exception as e:
+            snowflake_execute_duration.labels(outcome="error").observe(
+                time.perf_counter() - start
+            )
+            print(f"Error en la consulta: {e}")
+            return {"error": str(e)}
+        finally:
+            cursor.close()
+        snowflake_execute_duration.labels(outcome="ok").observe(time.perf_counter() - start)
 
     return result
+
+
+# Las métricas se leen de las tablas de resumen que el ETL actualiza en cada
+# carga (DEALS_DAILY_SUMMARY, LEADS_DAILY_SUMMARY), nunca de DEALS o LEADS:
+# tienen una fila por día y grupo, así que el costo no crece con los hechos.
+# Cada una tiene su versión para el espejo local (MIRROR_SQL), escrita para
+# SQLite y con los nombres de columna que devuelve Snowflake: los alias sin
+# comillas vuelven en mayúsculas.
+
+
+@cached_query
+def get_snowflake_b2b_vs_b2c_deals():
+    SQL_QUERY = """
+        SELECT
+            COALESCE(SUM(CASE WHEN "segment" = 'B2B' THEN "deal_count" END), 0) AS total_deals_b2b,
+            COALESCE(SUM(CASE WHEN "segment" = 'B2C' THEN "deal_count" END), 0) AS total_deals_b2c,
+            COALESCE(SUM("deal_count"), 0) AS total_deals
+        FROM
+            DEALS_DAILY_SUMMARY;
+        """
+    MIRROR_SQL = """
+        SELECT
+            COALESCE(SUM(CASE WHEN "segment" = 'B2B' THEN "deal_count" END), 0) AS "TOTAL_DEALS_B2B",
+            COALESCE(SUM(CASE WHEN "segment" = 'B2C' THEN "deal_count" END), 0) AS "TOTAL_DEALS_B2C",
+            COALESCE(SUM("deal_count"), 0) AS "TOTAL_DEALS"
+        FROM DEALS_DAILY_SUMMARY
+        """
+    return run_metrics_query(SQL_QUERY, fetch_all=False, mirror_sql=MIRROR_SQL)
+
+
+@cached_query
+def get_snowflake_deals_by_segment():
+    SQL_QUERY = """
+        SELECT
+            "segment",
+            SUM("deal_count") AS "deal_count",
+            SUM("total_amount") AS "total_amount"
+        FROM DEALS_DAILY_SUMMARY
+        GROUP BY "segment"
+        ORDER BY "segment";
+        """
+    MIRROR_SQL = """
+        SELECT "segment", SUM("deal_count") AS "deal_count", SUM("total_amount") AS "total_amount"
+        FROM DEALS_DAILY_SUMMARY
+        GROUP BY "segment"
+        ORDER BY "segment"
+        """
+    return run_metrics_query(SQL_QUERY, mirror_sql=MIRROR_SQL)
+
+
+@cached_query
+def get_snowflake_deals_by_stage():
+    SQL_QUERY = """
+        SELECT
+            "stage",
+            SUM("deal_count") AS "deal_count",
+            SUM("total_amount") AS "total_amount"
+        FROM DEALS_DAILY_SUMMARY
+        GROUP BY "stage"
+        ORDER BY "deal_count" DESC;
+        """
+    MIRROR_SQL = """
+        SELECT "stage", SUM("deal_count") AS "deal_count", SUM("total_amount") AS "total_amount"
+        FROM DEALS_DAILY_SUMMARY
+        GROUP BY "stage"
+        ORDER BY "deal_count" DESC
+        """
+    return run_metrics_query(SQL_QUERY, mirror_sql=MIRROR_SQL)
+
+
+@cached_query
+def get_snowflake_deals_by_day(start: Optional[str] = None, end: Optional[str] = None):
+    """Deals creados por día, opcionalmente entre 'start' y 'end' (YYYY-MM-DD)."""
+    SQL_QUERY = """
+        SELECT
+            "day",
+            SUM("deal_count") AS "deal_count",
+            SUM(CASE WHEN "segment" = 'B2B' THEN "deal_count" ELSE 0 END) AS "deal_count_b2b",
+            SUM(CASE WHEN "segment" = 'B2C' THEN "deal_count" ELSE 0 END) AS "deal_count_b2c",
+            SUM("total_amount") AS "total_amount"
+        FROM DEALS_DAILY_SUMMARY
+        WHERE (%(start)s IS NULL OR "day" >= TO_DATE(%(start)s))
+          AND (%(end)s IS NULL OR "day" <= TO_DATE(%(end)s))
+        GROUP BY "day"
+        ORDER BY "day";
+        """
+    # En el espejo "day" es texto YYYY-MM-DD: se compara con la fecha como texto
+    MIRROR_SQL = """
+        SELECT
+            "day",
+            SUM("deal_count") AS "deal_count",
+            SUM(CASE WHEN "segment" = 'B2B' THEN "deal_count" ELSE 0 END) AS "deal_count_b2b",
+            SUM(CASE WHEN "segment" = 'B2C' THEN "deal_count" ELSE 0 END) AS "deal_count_b2c",
+            SUM("total_amount") AS "total_amount"
+        FROM DEALS_DAILY_SUMMARY
+        WHERE (:start IS NULL OR "day" >= date(:start))
+          AND (:end IS NULL OR "day" <= date(:end))
+        GROUP BY "day"
+        ORDER BY "day"
+        """
+    return run_metrics_query(
+        SQL_QUERY, {"start": start, "end": end}, mirror_sql=MIRROR_SQL
+    )
+
+
+@cached_query
+def get_snowflake_leads_by_status():
+    SQL_QUERY = """
+        SELECT
+            "status",
+            SUM("lead_count") AS "lead_count"
+        FROM LEADS_DAILY_SUMMARY
+        GROUP BY "status"
+        ORDER BY "lead_count" DESC;
+        """
+    MIRROR_SQL = """
+        SELECT "status", SUM("lead_count") AS "lead_count"
+        FROM LEADS_DAILY_SUMMARY
+        GROUP BY "status"
+        ORDER BY "lead_count" DESC
+        """
+    return run_metrics_query(SQL_QUERY, mirror_sql=MIRROR_SQL)
+
+
+async def aget_snowflake_b2b_vs_b2c_deals():
+    return await run_query(get_snowflake_b2b_vs_b2c_deals)
@@ -0,0 +1,143 @@
+import asyncio
+import unittest
+from datetime import timedelta
+from unittest.mock import patch
+
+import jwt
+
+from fastapi import HTTPException
+
+import api.services.auth
+from api.database import InMemoryTokenStore
+from api.services.cache import jwt_cache
+
+
+@patch("api.services.auth.MAGIC_TOKEN_SECRET", "test_magic_secret")
+@patch("api.services.auth.JWT_SECRET_KEY", "test_jwt_secret")
+@patch("api.services.auth.JWT_ALGORITHM", "HS256")
+class TestMagicToken(unittest.TestCase):
+
+    def setUp(self):
+        self.store = InMemoryTokenStore(sweep_interval=0)
+        patcher = patch("api.services.auth.token_store", self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_token_is_stored_as_hmac(self):
+        """Prueba que el token se guarda como HMAC-SHA256 y no en texto plano."""
+        token = api.services.auth.create_magic_token("user@example.com")
+
+        token_hash = self.store.get("magic_token:user@example.com")["token_hash"]
+        self.assertTrue(token_hash.startswith("hmac-sha256$"))
+        self.assertNotIn(token, token_hash)
+        self.assertTrue(api.services.auth.verify_magic_token_hash(token, token_hash))
+
+    def test_verify_valid_token_returns_jwt(self):
+        """Prueba que un token válido devuelve un JWT y queda marcado como usado."""
+        token = api.services.auth.create_magic_token("user@example.com")
+
+        response = api.services.auth.verify_magic_token("user@example.com", token)
+
+        self.assertTrue(response.access_token)
+        self.assertTrue(self.store.get("magic_token:user@example.com:used"))
+
+    def test_token_cannot_be_used_twice(self):
+        """Prueba que el mismo enlace no entrega un segundo JWT."""
+        token = api.services.auth.create_magic_token("user@example.com")
+        api.services.auth.verify_magic_token("user@example.com", token)
+
+        with self.assertRaises(HTTPException) as ctx:
+            api.services.auth.verify_magic_token("user@example.com", token)
+
+        self.assertEqual(ctx.exception.status_code, 400)
+        self.assertEqual(ctx.exception.detail, "Este enlace ya fue utilizado")
+
+    def test_new_token_replaces_used_one(self):
+        """Prueba que pedir un enlace nuevo permite volver a iniciar sesión."""
+        token = api.services.auth.create_magic_token("user@example.com")
+        api.services.auth.verify_magic_token("user@example.com", token)
+
+        new_token = api.services.auth.create_magic_token("user@example.com")
+        response = api.services.auth.verify_magic_token("user@example.com", new_token)
+
+        self.assertTrue(response.access_token)
+
+    def test_verify_wrong_token_fails(self):
+        """Prueba que un token incorrecto se rechaza y no consume el enlace."""
+        api.services.auth.create_magic_token("user@example.com")
+
+        with self.assertRaises(HTTPException) as ctx:
+            api.services.auth.verify_magic_token("user@example.com", "otro-token")
+
+        self.assertEqual(ctx.exception.status_code, 400)
+        self.assertIsNone(self.store.get("magic_token:user@example.com:used"))
+
+    def test_hash_depends_on_secret(self):
+        """Prueba que el mismo token con otra clave da otro hash."""
+        first = api.services.auth.hash_magic_token("token")
+        with patch("api.services.auth.MAGIC_TOKEN_SECRET", "otra_clave"):
+            second = api.services.auth.hash_magic_token("token")
+
+        self.assertNotEqual(first, second)
+
+    @patch("api.services.auth.verify_password", return_value=True)
+    def test_legacy_bcrypt_hash_is_still_accepted(self, mock_verify_password):
+        """Prueba que los hashes bcrypt anteriores se verifican con passlib."""
+        legacy_hash = "$2b$12$" + "a" * 53
+
+        self.assertTrue(
+            api.services.auth.verify_magic_token_hash("token", legacy_hash)
+        )
+        mock_verify_password.assert_called_once_with("token", legacy_hash)
+
+
+@patch("api.services.auth.JWT_SECRET_KEY", "test_jwt_secret")
+@patch("api.services.auth.JWT_ALGORITHM", "HS256")
+class TestAccessToken(unittest.TestCase):
+
+    def setUp(self):
+        jwt_cache.clear()
+
+    def test_valid_token_returns_email(self):
+        """Prueba que get_current_user devuelve el 'sub' de un JWT válido."""
+        token = api.services.auth.create_access_token({"sub": "user@example.com"})
+
+        email = asyncio.run(api.services.auth.get_current_user(token))
+
+        self.assertEqual(email, "user@example.com")
+
+    def test_second_verification_uses_cache(self):
+        """Prueba que el mismo token solo se decodifica una vez."""
+        token = api.services.auth.create_access_token({"sub": "user@example.com"})
+
+        with patch("api.services.auth.jwt.decode", wraps=jwt.decode) as mock_decode:
+            api.services.auth.decode_access_token(token)
+            api.services.auth.decode_access_token(token)
+
+        mock_decode.assert_called_once()
+
+    def test_expired_token_is_rejected(self):
+        """Prueba que un JWT vencido devuelve 401."""
+        token = api.services.auth.create_access_token(
+            {"sub": "user@example.com"}, expires_delta=timedelta(seconds=-1)
+        )
+
+        with self.assertRaises(HTTPException) as ctx:
+            asyncio.run(api.services.auth.get_current_user(token))
+
+        self.assertEqual(ctx.exception.status_code, 401)
+
+    def test_token_signed_with_other_key_is_rejected(self):
+        """Prueba que un JWT firmado con otra clave no se acepta ni se guarda."""
+        token = jwt.encode(
+            {"sub": "user@example.com", "exp": 9999999999}, "otra_clave", algorithm="HS256"
+        )
+
+        with self.assertRaises(HTTPException):
+            asyncio.run(api.services.auth.get_current_user(token))
+
+        self.assertEqual(len(jwt_cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
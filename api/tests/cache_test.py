@@ -0,0 +1,189 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from api.services.cache import (
+    TTLCache,
+    VerifiedTokenCache,
+    cached_query,
+    invalidate_query_cache,
+)
+import api.services.snowflake
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_hit_does_not_recompute(self):
+        """Prueba que un resultado en caché no se vuelve a calcular."""
+        cache = TTLCache(maxsize=10, ttl=60)
+        compute = MagicMock(return_value=1)
+
+        self.assertEqual(cache.get_or_compute("a", compute), 1)
+        self.assertEqual(cache.get_or_compute("a", compute), 1)
+
+        compute.assert_called_once()
+
+    def test_entries_expire(self):
+        """Prueba que un resultado vencido se vuelve a calcular."""
+        cache = TTLCache(maxsize=10, ttl=0.01)
+        compute = MagicMock(side_effect=[1, 2])
+
+        cache.get_or_compute("a", compute)
+        time.sleep(0.02)
+
+        self.assertEqual(cache.get_or_compute("a", compute), 2)
+
+    def test_least_recently_used_is_evicted(self):
+        """Prueba que al llenarse se descarta la clave usada hace más tiempo."""
+        cache = TTLCache(maxsize=2, ttl=60)
+
+        cache.get_or_compute("a", lambda: 1)
+        cache.get_or_compute("b", lambda: 2)
+        cache.get_or_compute("a", lambda: 1)
+        cache.get_or_compute("c", lambda: 3)
+
+        compute = MagicMock(return_value=2)
+        cache.get_or_compute("a", MagicMock())
+        cache.get_or_compute("b", compute)
+        compute.assert_called_once()
+
+    def test_concurrent_misses_compute_once(self):
+        """Prueba que varios hilos con la misma clave esperan un solo cálculo."""
+        cache = TTLCache(maxsize=10, ttl=60)
+        calls = []
+        started = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            time.sleep(0.05)
+            return "ok"
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(cache.get_or_compute("a", compute))
+            )
+            for _ in range(5)
+        ]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["ok"] * 5)
+
+    def test_errors_are_not_cached(self):
+        """Prueba que una excepción se propaga y no queda guardada."""
+        cache = TTLCache(maxsize=10, ttl=60)
+
+        with self.assertRaises(ValueError):
+            cache.get_or_compute("a", MagicMock(side_effect=ValueError("fallo")))
+
+        self.assertEqual(cache.get_or_compute("a", lambda: 1), 1)
+
+    def test_clear_discards_inflight_result(self):
+        """Prueba que un cálculo que empezó antes de invalidar no se guarda."""
+        cache = TTLCache(maxsize=10, ttl=60)
+
+        def compute():
+            cache.clear()
+            return "viejo"
+
+        cache.get_or_compute("a", compute)
+
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate_reaches_other_processes(self):
+        """Prueba que invalidar en un worker vacía el caché de otro que comparte el archivo."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        stamp_path = os.path.join(tmp.name, "query_cache.stamp")
+        # Dos cachés con el mismo archivo, como dos workers de uvicorn
+        worker_a = TTLCache(maxsize=10, ttl=60, stamp_path=stamp_path)
+        worker_b = TTLCache(maxsize=10, ttl=60, stamp_path=stamp_path)
+        worker_b.get_or_compute("a", lambda: "viejo")
+
+        worker_a.invalidate()
+
+        self.assertEqual(worker_b.get_or_compute("a", lambda: "nuevo"), "nuevo")
+        worker_a.invalidate()
+        self.assertEqual(worker_b.get_or_compute("a", lambda: "otro"), "otro")
+        # Una invalidación se aplica una sola vez
+        self.assertEqual(worker_b.get_or_compute("a", lambda: "de más"), "otro")
+
+
+class TestCachedQuery(unittest.TestCase):
+
+    def setUp(self):
+        invalidate_query_cache()
+
+    def test_error_results_are_not_cached(self):
+        """Prueba que las respuestas {"error": ...} no se guardan en caché."""
+        results = MagicMock(side_effect=[{"error": "x"}, {"TOTAL": 1}])
+
+        @cached_query
+        def query():
+            return results()
+
+        self.assertEqual(query(), {"error": "x"})
+        self.assertEqual(query(), {"TOTAL": 1})
+        self.assertEqual(query(), {"TOTAL": 1})
+        self.assertEqual(results.call_count, 2)
+
+    @patch("api.services.snowflake.get_snowflake_connection")
+    def test_invalidation_forces_new_query(self, mock_get_connection):
+        """Prueba que después de invalidar se vuelve a consultar Snowflake."""
+        mock_connection = MagicMock()
+        mock_connection.cursor.return_value.fetchone.return_value = {"TOTAL_DEALS": 1}
+        mock_get_connection.return_value = mock_connection
+
+        api.services.snowflake.get_snowflake_b2b_vs_b2c_deals()
+        api.services.snowflake.get_snowflake_b2b_vs_b2c_deals()
+        self.assertEqual(mock_get_connection.call_count, 1)
+
+        invalidate_query_cache()
+        api.services.snowflake.get_snowflake_b2b_vs_b2c_deals()
+        self.assertEqual(mock_get_connection.call_count, 2)
+
+
+class TestVerifiedTokenCache(unittest.TestCase):
+
+    def test_entry_expires_at_token_exp(self):
+        """Prueba que un token deja de estar en caché cuando vence su 'exp'."""
+        cache = VerifiedTokenCache(maxsize=10)
+        cache.set("token", {"sub": "a@b.com", "exp": time.time() + 0.01})
+
+        self.assertEqual(cache.get("token")["sub"], "a@b.com")
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("token"))
+
+    def test_lru_is_bounded(self):
+        """Prueba que el caché no crece más allá de 'maxsize'."""
+        cache = VerifiedTokenCache(maxsize=2)
+        exp = time.time() + 60
+        cache.set("a", {"exp": exp})
+        cache.set("b", {"exp": exp})
+        cache.get("a")
+        cache.set("c", {"exp": exp})
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+
+    def test_token_without_exp_is_not_cached(self):
+        """Prueba que un token sin 'exp' no se guarda (no sabríamos cuándo vence)."""
+        cache = VerifiedTokenCache(maxsize=10)
+        cache.set("token", {"sub": "a@b.com"})
+
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
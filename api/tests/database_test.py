@@ -0,0 +1,268 @@
+import socketserver
+import threading
+import time
+import unittest
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+from api.database import (
+    InMemoryTokenStore,
+    RedisTokenStore,
+    TokenStore,
+    create_token_store,
+)
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """Servidor RESP mínimo: entiende AUTH, SELECT, SET (PX, NX), GET y DEL."""
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    def write_bulk(self, value):
+        if value is None:
+            self.wfile.write(b"$-1\r\n")
+        else:
+            data = value.encode()
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(data), data))
+
+    def handle(self):
+        server = self.server
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            command, *rest = args
+            command = command.upper()
+            server.commands.append(command)
+
+            with server.lock:
+                now = time.monotonic()
+                data = server.data
+                for key in [k for k, (_, exp) in data.items() if exp <= now]:
+                    del data[key]
+
+                if command == "AUTH":
+                    if rest[0] == server.password:
+                        self.wfile.write(b"+OK\r\n")
+                    else:
+                        self.wfile.write(b"-WRONGPASS invalid password\r\n")
+                elif command in ("SELECT", "PING"):
+                    self.wfile.write(b"+OK\r\n")
+                elif command == "SET":
+                    key, value, *options = rest
+                    options = [option.upper() for option in options]
+                    if "NX" in options and key in data:
+                        self.write_bulk(None)
+                        continue
+                    ttl_ms = int(rest[2 + options.index("PX") + 1])
+                    data[key] = (value, now + ttl_ms / 1000)
+                    self.wfile.write(b"+OK\r\n")
+                elif command == "GET":
+                    entry = data.get(rest[0])
+                    self.write_bulk(entry[0] if entry else None)
+                elif command == "DEL":
+                    removed = sum(1 for key in rest if data.pop(key, None))
+                    self.wfile.write(b":%d\r\n" % removed)
+                else:
+                    self.wfile.write(b"-ERR unknown command\r\n")
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, password=None):
+        super().__init__(("127.0.0.1", 0), FakeRedisHandler)
+        self.password = password
+        self.data = {}
+        self.commands = []
+        self.lock = threading.Lock()
+
+
+class TestInMemoryTokenStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = InMemoryTokenStore(sweep_interval=0)
+
+    def test_set_and_get(self):
+        """Prueba que se guarda y se lee un valor."""
+        self.store.set("a", {"token_hash": "x"}, ttl=60)
+
+        self.assertEqual(self.store.get("a"), {"token_hash": "x"})
+        self.assertIsNone(self.store.get("b"))
+
+    def test_value_is_copied(self):
+        """Prueba que modificar el dict leído no cambia lo guardado."""
+        self.store.set("a", {"used": False}, ttl=60)
+
+        self.store.get("a")["used"] = True
+
+        self.assertEqual(self.store.get("a"), {"used": False})
+
+    def test_expired_value_is_gone(self):
+        """Prueba que un valor vencido ya no se devuelve."""
+        self.store.set("a", {"x": 1}, ttl=0.01)
+        time.sleep(0.02)
+
+        self.assertIsNone(self.store.get("a"))
+
+    def test_add_only_if_absent(self):
+        """Prueba que add() no pisa una clave que ya existe."""
+        self.assertTrue(self.store.add("a", {"x": 1}, ttl=60))
+        self.assertFalse(self.store.add("a", {"x": 2}, ttl=60))
+        self.assertEqual(self.store.get("a"), {"x": 1})
+
+    def test_delete(self):
+        """Prueba que delete() avisa si la clave existía."""
+        self.store.set("a", {"x": 1}, ttl=60)
+
+        self.assertTrue(self.store.delete("a"))
+        self.assertFalse(self.store.delete("a"))
+
+    def test_sweep_removes_expired_entries(self):
+        """Prueba que el barrendero libera la memoria de los tokens vencidos."""
+        for i in range(100):
+            self.store.set(f"viejo-{i}", {"x": i}, ttl=0.01)
+        self.store.set("nuevo", {"x": 1}, ttl=60)
+        time.sleep(0.02)
+
+        self.assertEqual(self.store.sweep(), 100)
+        self.assertEqual(len(self.store), 1)
+
+    def test_concurrent_add_has_one_winner(self):
+        """Prueba que con muchos hilos a la vez solo uno gana el add()."""
+        results = []
+        barrier = threading.Barrier(20)
+
+        def claim():
+            barrier.wait()
+            results.append(self.store.add("usado", {"used": True}, ttl=60))
+
+        threads = [threading.Thread(target=claim) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 1)
+
+    def test_token_store_is_abstract(self):
+        """Prueba que un almacén sin todos los métodos no se puede crear."""
+
+        class Incomplete(TokenStore):
+            def get(self, key):
+                return None
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+@unittest.skipIf(redis is None, "redis no está instalado")
+class TestRedisTokenStore(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeRedisServer(password="secreto")
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        host, port = self.server.server_address
+        self.store = RedisTokenStore(f"redis://:secreto@{host}:{port}/1")
+
+    def tearDown(self):
+        self.store.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_set_get_delete(self):
+        """Prueba el ida y vuelta de un valor guardado en Redis."""
+        self.store.set("magic_token:a@b.com", {"token_hash": "x", "expires": 1.5}, ttl=60)
+
+        self.assertEqual(
+            self.store.get("magic_token:a@b.com"), {"token_hash": "x", "expires": 1.5}
+        )
+        self.assertTrue(self.store.delete("magic_token:a@b.com"))
+        self.assertIsNone(self.store.get("magic_token:a@b.com"))
+
+    def test_keys_expire_in_server(self):
+        """Prueba que el vencimiento se delega al servidor (SET ... PX)."""
+        self.store.set("a", {"x": 1}, ttl=0.01)
+        time.sleep(0.03)
+
+        self.assertIsNone(self.store.get("a"))
+
+    def test_add_uses_nx(self):
+        """Prueba que add() solo gana la primera vez."""
+        self.assertTrue(self.store.add("a", {"x": 1}, ttl=60))
+        self.assertFalse(self.store.add("a", {"x": 2}, ttl=60))
+
+    def test_connection_is_reused(self):
+        """Prueba que AUTH y SELECT se mandan una sola vez por conexión."""
+        for i in range(5):
+            self.store.set(f"k{i}", {"x": i}, ttl=60)
+
+        self.assertEqual(self.server.commands.count("AUTH"), 1)
+        self.assertEqual(self.server.commands.count("SELECT"), 1)
+
+    def test_shared_between_clients(self):
+        """Prueba que un token guardado por un worker lo lee otro."""
+        host, port = self.server.server_address
+        other = RedisTokenStore(f"redis://:secreto@{host}:{port}/1")
+        try:
+            self.store.set("a", {"x": 1}, ttl=60)
+            self.assertEqual(other.get("a"), {"x": 1})
+        finally:
+            other.close()
+
+    def test_pool_is_bounded(self):
+        """Prueba que con todas las conexiones prestadas no se abre otra."""
+        host, port = self.server.server_address
+        store = RedisTokenStore(
+            f"redis://:secreto@{host}:{port}/1", timeout=0.1, max_connections=1
+        )
+        borrowed = store.pool.get_connection("GET")
+        try:
+            with self.assertRaises(redis.ConnectionError):
+                store.get("a")
+        finally:
+            store.pool.release(borrowed)
+            store.close()
+
+    def test_wrong_password_raises(self):
+        """Prueba que una contraseña incorrecta se informa como error de Redis."""
+        host, port = self.server.server_address
+        store = RedisTokenStore(f"redis://:otra@{host}:{port}/0")
+
+        with self.assertRaises(redis.RedisError):
+            store.get("a")
+        store.close()
+
+
+class TestCreateTokenStore(unittest.TestCase):
+
+    def test_backend_from_url(self):
+        """Prueba que TOKEN_STORE_URL elige el backend."""
+        self.assertIsInstance(create_token_store(""), InMemoryTokenStore)
+        with self.assertRaises(ValueError):
+            create_token_store("memcached://localhost")
+
+    @unittest.skipIf(redis is None, "redis no está instalado")
+    def test_redis_urls(self):
+        """Prueba que redis:// y rediss:// (TLS) usan Redis, sin conectarse todavía."""
+        self.assertIsInstance(
+            create_token_store("redis://localhost:6379/0"), RedisTokenStore
+        )
+        store = create_token_store("rediss://localhost:6380/0")
+        self.assertIs(store.pool.connection_class, redis.SSLConnection)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,16 @@
+import socket
 import unittest
 from unittest.mock import patch, MagicMock
 import smtplib
 
-from api.services.email import send_magic_link_email
+from aiosmtpd.controller import Controller
+
+import api.services.email
+from api.services.email import (
+    EmailDispatcher,
+    build_magic_link_email,
+    send_magic_link_email,
+)
 
 
 class TestMailSender(unittest.TestCase):
@@ -20,7 +28,9 @@ class TestMailSender(unittest.TestCase):
 
         self.assertTrue(result)
 
-        mock_smtp.assert_called_with("smtp.gmail.com", 587)
+        mock_smtp.assert_called_with(
+            "smtp.gmail.com", 587, timeout=api.services.email.SMTP_TIMEOUT
+        )
 
         mock_server.starttls.assert_called_once()
         mock_server.login.assert_called_with("fake_user@gmail.com", "fake_password")
@@ -54,13 +64,196 @@ class TestMailSender(unittest.TestCase):
 
         self.assertFalse(result)
 
-        mock_smtp.assert_called_with("smtp.gmail.com", 587)
+        mock_smtp.assert_called_with(
+            "smtp.gmail.com", 587, timeout=api.services.email.SMTP_TIMEOUT
+        )
         mock_server.starttls.assert_called_once()
         mock_server.login.assert_called_once()
 
         mock_server.send_message.assert_not_called()
         mock_server.quit.assert_not_called()
 
+    @patch("api.services.email.GMAIL_USER", "fake_user@gmail.com")
+    @patch("api.services.email.GMAIL_APP_PASSWORD", "fake_password")
+    @patch("api.services.email.SMTP_STARTTLS", False)
+    @patch("api.services.email.smtplib.SMTP")
+    def test_send_email_without_starttls(self, mock_smtp):
+        """Prueba que el envío directo respeta SMTP_STARTTLS=false, igual que el dispatcher."""
+        mock_server = MagicMock()
+        mock_smtp.return_value = mock_server
+
+        self.assertTrue(send_magic_link_email("test@example.com", "http://magic.link"))
+
+        mock_server.starttls.assert_not_called()
+        mock_server.send_message.assert_called_once()
+
+
+class SinkHandler:
+    """Guarda los emails que recibe el servidor SMTP de prueba."""
+
+    def __init__(self):
+        self.messages = []
+        self.peers = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        self.peers.add(session.peer)
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestEmailDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = SinkHandler()
+        self.controller = Controller(
+            self.handler, hostname="127.0.0.1", port=free_port()
+        )
+        self.controller.start()
+        self.addCleanup(self.controller.stop)
+
+    def new_dispatcher(self, **kwargs) -> EmailDispatcher:
+        return EmailDispatcher(
+            host=self.controller.hostname,
+            port=self.controller.port,
+            starttls=False,
+            **kwargs,
+        )
+
+    def test_batch_uses_one_session(self):
+        """Prueba que muchos emails encolados se mandan por una sola sesión SMTP."""
+        dispatcher = self.new_dispatcher(batch_size=50)
+        for i in range(20):
+            dispatcher.enqueue(build_magic_link_email(f"user{i}@example.com", "http://x"))
+
+        dispatcher.start()
+        dispatcher.flush()
+        dispatcher.stop()
+
+        self.assertEqual(len(self.handler.messages), 20)
+        self.assertEqual(len(self.handler.peers), 1)
+        self.assertEqual(dispatcher.sent, 20)
+
+    def test_session_is_reused_between_batches(self):
+        """Prueba que la sesión sigue abierta entre una tanda y la siguiente."""
+        dispatcher = self.new_dispatcher()
+        dispatcher.start()
+
+        dispatcher.enqueue(build_magic_link_email("a@example.com", "http://x"))
+        dispatcher.flush()
+        dispatcher.enqueue(build_magic_link_email("b@example.com", "http://x"))
+        dispatcher.flush()
+        dispatcher.stop()
+
+        self.assertEqual(len(self.handler.messages), 2)
+        self.assertEqual(len(self.handler.peers), 1)
+
+    def test_stop_sends_pending_emails(self):
+        """Prueba que al detenerse se mandan los emails que quedaban en la cola."""
+        dispatcher = self.new_dispatcher()
+        dispatcher.start()
+        for i in range(5):
+            dispatcher.enqueue(build_magic_link_email(f"user{i}@example.com", "http://x"))
+
+        dispatcher.stop()
+
+        self.assertEqual(len(self.handler.messages), 5)
+
+    def test_full_queue_rejects_email(self):
+        """Prueba que la cola acotada no crece sin límite."""
+        dispatcher = self.new_dispatcher(queue_size=1)
+
+        self.assertTrue(dispatcher.enqueue(build_magic_link_email("a@example.com", "x")))
+        self.assertFalse(dispatcher.enqueue(build_magic_link_email("b@example.com", "x")))
+
+    @patch("api.services.email.smtplib.SMTP")
+    def test_retry_opens_new_session(self, mock_smtp):
+        """Prueba que si la sesión se corta se reintenta con una sesión nueva."""
+        broken, healthy = MagicMock(), MagicMock()
+        broken.send_message.side_effect = smtplib.SMTPServerDisconnected("cortada")
+        mock_smtp.side_effect = [broken, healthy]
+
+        dispatcher = EmailDispatcher(
+            host="smtp.test", port=25, starttls=False, retry_backoff=0
+        )
+        dispatcher.enqueue(build_magic_link_email("a@example.com", "http://x"))
+        dispatcher.start()
+        dispatcher.flush()
+        dispatcher.stop()
+
+        self.assertEqual(mock_smtp.call_count, 2)
+        healthy.send_message.assert_called_once()
+        self.assertEqual((dispatcher.sent, dispatcher.failed), (1, 0))
+
+    @patch("api.services.email.smtplib.SMTP")
+    def test_retry_does_not_block_other_emails(self, mock_smtp):
+        """Prueba que mientras un email espera su reintento los demás se siguen mandando."""
+        sent_to = []
+
+        def send_message(msg):
+            sent_to.append(msg["To"])
+            if len(sent_to) == 1:
+                raise smtplib.SMTPServerDisconnected("cortada")
+
+        mock_smtp.return_value.send_message.side_effect = send_message
+
+        dispatcher = EmailDispatcher(
+            host="smtp.test", port=25, starttls=False, retry_backoff=0.2
+        )
+        dispatcher.enqueue(build_magic_link_email("a@example.com", "http://x"))
+        dispatcher.enqueue(build_magic_link_email("b@example.com", "http://x"))
+        dispatcher.start()
+        dispatcher.flush()
+        dispatcher.stop()
+
+        self.assertEqual(sent_to, ["a@example.com", "b@example.com", "a@example.com"])
+        self.assertEqual((dispatcher.sent, dispatcher.failed), (2, 0))
+
+    @patch("api.services.email.smtplib.SMTP")
+    def test_stop_drops_pending_retries(self, mock_smtp):
+        """Prueba que al detenerse no se espera a los reintentos pendientes."""
+        mock_smtp.return_value.send_message.side_effect = smtplib.SMTPServerDisconnected()
+
+        dispatcher = EmailDispatcher(
+            host="smtp.test", port=25, starttls=False, retry_backoff=60
+        )
+        dispatcher.enqueue(build_magic_link_email("a@example.com", "http://x"))
+        dispatcher.start()
+        dispatcher.stop(timeout=5)
+
+        self.assertEqual(mock_smtp.return_value.send_message.call_count, 1)
+        self.assertEqual(dispatcher.failed, 1)
+
+    @patch("api.services.email.smtplib.SMTP")
+    def test_gives_up_after_max_retries(self, mock_smtp):
+        """Prueba que un email que siempre falla se descarta sin trabar la cola."""
+        mock_smtp.return_value.send_message.side_effect = smtplib.SMTPServerDisconnected()
+
+        dispatcher = EmailDispatcher(
+            host="smtp.test", port=25, starttls=False, max_retries=2, retry_backoff=0
+        )
+        dispatcher.enqueue(build_magic_link_email("a@example.com", "http://x"))
+        dispatcher.start()
+        dispatcher.flush()
+        dispatcher.stop()
+
+        self.assertEqual(mock_smtp.return_value.send_message.call_count, 3)
+        self.assertEqual(dispatcher.failed, 1)
+
+    @patch("api.services.email._dispatcher", None)
+    @patch("api.services.email.send_magic_link_email", return_value=True)
+    def test_enqueue_without_dispatcher_sends_now(self, mock_send):
+        """Prueba que sin dispatcher (fuera de la API) el email se manda en el momento."""
+        result = api.services.email.enqueue_magic_link_email("a@example.com", "http://x")
+
+        self.assertTrue(result)
+        mock_send.assert_called_once_with("a@example.com", "http://x")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,181 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from fastapi import FastAPI, HTTPException
+from prometheus_client import CollectorRegistry, generate_latest
+
+from api.services.cache import TTLCache
+from api.services.metrics import (
+    CallbackGauge,
+    PrometheusMiddleware,
+    cache_requests,
+    registry,
+    render_metrics,
+)
+from api.services.snowflake import SnowflakeConnectionPool
+
+
+async def call_asgi(app, path: str, method: str = "GET"):
+    """Hace una request directo contra la app ASGI (sin servidor ni httpx)."""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+    await app(scope, receive, send)
+    return messages[0]["status"]
+
+
+def sample(name: str, **labels) -> float:
+    """Valor actual de una serie del registro de la API (0 si todavía no existe)."""
+    return registry.get_sample_value(name, labels) or 0
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test_render_exposition_format(self):
+        """Prueba que /metrics expone las métricas de la API en formato Prometheus."""
+        cache_requests.labels(cache="render", result="hit").inc()
+
+        text = render_metrics().decode()
+
+        self.assertIn("# TYPE cache_requests_total counter", text)
+        self.assertIn('cache_requests_total{cache="render",result="hit"} 1.0', text)
+        self.assertIn("# TYPE http_request_duration_seconds histogram", text)
+
+    def test_callback_gauge_reads_on_render(self):
+        """Prueba que un CallbackGauge se calcula al exponer."""
+        other = CollectorRegistry()
+        CallbackGauge("pool", "Pool.", ("state",), read=lambda: {("idle",): 3}, registry=other)
+
+        self.assertEqual(other.get_sample_value("pool", {"state": "idle"}), 3)
+
+    def test_callback_gauge_survives_read_errors(self):
+        """Prueba que si 'read' falla la métrica sale vacía y el resto se expone igual."""
+        other = CollectorRegistry()
+
+        def broken():
+            raise RuntimeError("sin pool")
+
+        CallbackGauge("pool", "Pool.", ("state",), read=broken, registry=other)
+
+        self.assertIn("# TYPE pool gauge", generate_latest(other).decode())
+
+
+class TestPrometheusMiddleware(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.app = FastAPI()
+        self.app.add_middleware(PrometheusMiddleware)
+
+        @self.app.get("/items/{item_id}")
+        async def read_item(item_id: int):
+            if item_id == 0:
+                raise HTTPException(status_code=404)
+            return {"id": item_id}
+
+    async def test_latency_by_route_template(self):
+        """Prueba que la latencia se agrupa por la plantilla de la ruta y el status."""
+        labels = {"method": "GET", "route": "/items/{item_id}"}
+        name = "http_request_duration_seconds_count"
+        ok_before = sample(name, status="200", **labels)
+        missing_before = sample(name, status="404", **labels)
+
+        self.assertEqual(await call_asgi(self.app, "/items/1"), 200)
+        self.assertEqual(await call_asgi(self.app, "/items/2"), 200)
+        self.assertEqual(await call_asgi(self.app, "/items/0"), 404)
+
+        self.assertEqual(sample(name, status="200", **labels), ok_before + 2)
+        self.assertEqual(sample(name, status="404", **labels), missing_before + 1)
+
+    async def test_unknown_paths_share_one_series(self):
+        """Prueba que las URLs inexistentes no crean una serie por path."""
+        labels = {"method": "GET", "route": "unmatched", "status": "404"}
+        before = sample("http_request_duration_seconds_count", **labels)
+
+        await call_asgi(self.app, "/no-existe-1")
+        await call_asgi(self.app, "/no-existe-2")
+
+        self.assertEqual(sample("http_request_duration_seconds_count", **labels), before + 2)
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_cache_hits_and_misses(self):
+        """Prueba que el caché de consultas cuenta aciertos y fallos."""
+        cache = TTLCache(maxsize=10, ttl=60, name="test")
+
+        cache.get_or_compute("a", lambda: 1)
+        cache.get_or_compute("a", lambda: 1)
+        cache.get_or_compute("a", lambda: 1)
+
+        self.assertEqual(sample("cache_requests_total", cache="test", result="miss"), 1)
+        self.assertEqual(sample("cache_requests_total", cache="test", result="hit"), 2)
+
+    def test_pool_counters_and_stats(self):
+        """Prueba los contadores del pool y el gauge de conexiones libres y prestadas."""
+        pool = SnowflakeConnectionPool(
+            size=2, connect=lambda: MagicMock(**{"is_closed.return_value": False})
+        )
+        name = "snowflake_pool_acquires_total"
+        new_before = sample(name, result="new")
+        reused_before = sample(name, result="reused")
+
+        with pool.connection():
+            self.assertEqual(pool.stats(), {("idle",): 0, ("in_use",): 1})
+        with pool.connection():
+            pass
+
+        self.assertEqual(pool.stats(), {("idle",): 1, ("in_use",): 0})
+        self.assertEqual(sample(name, result="new"), new_before + 1)
+        self.assertEqual(sample(name, result="reused"), reused_before + 1)
+
+    def test_pool_stats_after_discard_and_failed_connect(self):
+        """Prueba que las conexiones descartadas o que no se abrieron no quedan como prestadas."""
+        connections = iter([MagicMock(**{"is_closed.return_value": False}), None])
+        pool = SnowflakeConnectionPool(size=2, connect=lambda: next(connections))
+
+        with self.assertRaises(ValueError):
+            with pool.connection():
+                raise ValueError("falló la consulta")
+        self.assertIsNone(pool.acquire())
+
+        self.assertEqual(pool.stats(), {("idle",): 0, ("in_use",): 0})
+
+    @patch("api.services.auth.JWT_ALGORITHM", "HS256")
+    @patch("api.services.auth.JWT_SECRET_KEY", "secreto-de-prueba")
+    def test_jwt_verification_time(self):
+        """Prueba que se mide la verificación del JWT, separando las del caché."""
+        from api.services.auth import create_access_token, decode_access_token
+
+        token = create_access_token({"sub": "a@ejemplo.com"})
+        name = "jwt_verify_duration_seconds_count"
+        cached_before = sample(name, cached="true")
+        verified_before = sample(name, cached="false")
+
+        decode_access_token(token)
+        decode_access_token(token)
+
+        self.assertEqual(sample(name, cached="false"), verified_before + 1)
+        self.assertEqual(sample(name, cached="true"), cached_before + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,16 @@
 # test_api.services.snowflake.py
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import patch, MagicMock, ANY
 from snowflake.connector import DictCursor
 
 import api.services.snowflake
+from api.services.cache import invalidate_query_cache
 
 
 class TestSnowflakeUtils(unittest.TestCase):
@@ -17,6 +24,9 @@ class TestSnowflakeUtils(unittest.TestCase):
         "SNOW_ROLE": "test_role",
     }
 
+    def setUp(self):
+        invalidate_query_cache()
+
     @patch("api.services.snowflake.snowflake.connector.connect")
     @patch.dict("os.environ", MOCK_ENV)
     def test_get_snowflake_connection_success(self, mock_connect):
@@ -107,6 +117,279 @@ class TestSnowflakeUtils(unittest.TestCase):
         result = api.services.snowflake.get_snowflake_b2b_vs_b2c_deals()
         self.assertEqual(result, {"error": "No se pudo conectar a Snowflake"})
 
+    @patch("api.services.snowflake.get_snowflake_connection")
+    def test_metrics_read_summary_tables(self, mock_get_connection):
+        """Prueba que las métricas leen los resúmenes y no las tablas de hechos."""
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = []
+        mock_cursor.fetchone.return_value = {}
+        mock_connection = MagicMock()
+        mock_connection.cursor.return_value = mock_cursor
+        mock_get_connection.return_value = mock_connection
+
+        api.services.snowflake.get_snowflake_b2b_vs_b2c_deals()
+        api.services.snowflake.get_snowflake_deals_by_segment()
+        api.services.snowflake.get_snowflake_deals_by_stage()
+        api.services.snowflake.get_snowflake_deals_by_day()
+        api.services.snowflake.get_snowflake_leads_by_status()
+
+        for call in mock_cursor.execute.call_args_list:
+            sql = call.args[0]
+            self.assertRegex(sql, r"FROM\s+(DEALS|LEADS)_DAILY_SUMMARY")
+            self.assertNotRegex(sql, r"FROM\s+(DEALS|LEADS)\s")
+
+    @patch("api.services.snowflake.get_snowflake_connection")
+    def test_deals_by_day_passes_range(self, mock_get_connection):
+        """Prueba que el rango de fechas viaja como parámetros de la consulta."""
+        rows = [{"day": "2025-01-01", "deal_count": 3}]
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = rows
+        mock_connection = MagicMock()
+        mock_connection.cursor.return_value = mock_cursor
+        mock_get_connection.return_value = mock_connection
+
+        result = api.services.snowflake.get_snowflake_deals_by_day("2025-01-01", "2025-01-31")
+
+        self.assertEqual(result, rows)
+        self.assertEqual(
+            mock_cursor.execute.call_args.args[1],
+            {"start": "2025-01-01", "end": "2025-01-31"},
+        )
+
+
+class TestSnowflakeConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        invalidate_query_cache()
+
+    def make_pool(self, **kwargs):
+        connections = []
+
+        def connect():
+            conn = MagicMock()
+            conn.is_closed.return_value = False
+            connections.append(conn)
+            return conn
+
+        pool = api.services.snowflake.SnowflakeConnectionPool(connect=connect, **kwargs)
+        return pool, connections
+
+    def test_connection_is_reused(self):
+        """Prueba que una conexión devuelta al pool se vuelve a prestar."""
+        pool, connections = self.make_pool(size=2)
+
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(len(connections), 1)
+        first.close.assert_not_called()
+
+    def test_pool_size_is_respected(self):
+        """Prueba que no se prestan más conexiones que el tamaño del pool."""
+        pool, _ = self.make_pool(size=1)
+
+        conn = pool.acquire()
+        with self.assertRaises(TimeoutError):
+            pool.acquire(timeout=0.01)
+
+        pool.release(conn)
+        self.assertIs(pool.acquire(timeout=0.01), conn)
+
+    def test_closed_connection_is_replaced(self):
+        """Prueba que una conexión que ya no está viva se cierra y se reemplaza."""
+        pool, connections = self.make_pool(size=1)
+
+        with pool.connection() as first:
+            pass
+        first.is_closed.return_value = True
+
+        with pool.connection() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        self.assertEqual(len(connections), 2)
+
+    def test_health_check_on_quiet_connection(self):
+        """Prueba que una conexión quieta se verifica con SELECT 1 antes de usarla."""
+        pool, _ = self.make_pool(size=1, health_check_after=0)
+
+        with pool.connection() as conn:
+            pass
+        with pool.connection():
+            pass
+
+        conn.cursor.return_value.execute.assert_called_once_with("SELECT 1")
+
+    def test_idle_connections_are_evicted(self):
+        """Prueba que las conexiones ociosas se cierran al vencer el timeout."""
+        pool, _ = self.make_pool(size=1, idle_timeout=0)
+
+        with pool.connection() as conn:
+            pass
+        pool.evict_idle()
+
+        conn.close.assert_called_once()
+
+    def test_failed_use_discards_connection(self):
+        """Prueba que si falla el uso de la conexión no vuelve al pool."""
+        pool, connections = self.make_pool(size=1)
+
+        with self.assertRaises(RuntimeError):
+            with pool.connection() as conn:
+                raise RuntimeError("Conexión rota")
+
+        conn.close.assert_called_once()
+        with pool.connection():
+            pass
+        self.assertEqual(len(connections), 2)
+
+    def test_close_closes_idle_connections(self):
+        """Prueba que al cerrar el pool se cierran las conexiones libres."""
+        pool, _ = self.make_pool(size=1)
+
+        with pool.connection() as conn:
+            pass
+        pool.close()
+
+        conn.close.assert_called_once()
+        with self.assertRaises(RuntimeError):
+            pool.acquire()
+
+    @patch("api.services.snowflake.get_snowflake_connection")
+    def test_query_borrows_from_pool(self, mock_get_connection):
+        """Prueba que con pool la consulta no abre ni cierra conexiones propias."""
+        mock_connection = MagicMock()
+        mock_connection.is_closed.return_value = False
+        mock_connection.cursor.return_value.fetchone.return_value = {"TOTAL_DEALS": 1}
+        mock_get_connection.return_value = mock_connection
+
+        api.services.snowflake.init_snowflake_pool(size=1)
+        try:
+            api.services.snowflake.get_snowflake_b2b_vs_b2c_deals()
+            api.services.snowflake.get_snowflake_b2b_vs_b2c_deals()
+        finally:
+            api.services.snowflake.close_snowflake_pool()
+
+        mock_get_connection.assert_called_once()
+        mock_connection.close.assert_called_once()
+
+
+class TestMirrorBackend(unittest.TestCase):
+
+    def setUp(self):
+        invalidate_query_cache()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "metrics.sqlite")
+
+        # Las tablas de resumen tal como las publica el ETL
+        conn = sqlite3.connect(self.path)
+        conn.executescript(
+            """
+            CREATE TABLE DEALS_DAILY_SUMMARY (
+                "day" TEXT, "stage" TEXT, "segment" TEXT, "deal_count" INTEGER, "total_amount" REAL
+            );
+            INSERT INTO DEALS_DAILY_SUMMARY VALUES
+                ('2025-01-01', 'closedwon', 'B2B', 3, 300.0),
+                ('2025-01-02', 'closedwon', 'B2C', 2, 20.0);
+            """
+        )
+        conn.commit()
+        conn.close()
+
+        for name, value in {
+            "METRICS_BACKEND": "mirror",
+            "ANALYTICS_MIRROR_PATH": self.path,
+        }.items():
+            patcher = patch(f"api.services.snowflake.{name}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch("api.services.snowflake.get_snowflake_connection")
+    def test_metrics_read_from_mirror(self, mock_get_connection):
+        """Prueba que con METRICS_BACKEND=mirror se responde sin tocar Snowflake."""
+        result = api.services.snowflake.get_snowflake_b2b_vs_b2c_deals()
+
+        # Mismas claves que devuelve Snowflake (alias sin comillas en mayúsculas)
+        self.assertEqual(
+            result, {"TOTAL_DEALS_B2B": 3, "TOTAL_DEALS_B2C": 2, "TOTAL_DEALS": 5}
+        )
+        mock_get_connection.assert_not_called()
+
+    def test_mirror_query_params(self):
+        """Prueba que la consulta del espejo filtra por fecha con los parámetros."""
+        rows = api.services.snowflake.get_snowflake_deals_by_day("2025-01-02", None)
+
+        self.assertEqual(
+            rows,
+            [
+                {
+                    "day": "2025-01-02",
+                    "deal_count": 2,
+                    "deal_count_b2b": 0,
+                    "deal_count_b2c": 2,
+                    "total_amount": 20.0,
+                }
+            ],
+        )
+
+    def test_missing_mirror_returns_error(self):
+        """Prueba que sin archivo publicado se devuelve un error (que no se cachea)."""
+        os.remove(self.path)
+
+        result = api.services.snowflake.get_snowflake_deals_by_segment()
+
+        self.assertIn("error", result)
+
+
+class TestAsyncSnowflakeQueries(unittest.IsolatedAsyncioTestCase):
+
+    def tearDown(self):
+        api.services.snowflake.shutdown_query_executor()
+
+    async def test_query_does_not_block_event_loop(self):
+        """Prueba que mientras corre la consulta el event loop sigue atendiendo."""
+        release = threading.Event()
+
+        def slow_query():
+            release.wait(timeout=1)
+            return {"TOTAL_DEALS": 1}
+
+        with patch("api.services.snowflake.get_snowflake_b2b_vs_b2c_deals", slow_query):
+            task = asyncio.create_task(
+                api.services.snowflake.aget_snowflake_b2b_vs_b2c_deals()
+            )
+            await asyncio.sleep(0.01)
+            self.assertFalse(task.done())
+
+            release.set()
+            self.assertEqual(await task, {"TOTAL_DEALS": 1})
+
+    async def test_concurrency_limit(self):
+        """Prueba que no corren más consultas a la vez que las configuradas."""
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def query():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+            return {}
+
+        api.services.snowflake.init_query_executor(max_workers=2)
+        await asyncio.gather(
+            *(api.services.snowflake.run_query(query) for _ in range(6))
+        )
+
+        self.assertEqual(max(peak), 2)
+
 
 if __name__ == "__main__":
     unittest.main()
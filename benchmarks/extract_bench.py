@@ -0,0 +1,165 @@
+"""
+Mide registros/seg y memoria máxima (RSS) de las etapas de extracción y
+transformación contra el emulador local de HubSpot (suite/emulator.py).
+
+    python benchmarks/extract_bench.py
+    python benchmarks/extract_bench.py --sizes 10000 100000 1000000
+    python benchmarks/extract_bench.py --stage seed --sizes 10000
+
+Cada tamaño corre en un proceso nuevo (el RSS de uno no contamina al otro)
+contra un emulador en otro proceso con N deals y N contactos.
+"""
+
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+suite_dir = os.path.join(root_dir, "suite")
+
+
+def peak_rss_mb() -> float:
+    # En Linux ru_maxrss viene en KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_extract_transform() -> dict:
+    from extract import extract_data
+    from transform import transform_data
+
+    start = time.perf_counter()
+    deals, leads = extract_data()
+    extract_seconds = time.perf_counter() - start
+    extract_rss = peak_rss_mb()
+
+    start = time.perf_counter()
+    transform_data(deals, leads)
+    transform_seconds = time.perf_counter() - start
+
+    records = len(deals) + len(leads)
+    return {
+        "records": records,
+        "extract_seconds": round(extract_seconds, 3),
+        "extract_records_per_sec": round(records / extract_seconds),
+        "extract_peak_rss_mb": round(extract_rss, 1),
+        "transform_seconds": round(transform_seconds, 3),
+        "transform_records_per_sec": round(records / transform_seconds),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def run_seed(size: int) -> dict:
+    import seed
+
+    contacts_per_company = 10
+    with tempfile.TemporaryDirectory() as tmp:
+        args = argparse.Namespace(
+            companies=max(size // contacts_per_company, 1),
+            contacts_per_company=contacts_per_company,
+            b2b_ratio=0.5,
+            workers=8,
+            resume_file=os.path.join(tmp, "seed.jsonl"),
+            fresh=True,
+        )
+        start = time.perf_counter()
+        seed.seed(args)
+        seconds = time.perf_counter() - start
+
+    # compañías + contactos + deals
+    records = args.companies * (1 + 2 * contacts_per_company)
+    return {
+        "records": records,
+        "seed_seconds": round(seconds, 3),
+        "seed_records_per_sec": round(records / seconds),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def start_emulator(size: int, latency_ms: float) -> subprocess.Popen:
+    port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(suite_dir, "emulator.py"),
+            "--port", str(port),
+            "--deals", str(size),
+            "--contacts", str(size),
+            "--companies", str(max(size // 10, 1)),
+            "--latency-ms", str(latency_ms),
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    process.base_url = f"http://127.0.0.1:{port}"
+
+    for _ in range(100):
+        try:
+            requests.get(f"{process.base_url}/crm/v3/objects/deals", params={"limit": 1})
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("El emulador no arrancó")
+
+
+def run_size(stage: str, size: int, latency_ms: float) -> dict:
+    emulator = start_emulator(size if stage == "extract" else 0, latency_ms)
+    try:
+        env = {
+            **os.environ,
+            "PYTHONPATH": suite_dir,
+            "HUBSPOT_API_BASE": emulator.base_url,
+            "HUBSPOT_ACCESS_TOKEN": "emulator",
+            # El emulador no limita: el benchmark mide al ETL, no al rate limiter
+            "HUBSPOT_REQUESTS_PER_SECOND": "100000",
+            "HUBSPOT_BURST": "1000",
+            "HUBSPOT_DAILY_LIMIT": str(10**9),
+        }
+        output = subprocess.run(
+            [sys.executable, __file__, "--run-one", stage, "--size", str(size)],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+    finally:
+        emulator.kill()
+        emulator.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stage", choices=("extract", "seed"), default="extract")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--run-one", choices=("extract", "seed"), help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        # Proceso hijo: corre una medición y la imprime como JSON en la última línea
+        result = run_extract_transform() if args.run_one == "extract" else run_seed(args.size)
+        print(json.dumps(result))
+        return
+
+    for size in args.sizes:
+        result = run_size(args.stage, size, args.latency_ms)
+        print(json.dumps({"stage": args.stage, "size": size, **result}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Compara el parseo de las páginas de HubSpot: response.json() (el camino
+anterior) contra parse_json con orjson y con json de la librería estándar.
+
+    python benchmarks/json_parse_bench.py
+    python benchmarks/json_parse_bench.py --pages 200 --encoding identity
+
+Las páginas se arman con los datos del emulador (suite/emulator.py) y pasan
+por el mismo camino que una respuesta real de requests (descompresión
+incluida). Reporta registros/seg y el pico de memoria asignada (tracemalloc)
+al parsear una página.
+"""
+
+import argparse
+import gzip
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import requests
+from urllib3 import HTTPResponse
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root_dir, "suite"))
+
+import hubspot_client  # noqa: E402
+from emulator import FakePortal  # noqa: E402
+from extract import PAGE_SIZE, params  # noqa: E402
+
+
+def build_pages(pages: int) -> list:
+    """Cuerpos JSON de páginas de deals y contactos, como los del listado."""
+    portal = FakePortal(deals=pages * PAGE_SIZE, contacts=pages * PAGE_SIZE)
+    properties = params["properties"].split(",")
+    bodies = []
+    for page in range(pages):
+        object_type = "deals" if page % 2 == 0 else "contacts"
+        start = page * PAGE_SIZE
+        results = [
+            portal.get(object_type, i, properties=properties)
+            for i in range(start, start + PAGE_SIZE)
+        ]
+        body = {"results": results, "paging": {"next": {"after": str(start + PAGE_SIZE)}}}
+        bodies.append(json.dumps(body).encode())
+    return bodies
+
+
+def make_response(body: bytes, encoding: str) -> requests.Response:
+    """Una respuesta de requests sin leer, con el cuerpo tal como viene de la red."""
+    headers = {"Content-Type": "application/json;charset=utf-8"}
+    if encoding == "gzip":
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+
+    response = requests.Response()
+    response.status_code = 200
+    response.headers.update(headers)
+    response.raw = HTTPResponse(
+        body=io.BytesIO(body), headers=headers, preload_content=False, decode_content=True
+    )
+    return response
+
+
+def stdlib_parse_json(response: requests.Response):
+    """Lo que hace parse_json cuando orjson no está instalado."""
+    return json.loads(response.content)
+
+
+def measure(name: str, parse, bodies: list, encoding: str, repeat: int) -> dict:
+    parse(make_response(bodies[0], encoding))  # calentamiento
+
+    # Las respuestas se arman antes: se mide solo descomprimir y parsear
+    seconds = 0.0
+    for _ in range(repeat):
+        responses = [make_response(body, encoding) for body in bodies]
+        start = time.perf_counter()
+        for response in responses:
+            parse(response)
+        seconds += time.perf_counter() - start
+
+    response = make_response(bodies[0], encoding)
+    tracemalloc.start()
+    parse(response)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    records = len(bodies) * PAGE_SIZE * repeat
+    return {
+        "parser": name,
+        "records_per_sec": round(records / seconds),
+        "mb_per_sec": round(sum(map(len, bodies)) * repeat / seconds / 1e6, 1),
+        "page_peak_alloc_kb": round(peak / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--encoding", choices=("gzip", "identity"), default="gzip")
+    args = parser.parse_args()
+
+    bodies = build_pages(args.pages)
+    parsers = {"response.json()": lambda response: response.json()}
+    if hubspot_client.orjson is not None:
+        parsers["parse_json (orjson)"] = hubspot_client.parse_json
+    else:
+        print("orjson no está instalado, se omite")
+    parsers["parse_json (json)"] = stdlib_parse_json
+
+    for name, parse in parsers.items():
+        result = measure(name, parse, bodies, args.encoding, args.repeat)
+        print(json.dumps({"encoding": args.encoding, **result}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Mide cuánto cuesta verificar el JWT de una request protegida.
+
+    python -m benchmarks.jwt_verify_bench
+
+Compara python-jose (si está instalado), PyJWT sin caché y la verificación
+con caché que usa get_current_user.
+"""
+
+import os
+import timeit
+from datetime import timedelta
+
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark_secret_" + "x" * 32)
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+
+import jwt  # noqa: E402
+
+from api.services import auth  # noqa: E402
+from api.services.cache import jwt_cache  # noqa: E402
+
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", 20000))
+
+
+def report(name: str, func, iterations: int = ITERATIONS):
+    func()  # calentamiento
+    total = timeit.timeit(func, number=iterations)
+    print(f"{name:<28} {total / iterations * 1e6:8.2f} us/verificación")
+
+
+def main():
+    token = auth.create_access_token(
+        {"sub": "user@example.com"}, expires_delta=timedelta(minutes=30)
+    )
+    secret, algorithm = auth.JWT_SECRET_KEY, auth.JWT_ALGORITHM
+
+    try:
+        from jose import jwt as jose_jwt
+
+        report(
+            "python-jose",
+            lambda: jose_jwt.decode(token, secret, algorithms=[algorithm]),
+        )
+    except ImportError:
+        print("python-jose no está instalado, se omite")
+
+    report("PyJWT", lambda: jwt.decode(token, secret, algorithms=[algorithm]))
+
+    jwt_cache.clear()
+    report("PyJWT + caché", lambda: auth.decode_access_token(token))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+
+import pandas as pd
+from dotenv import load_dotenv
+
+import hubspot_client
+from extract import (
+    CREATED_PROPERTY,
+    SEARCH_RESULT_CAP,
+    extract_archived,
+    extract_window_pages,
+    now_ms,
+    split_search_windows,
+    to_epoch_ms,
+)
+from load import table_keys
+from metrics import metrics
+from pipeline import pipeline_objects
+
+load_dotenv()
+
+# Desde qué fecha de creación se parte el portal (HubSpot no tiene datos anteriores)
+BACKFILL_START = os.getenv("ETL_BACKFILL_START", "2006-01-01T00:00:00+00:00")
+# Procesos del pool: la transformación usa CPU, uno por núcleo
+BACKFILL_WORKERS = int(os.getenv("ETL_BACKFILL_WORKERS", os.cpu_count() or 1))
+# Registros por rango (como mucho el límite de 10.000 de la búsqueda). Rangos
+# más chicos reparten mejor el trabajo entre procesos, a costa de más requests.
+BACKFILL_PARTITION_SIZE = int(os.getenv("ETL_BACKFILL_PARTITION_SIZE", SEARCH_RESULT_CAP))
+
+Partition = Tuple[str, int, int]
+
+
+def plan_partitions(
+    object_types: List[str],
+    start_ms: int,
+    end_ms: int,
+    partition_size: int = BACKFILL_PARTITION_SIZE,
+) -> List[Partition]:
+    """
+    Parte cada tipo de objeto en rangos de createdate [inicio, fin) con hasta
+    'partition_size' registros. Se dividen por la mitad según lo que cuenta la
+    búsqueda, así los rangos se adaptan a cómo están repartidos los datos.
+    """
+    return [
+        (object_type, window_start, window_end)
+        for object_type in object_types
+        for window_start, window_end in split_search_windows(
+            object_type, start_ms, end_ms, CREATED_PROPERTY, partition_size
+        )
+    ]
+
+
+def init_worker(processes: int):
+    hubspot_client.reset_session()
+    hubspot_client.share_rate_limits(processes)
+
+
+def extract_transform_partition(
+    object_type: str, start_ms: int, end_ms: int
+) -> Tuple[Dict[str, pd.DataFrame], Dict[str, float]]:
+    """
+    Corre en un proceso del pool: extrae un rango de createdate y lo transforma.
+    Devuelve las tablas y los contadores del proceso (requests, bytes...) para
+    sumarlos a las métricas de la corrida.
+    """
+    metrics.reset()
+
+    records: List[dict] = []
+    for page in extract_window_pages(object_type, start_ms, end_ms, CREATED_PROPERTY):
+        records.extend(page)
+
+    return pipeline_objects[object_type](records), dict(metrics.counters)
+
+
+def merge_tables(parts: Dict[str, List[pd.DataFrame]]) -> Dict[str, pd.DataFrame]:
+    """
+    Junta los resultados de todos los rangos. Un registro cuya createdate
+    cambió durante el backfill puede venir en dos rangos: queda una sola fila.
+    """
+    tables = {}
+    for table_name, frames in parts.items():
+        df = pd.concat([f for f in frames if len(f)] or frames[:1], ignore_index=True)
+        if table_name in table_keys:
+            df = df.drop_duplicates(subset=table_keys[table_name], keep="last")
+        else:
+            df = df.drop_duplicates()
+        tables[table_name] = df.reset_index(drop=True)
+    return tables
+
+
+def run_backfill(
+    workers: int = BACKFILL_WORKERS,
+    start: str = BACKFILL_START,
+    partition_size: int = BACKFILL_PARTITION_SIZE,
+) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, pd.DataFrame]]:
+    """
+    Backfill completo en paralelo: parte deals y contactos en rangos de
+    createdate y cada proceso del pool extrae y transforma los suyos.
+    Devuelve lo mismo que transform_data: DEALS, LEADS y las tablas puente.
+    """
+    print("Iniciando backfill...")
+
+    object_types = list(pipeline_objects)
+    partitions = plan_partitions(object_types, to_epoch_ms(start), now_ms(), partition_size)
+    print(f"Backfill: {len(partitions)} rangos de createdate en {workers} procesos.")
+
+    # Tablas vacías de cada tipo, por si no hay registros
+    parts: Dict[str, List[pd.DataFrame]] = {}
+    for object_type in object_types:
+        for table_name, df in pipeline_objects[object_type]([]).items():
+            parts[table_name] = [df]
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(workers,)
+    )
+    try:
+        futures = [executor.submit(extract_transform_partition, *p) for p in partitions]
+        for done, future in enumerate(as_completed(futures), start=1):
+            tables, counters = future.result()
+            for name, value in counters.items():
+                metrics.add(name, value)
+            for table_name, df in tables.items():
+                parts[table_name].append(df)
+            print(f"  Rango {done}/{len(partitions)} listo")
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+    # La búsqueda no devuelve los archivados: se listan aparte para que la
+    # carga los marque como borrados
+    for object_type in object_types:
+        archived = extract_archived(object_type)
+        for table_name, df in pipeline_objects[object_type](archived).items():
+            parts[table_name].append(df)
+
+    tables = merge_tables(parts)
+    df_deals = tables.pop("DEALS")
+    df_leads = tables.pop("LEADS")
+    print(f"Backfill completo: {len(df_deals)} deals y {len(df_leads)} leads.")
+    return df_deals, df_leads, tables
@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import time
+from typing import Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+from hubspot_client import json_loads
+from state import write_atomic
+
+load_dotenv()
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Directorio del checkpoint de la extracción completa. Por cada tipo de objeto
+# guarda las páginas ya leídas y el cursor ('after') de la siguiente:
+#   .etl_checkpoint/checkpoint.json         cuándo empezó la extracción
+#   .etl_checkpoint/deals/cursor.json       {"after": ..., "pages": ..., "done": ...}
+#   .etl_checkpoint/deals/page_000001.json  una página de la API
+CHECKPOINT_DIR = os.getenv(
+    "ETL_CHECKPOINT_DIR", os.path.join(script_dir, ".etl_checkpoint")
+)
+# Un checkpoint más viejo que esto se descarta: los datos ya están desactualizados
+CHECKPOINT_MAX_AGE_HOURS = float(os.getenv("ETL_CHECKPOINT_MAX_AGE_HOURS", 24))
+
+
+class ObjectCheckpoint:
+    """Páginas leídas y cursor de un tipo de objeto."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.cursor_file = os.path.join(directory, "cursor.json")
+        self.after: Optional[str] = None
+        self.pages = 0
+        self.records = 0
+        self.done = False
+
+        try:
+            with open(self.cursor_file, "rb") as f:
+                cursor = json.load(f)
+        except FileNotFoundError:
+            return
+        self.after = cursor["after"]
+        self.pages = cursor["pages"]
+        self.records = cursor["records"]
+        self.done = cursor["done"]
+
+    def page_file(self, number: int) -> str:
+        return os.path.join(self.directory, f"page_{number:06d}.json")
+
+    def load_pages(self) -> Iterator[List[dict]]:
+        """
+        Relee las páginas guardadas. Solo cuentan las que registra el cursor:
+        una página escrita justo antes de un corte se vuelve a pedir.
+        """
+        for number in range(1, self.pages + 1):
+            with open(self.page_file(number), "rb") as f:
+                yield json_loads(f.read())
+
+    def save_page(self, page: List[dict], after: Optional[str]):
+        """
+        Guarda una página y después el cursor de la siguiente ('after' es
+        None en la última). Con ese orden el cursor nunca apunta más allá de
+        lo que está en disco.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        write_atomic(self.page_file(self.pages + 1), json.dumps(page).encode())
+
+        self.pages += 1
+        self.records += len(page)
+        self.after = after
+        self.done = after is None
+        cursor = {
+            "after": self.after,
+            "pages": self.pages,
+            "records": self.records,
+            "done": self.done,
+        }
+        write_atomic(self.cursor_file, json.dumps(cursor).encode())
+
+
+class Checkpoint:
+    """Checkpoint de una extracción completa, con un subdirectorio por tipo de objeto."""
+
+    def __init__(self, directory: str = CHECKPOINT_DIR):
+        self.directory = directory
+        self.manifest_file = os.path.join(directory, "checkpoint.json")
+
+    def created_at(self) -> Optional[float]:
+        try:
+            with open(self.manifest_file, "rb") as f:
+                return json.load(f)["created_at"]
+        except FileNotFoundError:
+            return None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        write_atomic(self.manifest_file, json.dumps({"created_at": time.time()}).encode())
+
+    def object(self, object_type: str) -> ObjectCheckpoint:
+        return ObjectCheckpoint(os.path.join(self.directory, object_type))
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def open_checkpoint(
+    fresh: bool = False,
+    directory: str = CHECKPOINT_DIR,
+    max_age_hours: float = CHECKPOINT_MAX_AGE_HOURS,
+) -> Checkpoint:
+    """
+    Abre el checkpoint de la extracción anterior para continuarla. Con 'fresh'
+    o si es más viejo que 'max_age_hours' se descarta y se empieza de cero.
+    """
+    checkpoint = Checkpoint(directory)
+    created_at = checkpoint.created_at()
+
+    if created_at is not None:
+        age_hours = (time.time() - created_at) / 3600
+        if not fresh and age_hours <= max_age_hours:
+            print(f"Retomando la extracción del checkpoint de hace {age_hours:.1f} h.")
+            return checkpoint
+        print(f"Descartando el checkpoint de hace {age_hours:.1f} h.")
+        checkpoint.clear()
+
+    checkpoint.start()
+    return checkpoint
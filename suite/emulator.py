@@ -0,0 +1,620 @@
+import argparse
+import gzip
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from faker import Faker
+
+from seed import get_industries
+
+# Emulador local de la API CRM de HubSpot para pruebas y benchmarks sin
+# portal real. Los registros no se guardan: se generan a partir de su ID
+# (siempre iguales para la misma semilla), así un portal de 1M de registros
+# no ocupa memoria. Solo se guardan los que se crean por la API.
+
+# Fechas de los registros generados: el registro i se crea y modifica
+# RECORD_STEP después del registro i - 1
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+RECORD_STEP = timedelta(seconds=30)
+
+DEAL_STAGES = (
+    "appointmentscheduled",
+    "qualifiedtobuy",
+    "presentationscheduled",
+    "decisionmakerboughtin",
+    "contractsent",
+    "closedwon",
+    "closedlost",
+)
+LEAD_STATUSES = ("NEW", "OPEN", "IN_PROGRESS", "UNQUALIFIED")
+
+# Propiedades que HubSpot devuelve siempre, se pidan o no
+DEFAULT_PROPERTIES = ("createdate", "hs_lastmodifieddate", "hs_object_id")
+
+OBJECT_TYPES = ("deals", "contacts", "companies")
+# Nombre pedido en 'associations' (singular o plural) -> grupo en la respuesta
+ASSOCIATION_GROUPS = {
+    "company": "companies",
+    "companies": "companies",
+    "contact": "contacts",
+    "contacts": "contacts",
+}
+# Tipo de asociación por defecto de HubSpot (typeId) para cada par de objetos
+ASSOCIATION_TYPE_IDS = {
+    ("deals", "companies"): 5,
+    ("deals", "contacts"): 3,
+    ("contacts", "companies"): 1,
+}
+
+
+def to_iso(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{moment.microsecond // 1000:03d}Z"
+
+
+def to_ms(moment: datetime) -> int:
+    return int(moment.timestamp() * 1000)
+
+
+class FakePortal:
+    """
+    Datos del portal emulado. Cada contacto pertenece a una compañía y cada
+    deal a un contacto; 'b2b_ratio' de los deals también se asocian a la
+    compañía de su contacto (B2B), como en seed.py.
+    """
+
+    def __init__(
+        self,
+        deals: int = 1000,
+        contacts: int = 1000,
+        companies: int = 100,
+        b2b_ratio: float = 0.5,
+        seed: int = 0,
+    ):
+        self.counts = {"deals": deals, "contacts": contacts, "companies": max(companies, 1)}
+        self.b2b_ratio = b2b_ratio
+        self.seed = seed
+
+        # Faker es lento para generar millones de registros: se arma un pool
+        # de valores una vez y cada registro elige de ahí
+        faker = Faker()
+        faker.seed_instance(seed)
+        self.first_names = [faker.first_name() for _ in range(500)]
+        self.last_names = [faker.last_name() for _ in range(500)]
+        self.company_names = [faker.company() for _ in range(500)]
+        self.domains = [faker.domain_name() for _ in range(500)]
+        self.cities = [faker.city() for _ in range(200)]
+        self.countries = [faker.country() for _ in range(100)]
+        self.phrases = [faker.bs() for _ in range(500)]
+        self.industries = get_industries()
+
+        # Registros creados por la API: tipo -> {id: registro}
+        self.created: Dict[str, Dict[int, dict]] = {t: {} for t in OBJECT_TYPES}
+        self.lock = threading.Lock()
+
+    # --- Generación ---
+
+    def _rng(self, object_type: str, index: int) -> random.Random:
+        return random.Random(f"{self.seed}:{object_type}:{index}")
+
+    def record_time(self, index: int) -> datetime:
+        return EPOCH + RECORD_STEP * index
+
+    def contact_company(self, index: int) -> int:
+        return index % self.counts["companies"]
+
+    def deal_contact(self, index: int) -> Optional[int]:
+        return index % self.counts["contacts"] if self.counts["contacts"] else None
+
+    def deal_company(self, index: int) -> Optional[int]:
+        contact = self.deal_contact(index)
+        if contact is None:
+            return None
+        if self._rng("deals-b2b", index).random() >= self.b2b_ratio:
+            return None
+        return self.contact_company(contact)
+
+    def generated_properties(self, object_type: str, index: int) -> dict:
+        rng = self._rng(object_type, index)
+        moment = to_iso(self.record_time(index))
+        properties = {
+            "createdate": moment,
+            "hs_lastmodifieddate": moment,
+            "hs_object_id": str(index + 1),
+        }
+
+        if object_type == "deals":
+            amount = rng.randint(5000, 100000)
+            properties.update(
+                {
+                    "dealname": f"Deal - {rng.choice(self.phrases)}",
+                    # Como HubSpot: los números llegan como texto
+                    "amount": str(amount) if rng.random() < 0.9 else f"{amount}.50",
+                    "dealstage": rng.choice(DEAL_STAGES),
+                    "pipeline": "default",
+                }
+            )
+        elif object_type == "contacts":
+            first_name = rng.choice(self.first_names)
+            last_name = rng.choice(self.last_names)
+            properties.update(
+                {
+                    "firstname": first_name,
+                    "lastname": last_name,
+                    "email": f"{first_name}.{last_name}.{index}@example.com".lower(),
+                    "hs_lead_status": rng.choice(LEAD_STATUSES),
+                    "lastmodifieddate": moment,
+                }
+            )
+        else:
+            properties.update(
+                {
+                    "name": rng.choice(self.company_names),
+                    "domain": rng.choice(self.domains),
+                    "industry": rng.choice(self.industries),
+                    "city": rng.choice(self.cities),
+                    "country": rng.choice(self.countries),
+                }
+            )
+        return properties
+
+    def associations(self, object_type: str, index: int) -> dict:
+        """Asociaciones de un registro generado, como las devuelve el listado."""
+        groups = {}
+        if object_type == "deals":
+            company = self.deal_company(index)
+            contact = self.deal_contact(index)
+            if company is not None:
+                groups["companies"] = [(company, "deal_to_company")]
+            if contact is not None:
+                groups["contacts"] = [(contact, "deal_to_contact")]
+        elif object_type == "contacts":
+            groups["companies"] = [(self.contact_company(index), "contact_to_company")]
+
+        return {
+            name: {"results": [{"id": str(i + 1), "type": kind} for i, kind in items]}
+            for name, items in groups.items()
+        }
+
+    # --- Lectura ---
+
+    def total(self, object_type: str) -> int:
+        return self.counts[object_type] + len(self.created[object_type])
+
+    def get(
+        self,
+        object_type: str,
+        index: int,
+        properties: Optional[List[str]] = None,
+        associations: Optional[List[str]] = None,
+    ) -> dict:
+        """El registro en la posición 'index' (ID = index + 1)."""
+        generated = self.counts[object_type]
+        if index < generated:
+            all_properties = self.generated_properties(object_type, index)
+            all_associations = self.associations(object_type, index)
+            moment = all_properties["createdate"]
+        else:
+            with self.lock:
+                created = self.created[object_type][index]
+            all_properties = created["properties"]
+            all_associations = created["associations"]
+            moment = all_properties["createdate"]
+
+        wanted = set(DEFAULT_PROPERTIES) | set(properties or [])
+        record = {
+            "id": str(index + 1),
+            "properties": {k: v for k, v in all_properties.items() if k in wanted},
+            "createdAt": moment,
+            "updatedAt": all_properties["hs_lastmodifieddate"],
+            "archived": False,
+        }
+        if associations:
+            selected = {
+                ASSOCIATION_GROUPS[name]: all_associations[ASSOCIATION_GROUPS[name]]
+                for name in associations
+                if ASSOCIATION_GROUPS.get(name) in all_associations
+            }
+            if selected:
+                record["associations"] = selected
+        return record
+
+    def modified_range(
+        self, object_type: str, start_ms: int, end_ms: int
+    ) -> Tuple[int, int]:
+        """
+        Índices de los registros generados modificados en [start_ms, end_ms).
+        Las fechas crecen con el índice, así que es un rango contiguo.
+        """
+        step_ms = RECORD_STEP.total_seconds() * 1000
+        epoch_ms = to_ms(EPOCH)
+        first = max(0, -(-(start_ms - epoch_ms) // int(step_ms)))
+        last = max(0, -(-(end_ms - epoch_ms) // int(step_ms)))
+        generated = self.counts[object_type]
+        return min(first, generated), min(last, generated)
+
+    def created_in_range(self, object_type: str, start_ms: int, end_ms: int) -> List[int]:
+        """
+        Índices de los registros creados por la API modificados en
+        [start_ms, end_ms), en el orden en que se crearon.
+        """
+        with self.lock:
+            created = list(self.created[object_type].items())
+        return [
+            index for index, record in created if start_ms <= record["modified_ms"] < end_ms
+        ]
+
+    # --- Escritura ---
+
+    def create(self, object_type: str, properties: dict, associations: list) -> dict:
+        now = datetime.now(timezone.utc)
+        moment = to_iso(now)
+        properties = {
+            **{k: str(v) for k, v in properties.items()},
+            "createdate": moment,
+            "hs_lastmodifieddate": moment,
+        }
+
+        groups: Dict[str, list] = {}
+        for item in associations or []:
+            to_id = str(item["to"]["id"])
+            type_id = item["types"][0]["associationTypeId"]
+            target = {1: "companies", 3: "contacts", 5: "companies"}.get(type_id, "companies")
+            groups.setdefault(target, []).append({"id": to_id, "type": str(type_id)})
+
+        with self.lock:
+            index = self.total(object_type)
+            properties["hs_object_id"] = str(index + 1)
+            self.created[object_type][index] = {
+                "modified_ms": to_ms(now),
+                "properties": properties,
+                "associations": {name: {"results": items} for name, items in groups.items()},
+            }
+
+        return {
+            "id": str(index + 1),
+            "properties": properties,
+            "createdAt": moment,
+            "updatedAt": moment,
+            "archived": False,
+        }
+
+
+class RateLimitWindow:
+    """Ventana fija como la de HubSpot: 'max_requests' cada 'interval_ms'."""
+
+    def __init__(self, max_requests: int, interval_ms: int):
+        self.max_requests = max_requests
+        self.interval_ms = interval_ms
+        self.window_start = time.monotonic()
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def hit(self) -> Tuple[bool, int, float]:
+        """Registra una request. Devuelve (permitida, restantes, segundos hasta la próxima ventana)."""
+        with self.lock:
+            now = time.monotonic()
+            interval = self.interval_ms / 1000
+            if now - self.window_start >= interval:
+                self.window_start = now
+                self.used = 0
+            reset_in = interval - (now - self.window_start)
+            if self.used >= self.max_requests:
+                return False, 0, reset_in
+            self.used += 1
+            return True, self.max_requests - self.used, reset_in
+
+
+# Nivel bajo: comprime casi lo mismo que 9 y no frena al emulador
+GZIP_LEVEL = 1
+
+OBJECT_PATH = re.compile(r"^/crm/v3/objects/(deals|contacts|companies)(/search|/batch/create)?/?$")
+ASSOCIATIONS_PATH = re.compile(r"^/crm/v4/associations/(deals|contacts)/(companies|contacts)/batch/read/?$")
+
+
+class EmulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como la API real
+    # Headers y body salen en dos escrituras: con Nagle cada respuesta
+    # esperaría el ACK demorado del cliente (~40 ms)
+    disable_nagle_algorithm = True
+
+    @property
+    def portal(self) -> FakePortal:
+        return self.server.portal
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status: int, body: dict, headers: Optional[dict] = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=utf-8")
+        # Como la API real: comprime si el cliente acepta gzip
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            data = gzip.compress(data, compresslevel=GZIP_LEVEL)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def before_request(self) -> Optional[dict]:
+        """Latencia simulada y límite de requests. Devuelve los headers de límite o None si respondió 429."""
+        server = self.server
+        with server.counters_lock:
+            server.request_count += 1
+        if server.latency:
+            time.sleep(server.latency)
+
+        if server.rate_limit is None:
+            return {}
+
+        allowed, remaining, reset_in = server.rate_limit.hit()
+        headers = {
+            "X-HubSpot-RateLimit-Max": server.rate_limit.max_requests,
+            "X-HubSpot-RateLimit-Remaining": remaining,
+            "X-HubSpot-RateLimit-Interval-Milliseconds": server.rate_limit.interval_ms,
+        }
+        if not allowed:
+            with server.counters_lock:
+                server.throttled_count += 1
+            self.read_json()  # vacía el body para poder reutilizar la conexión
+            headers["Retry-After"] = f"{reset_in:.3f}"
+            self.send_json(
+                429,
+                {"status": "error", "category": "RATE_LIMITS", "message": "Too many requests"},
+                headers,
+            )
+            return None
+        return headers
+
+    def page(self, object_type: str, indexes: range, after: int, limit: int, **kwargs):
+        start = after
+        end = min(start + limit, indexes.stop)
+        results = [self.portal.get(object_type, i, **kwargs) for i in range(start, end)]
+        body = {"results": results}
+        if end < indexes.stop:
+            body["paging"] = {"next": {"after": str(end)}}
+        return body
+
+    def do_GET(self):
+        headers = self.before_request()
+        if headers is None:
+            return
+
+        url = urlparse(self.path)
+        match = OBJECT_PATH.match(url.path)
+        if not match or match.group(2):
+            self.send_json(404, {"status": "error", "message": "Not found"}, headers)
+            return
+
+        object_type = match.group(1)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        limit = min(int(query.get("limit", 10)), 100)
+        after = int(query.get("after", 0))
+
+        if query.get("archived") == "true":
+            # El portal emulado no tiene registros archivados
+            self.send_json(200, {"results": []}, headers)
+            return
+
+        body = self.page(
+            object_type,
+            range(0, self.portal.total(object_type)),
+            after,
+            limit,
+            properties=query.get("properties", "").split(","),
+            associations=[a for a in query.get("associations", "").split(",") if a],
+        )
+        self.send_json(200, body, headers)
+
+    def do_POST(self):
+        headers = self.before_request()
+        if headers is None:
+            return
+
+        path = urlparse(self.path).path
+        body = self.read_json()
+
+        match = ASSOCIATIONS_PATH.match(path)
+        if match:
+            self.send_json(200, self.read_associations(match.group(1), match.group(2), body), headers)
+            return
+
+        match = OBJECT_PATH.match(path)
+        if not match:
+            self.send_json(404, {"status": "error", "message": "Not found"}, headers)
+            return
+
+        object_type, action = match.group(1), match.group(2)
+        if action == "/search":
+            self.send_json(200, self.search(object_type, body), headers)
+        elif action == "/batch/create":
+            inputs = body.get("inputs", [])
+            if len(inputs) > 100:
+                self.send_json(400, {"status": "error", "message": "Max 100 inputs"}, headers)
+                return
+            results = [
+                self.portal.create(object_type, item.get("properties", {}), item.get("associations"))
+                for item in inputs
+            ]
+            self.send_json(201, {"status": "COMPLETE", "results": results}, headers)
+        else:
+            result = self.portal.create(
+                object_type, body.get("properties", {}), body.get("associations")
+            )
+            self.send_json(201, result, headers)
+
+    def search(self, object_type: str, body: dict) -> dict:
+        """
+        Solo entiende el filtro que usa el ETL: GTE/LT sobre una fecha. En los
+        registros generados y en los creados por la API la creación y la
+        modificación coinciden.
+        """
+        start_ms, end_ms = 0, 2**62
+        for group in body.get("filterGroups", []):
+            for item in group.get("filters", []):
+                if item["operator"] == "GTE":
+                    start_ms = int(item["value"])
+                elif item["operator"] == "LT":
+                    end_ms = int(item["value"])
+
+        # Primero los generados (un rango contiguo) y después los creados por
+        # la API, que tienen fecha de creación "ahora"
+        first, last = self.portal.modified_range(object_type, start_ms, end_ms)
+        created = self.portal.created_in_range(object_type, start_ms, end_ms)
+        generated = last - first
+        total = generated + len(created)
+
+        limit = min(int(body.get("limit", 10)), 200)
+        offset = int(body.get("after", 0))
+        # Igual que HubSpot: nunca más de 10.000 resultados por consulta
+        visible = min(total, 10000)
+        end = min(offset + limit, visible)
+        indexes = [
+            first + i if i < generated else created[i - generated] for i in range(offset, end)
+        ]
+
+        result = {
+            "results": [
+                self.portal.get(object_type, i, properties=body.get("properties"))
+                for i in indexes
+            ],
+            "total": total,
+        }
+        if end < visible:
+            result["paging"] = {"next": {"after": str(end)}}
+        return result
+
+    def read_associations(self, from_type: str, to_type: str, body: dict) -> dict:
+        results = []
+        for item in body.get("inputs", []):
+            index = int(item["id"]) - 1
+            if not 0 <= index < self.portal.total(from_type):
+                continue
+            group = self.portal.get(from_type, index, associations=[to_type]).get(
+                "associations", {}
+            ).get(to_type)
+            if not group:
+                continue
+            results.append(
+                {
+                    "from": {"id": item["id"]},
+                    "to": [
+                        {
+                            "toObjectId": int(to["id"]),
+                            "associationTypes": [
+                                {
+                                    "category": "HUBSPOT_DEFINED",
+                                    "typeId": ASSOCIATION_TYPE_IDS[(from_type, to_type)],
+                                    "label": None,
+                                }
+                            ],
+                        }
+                        for to in group["results"]
+                    ],
+                }
+            )
+        return {"status": "COMPLETE", "results": results}
+
+
+class HubSpotEmulator(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        portal: FakePortal,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 0,
+        rate_limit: Optional[int] = None,
+        rate_interval_ms: int = 10000,
+        verbose: bool = False,
+    ):
+        super().__init__((host, port), EmulatorHandler)
+        self.portal = portal
+        self.latency = latency_ms / 1000
+        self.rate_limit = RateLimitWindow(rate_limit, rate_interval_ms) if rate_limit else None
+        self.verbose = verbose
+        # Cada request se atiende en su propio hilo
+        self.counters_lock = threading.Lock()
+        self.request_count = 0
+        self.throttled_count = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "HubSpotEmulator":
+        """Atiende en un hilo de fondo (para tests)."""
+        threading.Thread(target=self.serve_forever, name="hubspot-emulator", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Emulador local de la API CRM de HubSpot (para pruebas y benchmarks)."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--deals", type=int, default=1000)
+    parser.add_argument("--contacts", type=int, default=1000)
+    parser.add_argument("--companies", type=int, default=100)
+    parser.add_argument("--b2b-ratio", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de los datos generados.")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Demora por request.")
+    parser.add_argument(
+        "--rate-limit",
+        type=int,
+        default=None,
+        help="Requests permitidas por ventana; las que sobran reciben 429.",
+    )
+    parser.add_argument("--rate-interval-ms", type=int, default=10000)
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    portal = FakePortal(
+        deals=args.deals,
+        contacts=args.contacts,
+        companies=args.companies,
+        b2b_ratio=args.b2b_ratio,
+        seed=args.seed,
+    )
+    server = HubSpotEmulator(
+        portal,
+        host=args.host,
+        port=args.port,
+        latency_ms=args.latency_ms,
+        rate_limit=args.rate_limit,
+        rate_interval_ms=args.rate_interval_ms,
+        verbose=args.verbose,
+    )
+    print(
+        f"Emulador de HubSpot en {server.base_url} "
+        f"({args.deals} deals, {args.contacts} contactos, {args.companies} compañías)",
+        flush=True,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,40 +1,471 @@
-import requests
-import os
-from dotenv import load_dotenv
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
 from schemas import HubSpotDealObject, HubSpotContactObject, HubSpotApiResponse
-
-load_dotenv()  # Carga las variables del .env
-
-HUBSPOT_KEY = os.getenv("HUBSPOT_ACCESS_TOKEN")
-headers = {"Authorization": f"Bearer {HUBSPOT_KEY}"}
+from checkpoint import Checkpoint, ObjectCheckpoint
+from hubspot_client import (
+    HUBSPOT_API_BASE,
+    hubspot_request,
+    parse_json,
+    search_rate_limiter,
+)
 
 # Endpoint para Deals
-deals_url = "https://api.hubapi.com/crm/v3/objects/deals"
+deals_url = f"{HUBSPOT_API_BASE}/crm/v3/objects/deals"
 # Endpoint para Contacts (Leads)
-leads_url = "https://api.hubapi.com/crm/v3/objects/contacts"
+leads_url = f"{HUBSPOT_API_BASE}/crm/v3/objects/contacts"
+# Endpoint para Companies
+companies_url = f"{HUBSPOT_API_BASE}/crm/v3/objects/companies"
+
+object_urls = {
+    "deals": deals_url,
+    "contacts": leads_url,
+    "companies": companies_url,
+}
+
+# Máximo de registros por página que acepta la API de listado de HubSpot
+PAGE_SIZE = 100
 
-# Parámetros para pedir solo las propiedades que te interesan
+# Parámetros para pedir solo las propiedades que te interesan. Las
+# asociaciones no se piden inline ('associations=company,contact'): HubSpot
+# las corta cuando un objeto tiene muchas. Se leen aparte con la API v4.
 params = {
     "properties": "dealname,amount,dealstage,createdate,email,firstname,lastname,hs_lead_status",
-    "associations": "company,contact",
+    "limit": PAGE_SIZE,
+}
+
+# Asociaciones de cada deal que se leen en lote (grupo -> tipo de asociación)
+deal_associations = {
+    "companies": "deal_to_company",
+    "contacts": "deal_to_contact",
+}
+# Ids por llamada a /crm/v4/associations/.../batch/read (límite de HubSpot: 1000)
+ASSOCIATION_BATCH_SIZE = 1000
+# Asociaciones por página al seguir leyendo las de un objeto con muchas
+ASSOCIATION_PAGE_SIZE = 500
+
+# La API de búsqueda acepta hasta 200 resultados por página y nunca
+# devuelve más de 10.000 resultados para una misma consulta.
+SEARCH_PAGE_SIZE = 200
+SEARCH_RESULT_CAP = 10000
+
+# Propiedad con la fecha de última modificación de cada tipo de objeto
+modified_properties = {
+    "deals": "hs_lastmodifieddate",
+    "contacts": "lastmodifieddate",
+    "companies": "hs_lastmodifieddate",
+}
+# Fecha de creación (la que usa el backfill para partir el portal; no cambia)
+CREATED_PROPERTY = "createdate"
+
+# Propiedades de las compañías (no comparten nombres con deals/contacts)
+companies_params = {
+    "properties": "name,domain,industry,city,country,createdate",
+    "limit": PAGE_SIZE,
+}
+
+
+def iter_pages(
+    url: str, base_params: dict = params, after: Optional[str] = None
+) -> Iterator[Tuple[List[dict], Optional[str]]]:
+    """
+    Recorre las páginas de un endpoint de listado desde el cursor 'after'
+    siguiendo 'paging.next.after'. Entrega cada página apenas llega, junto
+    con el cursor de la siguiente (None en la última).
+    """
+    while True:
+        page_params = dict(base_params)
+        if after:
+            page_params["after"] = after
+
+        response = hubspot_request("GET", url, params=page_params)
+        page: HubSpotApiResponse = parse_json(response)
+
+        after = page.get("paging", {}).get("next", {}).get("after")
+        yield page["results"], after
+        if not after:
+            break
+
+
+def extract_pages(url: str, base_params: dict = params) -> Iterator[List[dict]]:
+    """
+    Recorre todas las páginas de un endpoint de listado y entrega cada
+    página apenas llega. Así la memoria depende del tamaño de la página y
+    no del portal.
+    """
+    for page, _ in iter_pages(url, base_params):
+        yield page
+
+
+def extract_archived_pages(object_type: str) -> Iterator[List[dict]]:
+    """Lista los objetos archivados (HubSpot los conserva unos 90 días)."""
+    base_params = companies_params if object_type == "companies" else params
+    archived_params = {**base_params, "archived": "true"}
+    return extract_pages(object_urls[object_type], archived_params)
+
+
+def extract_archived(object_type: str) -> List[dict]:
+    return [record for page in extract_archived_pages(object_type) for record in page]
+
+
+def extract_deal_pages() -> Iterator[List[HubSpotDealObject]]:
+    for page in extract_pages(deals_url):
+        attach_deal_associations(page)
+        yield page
+
+
+def extract_lead_pages() -> Iterator[List[HubSpotContactObject]]:
+    return extract_pages(leads_url)
+
+
+def extract_company_pages() -> Iterator[List[dict]]:
+    return extract_pages(companies_url, companies_params)
+
+
+object_page_extractors = {
+    "deals": extract_deal_pages,
+    "contacts": extract_lead_pages,
+    "companies": extract_company_pages,
 }
 
 
-def extract_data() -> Tuple[List[HubSpotDealObject], List[HubSpotContactObject]]:
+def extract_object(
+    object_type: str, checkpoint: Optional[Checkpoint] = None
+) -> List[dict]:
+    if checkpoint is None:
+        records: List[dict] = []
+        for page in object_page_extractors[object_type]():
+            records.extend(page)
+        return records
+    return extract_object_checkpointed(object_type, checkpoint.object(object_type))
+
+
+def extract_object_checkpointed(
+    object_type: str, checkpoint: ObjectCheckpoint
+) -> List[dict]:
+    """
+    Como extract_object, pero guarda en disco cada página y el cursor de la
+    siguiente. Si una corrida anterior se cortó, relee lo guardado y sigue
+    pidiendo desde ese cursor en vez de empezar de cero.
+    """
+    records: List[dict] = []
+    for page in checkpoint.load_pages():
+        records.extend(page)
+    if checkpoint.done:
+        print(f"{object_type}: {len(records)} registros leídos del checkpoint.")
+        return records
+    if checkpoint.pages:
+        print(f"{object_type}: retomando tras {len(records)} registros del checkpoint.")
+
+    base_params = companies_params if object_type == "companies" else params
+    url = object_urls[object_type]
+    for page, after in iter_pages(url, base_params, checkpoint.after):
+        if object_type == "deals":
+            attach_deal_associations(page)
+        checkpoint.save_page(page, after)
+        records.extend(page)
+    return records
+
+
+def extract_all(
+    object_types: List[str], checkpoint: Optional[Checkpoint] = None
+) -> Dict[str, List[dict]]:
+    """
+    Extrae varios tipos de objeto a la vez, un hilo por tipo.
+    Todos los hilos comparten la misma sesión HTTP y el mismo limitador.
+    Con 'checkpoint' cada tipo guarda su avance y se puede retomar.
+    """
+    with ThreadPoolExecutor(max_workers=len(object_types)) as executor:
+        futures = {
+            object_type: executor.submit(extract_object, object_type, checkpoint)
+            for object_type in object_types
+        }
+        return {object_type: future.result() for object_type, future in futures.items()}
+
+
+# --- Extracción incremental (API de búsqueda) ---
+
+
+def search_url(object_type: str) -> str:
+    return f"{HUBSPOT_API_BASE}/crm/v3/objects/{object_type}/search"
+
+
+def to_epoch_ms(timestamp: str) -> int:
+    return int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+
+
+def now_ms() -> int:
+    return int(datetime.now(timezone.utc).timestamp() * 1000)
+
+
+def search_modified(
+    object_type: str,
+    start_ms: int,
+    end_ms: int,
+    limit: int,
+    after: Optional[str] = None,
+    prop: Optional[str] = None,
+) -> dict:
+    """
+    Busca los objetos con la fecha 'prop' en [start_ms, end_ms). Por defecto
+    'prop' es la fecha de última modificación del tipo de objeto.
+    """
+    prop = prop or modified_properties[object_type]
+    base_params = companies_params if object_type == "companies" else params
+
+    body = {
+        "filterGroups": [
+            {
+                "filters": [
+                    {"propertyName": prop, "operator": "GTE", "value": str(start_ms)},
+                    {"propertyName": prop, "operator": "LT", "value": str(end_ms)},
+                ]
+            }
+        ],
+        "sorts": [{"propertyName": prop, "direction": "ASCENDING"}],
+        "properties": base_params["properties"].split(","),
+        "limit": limit,
+    }
+    if after:
+        body["after"] = after
+
+    response = hubspot_request(
+        "POST", search_url(object_type), limiter=search_rate_limiter, json=body
+    )
+    return parse_json(response)
+
+
+def split_search_windows(
+    object_type: str,
+    start_ms: int,
+    end_ms: int,
+    prop: Optional[str] = None,
+    max_results: int = SEARCH_RESULT_CAP,
+) -> Iterator[Tuple[int, int]]:
+    """
+    Parte [start_ms, end_ms) en ventanas de tiempo con hasta 'max_results'
+    resultados (nunca más que el límite de 10.000 de la búsqueda), dividiendo
+    por la mitad cuando hace falta. Las ventanas vacías se descartan.
+    """
+    if end_ms <= start_ms:
+        return
+
+    max_results = min(max_results, SEARCH_RESULT_CAP)
+    count = search_modified(object_type, start_ms, end_ms, limit=1, prop=prop)
+    total = count.get("total", 0)
+
+    if total <= max_results or end_ms - start_ms <= 1:
+        if total > SEARCH_RESULT_CAP:
+            print(
+                f"Aviso: {total} {object_type} con la misma fecha, "
+                f"solo se leerán {SEARCH_RESULT_CAP}."
+            )
+        if total:
+            yield start_ms, end_ms
+        return
+
+    middle = (start_ms + end_ms) // 2
+    yield from split_search_windows(object_type, start_ms, middle, prop, max_results)
+    yield from split_search_windows(object_type, middle, end_ms, prop, max_results)
+
+
+def extract_window_pages(
+    object_type: str, start_ms: int, end_ms: int, prop: Optional[str] = None
+) -> Iterator[List[dict]]:
+    """Entrega, página por página, los resultados de una ventana de la búsqueda."""
+    after: Optional[str] = None
+    while True:
+        page = search_modified(
+            object_type, start_ms, end_ms, SEARCH_PAGE_SIZE, after, prop=prop
+        )
+        results = page["results"]
+        if object_type == "deals":
+            attach_deal_associations(results)
+
+        yield results
+
+        after = page.get("paging", {}).get("next", {}).get("after")
+        if not after:
+            break
+
+
+def extract_modified_pages(
+    object_type: str, start_ms: int, end_ms: int
+) -> Iterator[List[dict]]:
+    """Entrega, página por página, los objetos modificados en [start_ms, end_ms)."""
+    for window_start, window_end in split_search_windows(object_type, start_ms, end_ms):
+        yield from extract_window_pages(object_type, window_start, window_end)
+
+
+def read_associations(
+    from_type: str, to_type: str, ids: List[str]
+) -> Dict[str, List[str]]:
+    """
+    Lee en lote (API v4) los ids asociados a cada objeto de 'ids'.
+    Si un objeto tiene más asociaciones de las que entran en la respuesta,
+    el resto se sigue leyendo página por página.
+    """
+    url = f"{HUBSPOT_API_BASE}/crm/v4/associations/{from_type}/{to_type}/batch/read"
+    associated: Dict[str, List[str]] = {}
+
+    for start in range(0, len(ids), ASSOCIATION_BATCH_SIZE):
+        body = {"inputs": [{"id": id_} for id_ in ids[start : start + ASSOCIATION_BATCH_SIZE]]}
+        response = hubspot_request("POST", url, json=body)
+
+        for item in parse_json(response).get("results", []):
+            from_id = str(item["from"]["id"])
+            to_ids = associated.setdefault(from_id, [])
+            to_ids.extend(str(to["toObjectId"]) for to in item.get("to", []))
+
+            after = item.get("paging", {}).get("next", {}).get("after")
+            if after:
+                to_ids.extend(read_remaining_associations(from_type, from_id, to_type, after))
+
+    # Un mismo par puede venir repetido (una vez por etiqueta de asociación)
+    return {from_id: list(dict.fromkeys(to_ids)) for from_id, to_ids in associated.items()}
+
+
+def read_remaining_associations(
+    from_type: str, from_id: str, to_type: str, after: str
+) -> List[str]:
+    url = f"{HUBSPOT_API_BASE}/crm/v4/objects/{from_type}/{from_id}/associations/{to_type}"
+    to_ids: List[str] = []
+    while after:
+        response = hubspot_request(
+            "GET", url, params={"limit": ASSOCIATION_PAGE_SIZE, "after": after}
+        )
+        page = parse_json(response)
+        to_ids.extend(str(to["toObjectId"]) for to in page.get("results", []))
+        after = page.get("paging", {}).get("next", {}).get("after")
+    return to_ids
+
+
+def attach_deal_associations(deals: List[HubSpotDealObject]):
+    """
+    Pide en lote las compañías y contactos de cada deal y los guarda con la
+    misma forma que devolvía el listado ('associations.companies.results').
+    Con eso transform arma las tablas puente DEAL_COMPANY y DEAL_CONTACT.
+    Los deals archivados se saltean: la carga conserva sus asociaciones.
+    """
+    ids = [deal["id"] for deal in deals if not deal.get("archived")]
+    if not ids:
+        return
+
+    associated = {
+        group: read_associations("deals", group, ids) for group in deal_associations
+    }
+
+    for deal in deals:
+        if deal.get("archived"):
+            continue
+        groups = {
+            group: {
+                "results": [
+                    {"id": to_id, "type": association_type}
+                    for to_id in associated[group].get(deal["id"], [])
+                ]
+            }
+            for group, association_type in deal_associations.items()
+        }
+        deal["associations"] = {
+            group: value for group, value in groups.items() if value["results"]
+        } or None
+
+
+def extract_pages_since(
+    object_type: str, since: Optional[str], until_ms: int
+) -> Iterator[List[dict]]:
+    """
+    Entrega las páginas de objetos modificados desde 'since' (o todos si no
+    hay marca previa). Ni el listado ni la búsqueda devuelven los archivados:
+    se leen aparte para que la carga los marque como borrados (soft delete).
+    """
+    if not since:
+        yield from object_page_extractors[object_type]()
+    else:
+        yield from extract_modified_pages(object_type, to_epoch_ms(since), until_ms)
+    yield from extract_archived_pages(object_type)
+
+
+def max_updated_at(high_water_mark: Optional[str], page: List[dict]) -> Optional[str]:
+    """
+    Devuelve el mayor updatedAt entre la marca actual y la página.
+    Los archivados se ignoran: se leen sin filtro de fecha y podrían adelantar
+    la marca por encima de registros que todavía no se buscaron.
+    """
+    for record in page:
+        updated_at = record.get("updatedAt")
+        if not updated_at or record.get("archived"):
+            continue
+        if high_water_mark is None or to_epoch_ms(updated_at) > to_epoch_ms(
+            high_water_mark
+        ):
+            high_water_mark = updated_at
+    return high_water_mark
+
+
+def extract_object_since(
+    object_type: str, since: Optional[str], until_ms: int
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Extrae los objetos modificados desde 'since' y devuelve también la nueva
+    marca de agua (el mayor updatedAt visto).
+    """
+    records: List[dict] = []
+    high_water_mark = since
+    for page in extract_pages_since(object_type, since, until_ms):
+        records.extend(page)
+        high_water_mark = max_updated_at(high_water_mark, page)
+
+    return records, high_water_mark
+
+
+def extract_incremental(
+    state: Dict[str, str],
+) -> Tuple[List[HubSpotDealObject], List[HubSpotContactObject], Dict[str, str]]:
+    """
+    Extrae solo los deals y leads que cambiaron desde la última carga exitosa.
+    Devuelve el nuevo estado, que se debe guardar solo si la carga termina bien.
+    """
+    print("Iniciando extracción incremental...")
+
+    until_ms = now_ms()
+    object_types = ["deals", "contacts"]
+
+    with ThreadPoolExecutor(max_workers=len(object_types)) as executor:
+        futures = {
+            object_type: executor.submit(
+                extract_object_since, object_type, state.get(object_type), until_ms
+            )
+            for object_type in object_types
+        }
+        extracted = {object_type: future.result() for object_type, future in futures.items()}
+
+    deals_data, deals_mark = extracted["deals"]
+    leads_data, leads_mark = extracted["contacts"]
+
+    new_state = dict(state)
+    if deals_mark:
+        new_state["deals"] = deals_mark
+    if leads_mark:
+        new_state["contacts"] = leads_mark
+
+    print(f"Se extrajeron {len(deals_data)} deals y {len(leads_data)} leads modificados.")
+    return deals_data, leads_data, new_state
+
+
+def extract_data(
+    checkpoint: Optional[Checkpoint] = None,
+) -> Tuple[List[HubSpotDealObject], List[HubSpotContactObject]]:
     print("Iniciando extracción...")
 
-    # Extraer Deals
-    deals_response = requests.get(deals_url, headers=headers, params=params)
-    deals_response.raise_for_status()
-    deals_json: HubSpotApiResponse[HubSpotDealObject] = deals_response.json()
-    deals_data = deals_json["results"]
-
-    # Extraer Leads (Contacts)
-    leads_response = requests.get(leads_url, headers=headers, params=params)
-    leads_response.raise_for_status()
-    leads_json: HubSpotApiResponse[HubSpotContactObject] = leads_response.json()
-    leads_data = leads_json["results"]
+    # Extraer Deals y Leads (Contacts) en paralelo
+    extracted = extract_all(["deals", "contacts"], checkpoint)
+    # El listado no trae los borrados: sin ellos seguirían vivos en Snowflake
+    deals_data: List[HubSpotDealObject] = extracted["deals"]
+    deals_data += extract_archived("deals")
+    leads_data: List[HubSpotContactObject] = extracted["contacts"]
+    leads_data += extract_archived("contacts")
 
     print(f"Se extrajeron {len(deals_data)} deals y {len(leads_data)} leads.")
     return deals_data, leads_data
@@ -0,0 +1,261 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Optional
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+
+# orjson parsea directo desde bytes y bastante más rápido que json; si no está
+# instalado se usa json de la librería estándar (también acepta bytes)
+try:
+    import orjson
+
+    json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    json_loads = json.loads
+
+load_dotenv()
+
+HUBSPOT_KEY = os.getenv("HUBSPOT_ACCESS_TOKEN")
+HUBSPOT_API_BASE = os.getenv("HUBSPOT_API_BASE", "https://api.hubapi.com")
+
+# Límites de HubSpot (apps privadas): por defecto 100 requests cada 10 segundos
+# y 250.000 por día. Se pueden ajustar según el plan del portal.
+HUBSPOT_REQUESTS_PER_SECOND = float(os.getenv("HUBSPOT_REQUESTS_PER_SECOND", 10))
+HUBSPOT_BURST = int(os.getenv("HUBSPOT_BURST", 10))
+HUBSPOT_DAILY_LIMIT = int(os.getenv("HUBSPOT_DAILY_LIMIT", 250000))
+# La API de búsqueda tiene su propio límite, más bajo (5 requests por segundo)
+HUBSPOT_SEARCH_REQUESTS_PER_SECOND = float(
+    os.getenv("HUBSPOT_SEARCH_REQUESTS_PER_SECOND", 4)
+)
+
+# Tamaño del pool de conexiones (keep-alive) compartido entre hilos
+HUBSPOT_POOL_SIZE = int(os.getenv("HUBSPOT_POOL_SIZE", 10))
+HUBSPOT_MAX_RETRIES = int(os.getenv("HUBSPOT_MAX_RETRIES", 5))
+HUBSPOT_TIMEOUT = float(os.getenv("HUBSPOT_TIMEOUT", 30))
+# Compresión que se pide a HubSpot: el JSON de los listados se reduce ~10 veces
+HUBSPOT_ACCEPT_ENCODING = os.getenv("HUBSPOT_ACCEPT_ENCODING", "gzip")
+
+
+class TokenBucket:
+    """Limitador 'token bucket' seguro entre hilos."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Bloquea hasta que haya un token disponible y lo consume."""
+        while True:
+            with self.lock:
+                self._refill()
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+    def limit_to(self, remaining: int, pause: float = 0):
+        """
+        Ajusta el bucket a lo que el servidor dice que queda en su ventana:
+        nunca hay más tokens que 'remaining', y si no queda ninguno se
+        frena durante 'pause' segundos (el largo de la ventana).
+        """
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, remaining)
+            if remaining <= 0 and pause > 0:
+                self.tokens = min(self.tokens, 1 - self.rate * pause)
+
+
+class DailyQuotaExceeded(RuntimeError):
+    """Se usaron todas las requests del día."""
+
+
+class DailyQuota:
+    """Cuenta las requests del día (UTC) y corta antes de pasar el límite diario."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self.day = time.gmtime().tm_yday
+        self.lock = threading.Lock()
+
+    def consume(self):
+        with self.lock:
+            today = time.gmtime().tm_yday
+            if today != self.day:
+                self.day = today
+                self.used = 0
+
+            if self.used >= self.limit:
+                raise DailyQuotaExceeded(
+                    f"Se agotó la cuota diaria de HubSpot ({self.limit} requests)."
+                )
+            self.used += 1
+
+    def sync(self, remaining: int):
+        """Toma en cuenta lo que HubSpot informa que queda del día."""
+        with self.lock:
+            self.used = max(self.used, self.limit - remaining)
+
+
+rate_limiter = TokenBucket(HUBSPOT_REQUESTS_PER_SECOND, HUBSPOT_BURST)
+search_rate_limiter = TokenBucket(HUBSPOT_SEARCH_REQUESTS_PER_SECOND, 1)
+daily_quota = DailyQuota(HUBSPOT_DAILY_LIMIT)
+
+
+def share_rate_limits(processes: int):
+    """
+    Reparte los límites entre 'processes' procesos: cada uno tiene sus propios
+    limitadores y juntos no deben pasar el cupo de la app en HubSpot.
+    """
+    for bucket in (rate_limiter, search_rate_limiter):
+        with bucket.lock:
+            bucket.rate /= processes
+            bucket.capacity = max(bucket.capacity // processes, 1)
+            bucket.tokens = min(bucket.tokens, bucket.capacity)
+    with daily_quota.lock:
+        daily_quota.limit //= processes
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def reset_session():
+    """
+    Descarta la sesión actual. Un proceso hijo (fork) la hereda con los mismos
+    sockets que el padre: tiene que abrir sus propias conexiones.
+    """
+    global _session
+
+    with _session_lock:
+        _session = None
+
+
+def get_session() -> requests.Session:
+    """Devuelve una única sesión HTTP con pool de conexiones reutilizables."""
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=HUBSPOT_POOL_SIZE, pool_maxsize=HUBSPOT_POOL_SIZE
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(
+                {
+                    "Authorization": f"Bearer {HUBSPOT_KEY}",
+                    "Accept-Encoding": HUBSPOT_ACCEPT_ENCODING,
+                }
+            )
+            _session = session
+
+    return _session
+
+
+def get_retry_after(response: requests.Response, attempt: int) -> float:
+    """Segundos a esperar tras un 429: usa 'Retry-After' o backoff exponencial."""
+    retry_after = response.headers.get("Retry-After")
+    try:
+        return max(float(retry_after), 0)
+    except (TypeError, ValueError):
+        return min(2**attempt, 60)
+
+
+def observe_rate_limit_headers(response: requests.Response):
+    """
+    Adapta los limitadores a los headers X-HubSpot-RateLimit-* de la respuesta:
+    si otro proceso usa la misma app, el cupo que queda es menor que el nuestro.
+    """
+    headers = response.headers
+    try:
+        remaining = headers.get("X-HubSpot-RateLimit-Remaining")
+        if remaining is not None:
+            interval_ms = float(
+                headers.get("X-HubSpot-RateLimit-Interval-Milliseconds", 0)
+            )
+            rate_limiter.limit_to(int(remaining), pause=interval_ms / 1000)
+
+        daily_remaining = headers.get("X-HubSpot-RateLimit-Daily-Remaining")
+        if daily_remaining is not None:
+            daily_quota.sync(int(daily_remaining))
+    except ValueError:
+        pass
+
+
+def wire_bytes(response: requests.Response) -> int:
+    """Bytes recibidos por la red (comprimidos, si la respuesta vino con gzip)."""
+    try:
+        return response.raw.tell()
+    except AttributeError:
+        return len(response.content)
+
+
+def parse_json(response: requests.Response) -> Any:
+    """
+    Parsea el cuerpo (ya descomprimido) directo desde bytes. response.json()
+    primero lo decodifica a str y después lo recorre con json, más lento.
+    No es un parseo incremental: la página entera (100-200 registros) ya está
+    en memoria y se parsea de una vez.
+    """
+    body = response.content
+    metrics.add("http_bytes_decoded", len(body))
+    return json_loads(body)
+
+
+def hubspot_request(
+    method: str, url: str, limiter: Optional[TokenBucket] = None, **kwargs
+) -> requests.Response:
+    """
+    Hace una request a HubSpot respetando los límites por segundo y diario.
+    'limiter' permite sumar un límite propio del endpoint (ej. la búsqueda).
+    Si HubSpot responde 429 espera lo indicado en 'Retry-After' y reintenta.
+    """
+    session = get_session()
+    kwargs.setdefault("timeout", HUBSPOT_TIMEOUT)
+
+    attempt = 0
+    while True:
+        daily_quota.consume()
+        rate_limiter.acquire()
+        if limiter is not None:
+            limiter.acquire()
+
+        response = session.request(method, url, **kwargs)
+        observe_rate_limit_headers(response)
+        metrics.add("http_requests")
+        metrics.add("http_bytes", wire_bytes(response))
+
+        if response.status_code == 429:
+            metrics.add("http_429")
+        if response.status_code == 429 and attempt < HUBSPOT_MAX_RETRIES:
+            metrics.add("http_retries")
+            wait = get_retry_after(response, attempt)
+            print(f"HubSpot respondió 429, reintentando en {wait:.1f}s...")
+            time.sleep(wait)
+            attempt += 1
+            continue
+
+        response.raise_for_status()
+        return response
@@ -0,0 +1,321 @@
+import glob
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+from load import (
+    LOAD_MODES,
+    bridge_keys,
+    ensure_bridge_table,
+    get_snowflake_connection,
+    merge_stage_table,
+    notify_load_finished,
+    replace_bridge_rows,
+    table_keys,
+)
+from metrics import metrics
+from summaries import refresh_summaries, touched_days
+
+load_dotenv()
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Directorio local donde queda una copia en Parquet de cada corrida:
+#   <LANDING_DIR>/<run_id>/<TABLA>/part-00000.parquet
+LANDING_DIR = os.getenv("ETL_LANDING_DIR", os.path.join(script_dir, "landing"))
+# Filas por archivo: más archivos = más PUT en paralelo
+LANDING_ROWS_PER_FILE = int(os.getenv("ETL_LANDING_ROWS_PER_FILE", 100000))
+LANDING_COMPRESSION = "snappy"
+PUT_PARALLEL = int(os.getenv("ETL_PUT_PARALLEL", 8))
+
+# Stage interno y formato de archivo en Snowflake
+SNOW_STAGE = os.getenv("SNOW_STAGE", "ETL_LANDING_STAGE")
+SNOW_FILE_FORMAT = os.getenv("SNOW_FILE_FORMAT", "ETL_PARQUET_FORMAT")
+
+
+def new_run_id() -> str:
+    """
+    Id único de la corrida. Los archivos de dos corridas nunca pueden
+    compartir ruta en el stage: con OVERWRITE = FALSE y el historial de
+    COPY INTO, los de la segunda se saltearían sin error.
+    """
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    return f"{timestamp}-{uuid.uuid4().hex[:8]}"
+
+
+def create_run_dir(landing_dir: str = LANDING_DIR) -> Tuple[str, str]:
+    """Crea el directorio de una corrida nueva. Falla si ya existe."""
+    run_id = new_run_id()
+    run_dir = os.path.join(landing_dir, run_id)
+    os.makedirs(landing_dir, exist_ok=True)
+    os.mkdir(run_dir)
+    return run_id, run_dir
+
+
+def table_dir(run_dir: str, table_name: str) -> str:
+    return os.path.join(run_dir, table_name)
+
+
+def list_landing_files(run_dir: str, table_name: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(table_dir(run_dir, table_name), "*.parquet")))
+
+
+def write_landing_files(
+    df: pd.DataFrame,
+    table_name: str,
+    run_dir: str,
+    rows_per_file: int = LANDING_ROWS_PER_FILE,
+) -> List[str]:
+    """
+    Escribe el DataFrame como uno o más archivos Parquet comprimidos.
+    Se puede llamar varias veces para la misma tabla (ej. un chunk por vez):
+    los archivos nuevos siguen la numeración de los que ya existen.
+    """
+    directory = table_dir(run_dir, table_name)
+    os.makedirs(directory, exist_ok=True)
+    part = len(list_landing_files(run_dir, table_name))
+
+    paths = []
+    for start in range(0, len(df), rows_per_file):
+        table = pa.Table.from_pandas(
+            df.iloc[start : start + rows_per_file], preserve_index=False
+        )
+        # Una columna sin valores (ej. todos los deals sin compañía) sería de
+        # tipo null, que Snowflake no puede inferir: se escribe como texto
+        table = table.cast(
+            pa.schema(
+                pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+                for field in table.schema
+            )
+        )
+        path = os.path.join(directory, f"part-{part:05d}.parquet")
+        # Se escribe con otro nombre y se renombra: un archivo a medias nunca
+        # queda con la extensión .parquet
+        pq.write_table(
+            table,
+            f"{path}.tmp",
+            compression=LANDING_COMPRESSION,
+            coerce_timestamps="us",
+            allow_truncated_timestamps=True,
+        )
+        os.replace(f"{path}.tmp", path)
+        paths.append(path)
+        part += 1
+
+    return paths
+
+
+class SnowflakeStage:
+    """Stage interno de Snowflake: PUT para subir y COPY INTO para cargar."""
+
+    def __init__(
+        self, cursor, name: str = SNOW_STAGE, file_format: str = SNOW_FILE_FORMAT
+    ):
+        self.cursor = cursor
+        self.name = name
+        self.file_format = file_format
+
+        self.cursor.execute(
+            f"CREATE FILE FORMAT IF NOT EXISTS {file_format} "
+            "TYPE = PARQUET USE_LOGICAL_TYPE = TRUE"
+        )
+        self.cursor.execute(
+            f"CREATE STAGE IF NOT EXISTS {name} FILE_FORMAT = {file_format}"
+        )
+
+    def location(self, prefix: str) -> str:
+        return f"@{self.name}/{prefix}/"
+
+    def put(self, files: List[str], prefix: str):
+        """
+        Sube todos los archivos con un solo PUT en paralelo. OVERWRITE = FALSE
+        saltea los que ya se subieron, así se puede reintentar una corrida.
+        """
+        directory = os.path.dirname(os.path.abspath(files[0]))
+        self.cursor.execute(
+            f"PUT 'file://{directory}/*.parquet' {self.location(prefix)} "
+            f"PARALLEL = {PUT_PARALLEL} AUTO_COMPRESS = FALSE OVERWRITE = FALSE"
+        )
+
+    def create_table_like_files(self, table_name: str, prefix: str, temporary: bool):
+        """Crea una tabla con las columnas que tienen los Parquet del stage."""
+        kind = "TEMPORARY TABLE" if temporary else "TABLE IF NOT EXISTS"
+        self.cursor.execute(
+            f"""
+            CREATE {kind} {table_name} USING TEMPLATE (
+                SELECT ARRAY_AGG(OBJECT_CONSTRUCT(*)) WITHIN GROUP (ORDER BY ORDER_ID)
+                FROM TABLE(
+                    INFER_SCHEMA(
+                        LOCATION => '{self.location(prefix)}',
+                        FILE_FORMAT => '{self.file_format}'
+                    )
+                )
+            )
+            """.strip()
+        )
+
+    def copy_into(self, table_name: str, prefix: str):
+        """
+        Un solo COPY INTO por tabla. Snowflake recuerda qué archivos ya cargó
+        en cada tabla, así que repetirlo no duplica filas.
+        """
+        self.cursor.execute(
+            f"COPY INTO {table_name} FROM {self.location(prefix)} "
+            f"FILE_FORMAT = (FORMAT_NAME = '{self.file_format}') "
+            "MATCH_BY_COLUMN_NAME = CASE_SENSITIVE"
+        )
+        metrics.record_query(table_name, self.cursor, "COPY INTO")
+
+
+def landing_touched_days(run_dir: str, table_name: str):
+    """Días de creación de los registros que hay en los Parquet de la corrida."""
+    days = set()
+    for path in list_landing_files(run_dir, table_name):
+        created_at = pq.read_table(path, columns=["created_at"]).column("created_at")
+        days |= touched_days(created_at.to_pandas())
+    return days
+
+
+def truncate_table(cursor, table_name: str):
+    """Vacía la tabla en una transacción: overwrite con un lote vacío."""
+    if table_name in bridge_keys:
+        ensure_bridge_table(cursor, table_name)
+    cursor.execute("BEGIN")
+    try:
+        cursor.execute(f"TRUNCATE TABLE IF EXISTS {table_name}")
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+
+
+def load_landing_table(
+    stage: SnowflakeStage, run_id: str, run_dir: str, table_name: str, mode: str
+):
+    files = list_landing_files(run_dir, table_name)
+    if not files:
+        # La corrida trajo la tabla pero sin filas (queda el directorio vacío):
+        # en overwrite eso también reemplaza lo que había
+        if mode == "overwrite" and os.path.isdir(table_dir(run_dir, table_name)):
+            truncate_table(stage.cursor, table_name)
+        return
+
+    prefix = f"{run_id}/{table_name}"
+    stage.put(files, prefix)
+
+    columns = pq.read_schema(files[0]).names
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    temp_table = f"{table_name}_LANDING"
+
+    # Tablas puente: siempre se reemplazan las asociaciones de los deals del lote
+    if table_name in bridge_keys:
+        stage.create_table_like_files(temp_table, prefix, temporary=True)
+        stage.copy_into(temp_table, prefix)
+        replace_bridge_rows(stage.cursor, table_name, temp_table, overwrite=mode == "overwrite")
+        stage.cursor.execute(f"DROP TABLE IF EXISTS {temp_table}")
+        return
+
+    stage.create_table_like_files(table_name, prefix, temporary=False)
+
+    if mode == "append":
+        stage.copy_into(table_name, prefix)
+        return
+
+    stage.create_table_like_files(temp_table, prefix, temporary=True)
+    stage.copy_into(temp_table, prefix)
+
+    if mode == "upsert":
+        merge_stage_table(stage.cursor, table_name, temp_table, columns)
+    else:
+        # overwrite: la tabla se reemplaza dentro de una transacción, así
+        # quien la consulta ve los datos viejos hasta el COMMIT
+        stage.cursor.execute("BEGIN")
+        try:
+            stage.cursor.execute(f"DELETE FROM {table_name}")
+            stage.cursor.execute(
+                f"INSERT INTO {table_name} ({column_list}) "
+                f"SELECT {column_list} FROM {temp_table}"
+            )
+            metrics.record_query(table_name, stage.cursor, "INSERT")
+            stage.cursor.execute("COMMIT")
+        except Exception:
+            stage.cursor.execute("ROLLBACK")
+            raise
+
+    stage.cursor.execute(f"DROP TABLE IF EXISTS {temp_table}")
+
+
+def load_landing(
+    run_id: str, mode: str = "upsert", landing_dir: str = LANDING_DIR
+) -> bool:
+    """
+    Sube y carga en Snowflake los Parquet de una corrida ya escrita en disco.
+    Sirve también para reintentar o repetir una corrida anterior.
+    """
+    if mode not in LOAD_MODES:
+        raise ValueError(f"Modo de carga inválido: {mode}")
+
+    run_dir = os.path.join(landing_dir, run_id)
+    print(f"Cargando a Snowflake los archivos de {run_dir}...")
+
+    try:
+        conn = get_snowflake_connection()
+        cursor = conn.cursor()
+        try:
+            stage = SnowflakeStage(cursor)
+            for table_name in list(table_keys) + list(bridge_keys):
+                load_landing_table(stage, run_id, run_dir, table_name, mode)
+            # El resumen de DEALS lee DEAL_COMPANY aunque la corrida no la traiga
+            for table_name in bridge_keys:
+                ensure_bridge_table(cursor, table_name)
+        finally:
+            cursor.close()
+
+        refresh_summaries(
+            conn,
+            {
+                table_name: None
+                if mode == "overwrite"
+                else landing_touched_days(run_dir, table_name)
+                for table_name in table_keys
+            },
+        )
+
+        print("Carga desde Parquet completada.")
+        notify_load_finished()
+        return True
+
+    except Exception as e:
+        print(f"Error cargando desde Parquet: {e}")
+        return False
+    finally:
+        if "conn" in locals():
+            conn.close()
+
+
+def land_and_load(
+    df_deals: pd.DataFrame,
+    df_leads: pd.DataFrame,
+    mode: str = "upsert",
+    associations: Optional[Dict[str, pd.DataFrame]] = None,
+    landing_dir: str = LANDING_DIR,
+) -> bool:
+    """
+    Escribe DEALS, LEADS y las tablas puente de 'associations' como Parquet
+    en una corrida nueva y la carga.
+    """
+    run_id, run_dir = create_run_dir(landing_dir)
+
+    write_landing_files(df_deals, "DEALS", run_dir)
+    write_landing_files(df_leads, "LEADS", run_dir)
+    for table_name, df in (associations or {}).items():
+        write_landing_files(df, table_name, run_dir)
+    print(f"Archivos Parquet escritos en {run_dir}")
+
+    return load_landing(run_id, mode, landing_dir)
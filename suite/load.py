@@ -1,4 +1,5 @@
 import os
+import requests
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -6,48 +7,279 @@ load_dotenv()
 from snowflake.connector.pandas_tools import write_pandas
 import snowflake.connector
 
+from metrics import metrics
+from summaries import refresh_summaries, touched_days
 
-def load_data(df_deals, df_leads):
-    print("Iniciando carga a Snowflake...")
+# Modos de carga:
+# - "overwrite": borra la tabla y la crea de nuevo con el lote completo.
+# - "append": agrega las filas del lote tal cual.
+# - "upsert": MERGE del lote sobre la tabla por su clave (deal_id / lead_id).
+LOAD_MODES = ("overwrite", "append", "upsert")
+
+# Endpoint de la API al que se avisa cuando termina una carga, para que
+# vacíe su caché de resultados (ej. http://localhost:8000/internal/cache/invalidate)
+API_CACHE_INVALIDATION_URL = os.getenv("API_CACHE_INVALIDATION_URL")
+CACHE_INVALIDATION_TOKEN = os.getenv("CACHE_INVALIDATION_TOKEN")
+
+# Clave primaria de cada tabla para el MERGE
+table_keys = {
+    "DEALS": "deal_id",
+    "LEADS": "lead_id",
+}
+
+# Tablas puente de asociaciones: (id del deal, id del objeto asociado).
+# Un lote trae todas las asociaciones actuales de sus deals, así que en vez
+# de MERGE se reemplazan las filas de esos deals. Una fila con el id asociado
+# nulo marca un deal que ya no tiene asociaciones de ese tipo.
+bridge_keys = {
+    "DEAL_COMPANY": ("deal_id", "company_id"),
+    "DEAL_CONTACT": ("deal_id", "contact_id"),
+}
+
+
+def get_snowflake_connection():
+    return snowflake.connector.connect(
+        user=os.getenv("SNOW_USER"),
+        password=os.getenv("SNOW_PASSWORD"),
+        account=os.getenv("SNOW_ACCOUNT"),
+        warehouse=os.getenv("SNOW_WAREHOUSE"),
+        database=os.getenv("SNOW_DATABASE"),
+        schema=os.getenv("SNOW_SCHEMA"),
+        role=os.getenv("SNOW_ROLE"),
+    )
+
+
+def build_merge_sql(table_name: str, stage_table: str, columns, key: str) -> str:
+    """
+    Arma el MERGE del lote sobre la tabla destino.
+    Los registros archivados en HubSpot no se borran: solo se marcan
+    con "archived" = TRUE (soft delete) y nunca se insertan como nuevos.
+    """
+    update_set = ",\n                ".join(
+        f'target."{column}" = source."{column}"' for column in columns if column != key
+    )
+    insert_columns = ", ".join(f'"{column}"' for column in columns)
+    insert_values = ", ".join(f'source."{column}"' for column in columns)
+
+    return f"""
+        MERGE INTO {table_name} AS target
+        USING {stage_table} AS source
+            ON target."{key}" = source."{key}"
+        WHEN MATCHED AND source."archived" THEN
+            UPDATE SET target."archived" = TRUE
+        WHEN MATCHED THEN
+            UPDATE SET
+                {update_set}
+        WHEN NOT MATCHED AND NOT source."archived" THEN
+            INSERT ({insert_columns})
+            VALUES ({insert_values})
+        """.strip()
+
+
+def upsert_table(conn, df, table_name: str):
+    """
+    Sube el lote a una tabla temporal y hace MERGE sobre la tabla destino
+    dentro de una sola transacción, así la tabla nunca queda vacía.
+    """
+    key = table_keys[table_name]
+    stage_table = f"{table_name}_STAGE"
+
+    # MERGE falla si la clave se repite en el origen: gana la última versión
+    df = df.drop_duplicates(subset=key, keep="last")
+
+    # La tabla temporal solo existe en esta sesión
+    _, _, nrows, _ = write_pandas(
+        conn,
+        df,
+        stage_table,
+        auto_create_table=True,
+        table_type="temporary",
+        use_logical_type=True,
+    )
+    metrics.add(f"rows_staged_{table_name.lower()}", nrows)
 
+    cursor = conn.cursor()
     try:
-        conn = snowflake.connector.connect(
-            user=os.getenv("SNOW_USER"),
-            password=os.getenv("SNOW_PASSWORD"),
-            account=os.getenv("SNOW_ACCOUNT"),
-            warehouse=os.getenv("SNOW_WAREHOUSE"),
-            database=os.getenv("SNOW_DATABASE"),
-            schema=os.getenv("SNOW_SCHEMA"),
-            role=os.getenv("SNOW_ROLE"),
+        merge_stage_table(cursor, table_name, stage_table, df.columns)
+        cursor.execute(f"DROP TABLE IF EXISTS {stage_table}")
+    finally:
+        cursor.close()
+
+
+def merge_stage_table(cursor, table_name: str, stage_table: str, columns):
+    """Crea la tabla destino si hace falta y hace el MERGE en una transacción."""
+    key = table_keys[table_name]
+
+    # Los DDL hacen commit implícito en Snowflake, por eso van antes del BEGIN
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name} LIKE {stage_table}")
+    cursor.execute(
+        f'ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS "archived" BOOLEAN DEFAULT FALSE'
+    )
+
+    cursor.execute("BEGIN")
+    try:
+        cursor.execute(build_merge_sql(table_name, stage_table, columns, key))
+        metrics.record_query(table_name, cursor, "MERGE")
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+
+
+def ensure_bridge_table(cursor, table_name: str):
+    key, related = bridge_keys[table_name]
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {table_name} ("{key}" VARCHAR, "{related}" VARCHAR)'
+    )
+
+
+def build_bridge_replace_sql(table_name: str, stage_table: str, overwrite: bool = False):
+    """Sentencias que reemplazan las asociaciones de los deals del lote."""
+    key, related = bridge_keys[table_name]
+    if overwrite:
+        delete_sql = f"DELETE FROM {table_name}"
+    else:
+        delete_sql = (
+            f'DELETE FROM {table_name} WHERE "{key}" IN (SELECT "{key}" FROM {stage_table})'
         )
+    return [
+        delete_sql,
+        f'INSERT INTO {table_name} ("{key}", "{related}") '
+        f'SELECT DISTINCT "{key}", "{related}" FROM {stage_table} '
+        f'WHERE "{related}" IS NOT NULL',
+    ]
 
-        print("Conexión a Snowflake exitosa.")
 
-        # Cargar Deals
-        # 'if_exists='replace'' borra la tabla y la crea de nuevo.
-        write_pandas(
-            conn,
-            df_deals,
-            "DEALS",  # Nombre de la tabla en Snowflake
-            auto_create_table=True,  # Crea la tabla si no existe
-            overwrite=True,
-            use_logical_type=True,
+def replace_bridge_rows(cursor, table_name: str, stage_table: str, overwrite: bool = False):
+    """Reemplaza las filas de la tabla puente en una transacción."""
+    ensure_bridge_table(cursor, table_name)
+
+    cursor.execute("BEGIN")
+    try:
+        for sql in build_bridge_replace_sql(table_name, stage_table, overwrite):
+            cursor.execute(sql)
+            metrics.record_query(table_name, cursor, sql.split(None, 1)[0])
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+
+
+def write_bridge_table(conn, df, table_name: str, mode: str):
+    """
+    Carga una tabla puente. En append y upsert se reemplazan las asociaciones
+    de los deals del lote (agregar filas sueltas duplicaría pares); en
+    overwrite se reemplaza la tabla entera.
+    """
+    if df.empty and mode != "overwrite":
+        cursor = conn.cursor()
+        try:
+            ensure_bridge_table(cursor, table_name)
+        finally:
+            cursor.close()
+        return
+
+    stage_table = f"{table_name}_STAGE"
+    _, _, nrows, _ = write_pandas(
+        conn,
+        df,
+        stage_table,
+        auto_create_table=True,
+        table_type="temporary",
+        use_logical_type=True,
+    )
+    metrics.add(f"rows_staged_{table_name.lower()}", nrows)
+
+    cursor = conn.cursor()
+    try:
+        replace_bridge_rows(cursor, table_name, stage_table, overwrite=mode == "overwrite")
+        cursor.execute(f"DROP TABLE IF EXISTS {stage_table}")
+    finally:
+        cursor.close()
+
+
+def notify_load_finished():
+    """Avisa a la API que hay datos nuevos. Si falla, la carga sigue siendo válida."""
+    if not API_CACHE_INVALIDATION_URL:
+        return
+
+    try:
+        response = requests.post(
+            API_CACHE_INVALIDATION_URL,
+            headers={"X-ETL-Token": CACHE_INVALIDATION_TOKEN or ""},
+            timeout=10,
         )
+        response.raise_for_status()
+        print("Caché de la API invalidado.")
+    except Exception as e:
+        print(f"No se pudo invalidar el caché de la API: {e}")
+
+
+def write_table(conn, df, table_name: str, mode: str):
+    """Escribe un DataFrame en una tabla de Snowflake usando uno de LOAD_MODES."""
+    if table_name in bridge_keys:
+        write_bridge_table(conn, df, table_name, mode)
+        return
+
+    # Un lote vacío no tiene nada que agregar ni actualizar
+    if df.empty and mode != "overwrite":
+        return
+
+    if mode == "upsert":
+        upsert_table(conn, df, table_name)
+        return
+
+    # 'overwrite=True' borra la tabla y la crea de nuevo.
+    _, _, nrows, _ = write_pandas(
+        conn,
+        df,
+        table_name,  # Nombre de la tabla en Snowflake
+        auto_create_table=True,  # Crea la tabla si no existe
+        overwrite=mode == "overwrite",
+        use_logical_type=True,
+    )
+    metrics.add(f"rows_loaded_{table_name.lower()}", nrows)
+
+
+def load_data(df_deals, df_leads, mode="overwrite", associations=None) -> bool:
+    """
+    Carga DEALS y LEADS en Snowflake usando uno de LOAD_MODES, y las tablas
+    puente de 'associations' (tabla -> DataFrame) si vienen.
+    Devuelve True si la carga terminó sin errores.
+    """
+    if mode not in LOAD_MODES:
+        raise ValueError(f"Modo de carga inválido: {mode}")
+
+    print("Iniciando carga a Snowflake...")
+
+    try:
+        conn = get_snowflake_connection()
+
+        print("Conexión a Snowflake exitosa.")
+
+        # Cargar Deals y Leads, y después las asociaciones de los deals
+        batches = ((df_deals, "DEALS"), (df_leads, "LEADS"))
+        for df, table_name in batches:
+            write_table(conn, df, table_name, mode)
+        for table_name, df in (associations or {}).items():
+            write_table(conn, df, table_name, mode)
 
-        # Cargar Leads
-        write_pandas(
+        # overwrite reemplaza todo: el resumen se recalcula completo
+        refresh_summaries(
             conn,
-            df_leads,
-            "LEADS",  # Nombre de la tabla en Snowflake
-            auto_create_table=True,
-            overwrite=True,
-            use_logical_type=True,
+            {
+                table_name: None if mode == "overwrite" else touched_days(df["created_at"])
+                for df, table_name in batches
+            },
         )
 
         print("Carga a Snowflake completada.")
+        notify_load_finished()
+        return True
 
     except Exception as e:
         print(f"Error cargando a Snowflake: {e}")
+        return False
     finally:
         if "conn" in locals():
             conn.close()
@@ -1,8 +1,199 @@
-from extract import extract_data
+import argparse
+
+from extract import extract_data, extract_incremental
 from transform import transform_data
-from load import load_data
+from load import LOAD_MODES, load_data
+from state import load_state, save_state
+from checkpoint import open_checkpoint
+from backfill import BACKFILL_WORKERS, run_backfill
+from row_hashes import RowHashIndex, select_bridge_rows
+from mirror import finish_mirror, open_mirror
+from pipeline import CHUNK_SIZE, run_pipeline
+from landing import land_and_load, load_landing
+from metrics import METRICS_FILE, PROMETHEUS_FILE, metrics
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ETL de HubSpot a Snowflake")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Extrae solo los registros modificados desde la última carga exitosa.",
+    )
+    parser.add_argument(
+        "--load-mode",
+        choices=LOAD_MODES,
+        default="upsert",
+        help="Cómo se escriben DEALS y LEADS en Snowflake (por defecto: upsert).",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Extrae, transforma y carga por chunks a la vez, con memoria acotada.",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_SIZE,
+        help="Registros por chunk en modo --stream.",
+    )
+    parser.add_argument(
+        "--landing",
+        action="store_true",
+        help="Escribe Parquet en disco y carga con PUT + COPY INTO.",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="RUN_ID",
+        help="Vuelve a cargar una corrida guardada en disco, sin extraer de HubSpot.",
+    )
+    parser.add_argument(
+        "--backfill",
+        action="store_true",
+        help="Extrae y transforma en paralelo, partiendo el portal por rangos de createdate.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=BACKFILL_WORKERS,
+        help="Procesos del backfill (por defecto, uno por núcleo).",
+    )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="Descarta el checkpoint de una extracción cortada y empieza de cero.",
+    )
+    parser.add_argument(
+        "--all-rows",
+        action="store_true",
+        help="Carga también las filas que no cambiaron desde la última carga.",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=METRICS_FILE,
+        help="Archivo JSON lines donde se agregan las métricas de cada corrida.",
+    )
+    parser.add_argument(
+        "--metrics-textfile",
+        default=PROMETHEUS_FILE,
+        metavar="PATH",
+        help="Escribe las métricas de la corrida en formato Prometheus (textfile collector).",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Corre cProfile sobre la transformación y guarda el perfil en un .prof.",
+    )
+    args = parser.parse_args()
+
+    # Un lote incremental solo trae los cambios: sobrescribir borraría el resto
+    if args.incremental and args.load_mode == "overwrite":
+        parser.error("--incremental no se puede usar con --load-mode overwrite")
+    if args.stream and args.load_mode == "overwrite":
+        parser.error("--stream no se puede usar con --load-mode overwrite")
+    if args.backfill and (args.incremental or args.stream or args.replay):
+        parser.error("--backfill no se puede usar con --incremental, --stream ni --replay")
+    if args.workers < 1:
+        parser.error("--workers debe ser al menos 1")
+
+    return args
+
+
+def run(args) -> bool:
+    """Corre el ETL según los argumentos. Devuelve True si terminó bien."""
+    load = land_and_load if args.landing else load_data
+
+    if args.replay:
+        with metrics.stage("load"):
+            return load_landing(args.replay, args.load_mode)
+
+    # Las filas de DEALS y LEADS iguales a las de la última carga no se cargan.
+    # overwrite reescribe la tabla entera: carga todo y rehace el índice.
+    row_index = RowHashIndex()
+    skip_unchanged = args.load_mode != "overwrite" and not args.all_rows
+    # Sin marca de agua guardada, --incremental también extrae todo
+    state = load_state() if args.incremental else {}
+    # Copia local para la API (ANALYTICS_MIRROR_PATH); recibe todas las filas.
+    # Solo una carga que no partió de una marca de agua trae el portal entero.
+    mirror = open_mirror(args.load_mode, complete=not any(state.values()))
+
+    if args.stream:
+        ok, new_state = run_pipeline(
+            args.load_mode,
+            state,
+            args.chunk_size,
+            landing=args.landing,
+            row_index=row_index,
+            skip_unchanged=skip_unchanged,
+            mirror=mirror,
+        )
+        finish_mirror(mirror, ok)
+        if ok:
+            row_index.save()
+        if ok and args.incremental:
+            save_state(new_state)
+        return ok
+
+    checkpoint = None
+    if args.backfill:
+        # Extracción y transformación juntas, repartidas en procesos
+        with metrics.stage("backfill") as stage:
+            clean_deals, clean_leads, associations = run_backfill(args.workers)
+            stage.records_out = len(clean_deals) + len(clean_leads)
+    else:
+        # La extracción completa guarda su avance en disco: si la corrida se
+        # corta, la siguiente retoma desde ahí en vez de volver a pedir todo
+        with metrics.stage("extract") as stage:
+            if args.incremental:
+                raw_deals, raw_leads, new_state = extract_incremental(state)
+            else:
+                checkpoint = open_checkpoint(fresh=args.fresh)
+                raw_deals, raw_leads = extract_data(checkpoint)
+            stage.records_out = len(raw_deals) + len(raw_leads)
+
+        with metrics.stage("transform", records_in=stage.records_out) as stage:
+            clean_deals, clean_leads, associations = transform_data(raw_deals, raw_leads)
+            stage.records_out = len(clean_deals) + len(clean_leads)
+
+    if mirror is not None:
+        for table_name, df in [("DEALS", clean_deals), ("LEADS", clean_leads)]:
+            mirror.write(table_name, df)
+        for table_name, df in associations.items():
+            mirror.write(table_name, df)
+
+    clean_deals = row_index.select_changed(
+        clean_deals, "DEALS", skip_unchanged, associations=associations
+    )
+    clean_leads = row_index.select_changed(clean_leads, "LEADS", skip_unchanged)
+    associations = select_bridge_rows(associations, clean_deals)
+
+    with metrics.stage("load", records_in=len(clean_deals) + len(clean_leads)) as stage:
+        ok = load(clean_deals, clean_leads, mode=args.load_mode, associations=associations)
+        stage.records_out = len(clean_deals) + len(clean_leads) if ok else 0
+
+    # La marca de agua, los hashes y el espejo solo avanzan (y el checkpoint
+    # se borra) si la carga terminó bien
+    finish_mirror(mirror, ok)
+    if ok:
+        row_index.save(replace=args.load_mode == "overwrite")
+    if ok and args.incremental:
+        save_state(new_state)
+    if ok and checkpoint is not None:
+        checkpoint.clear()
+    return ok
+
 
 if __name__ == "__main__":
-    raw_deals, raw_leads = extract_data()
-    clean_deals, clean_leads = transform_data(raw_deals, raw_leads)
-    load_data(clean_deals, clean_leads)
+    args = parse_args()
+
+    metrics.metrics_file = args.metrics_file
+    if args.profile:
+        metrics.enable_profiling("transform")
+
+    ok = False
+    try:
+        ok = run(args)
+    finally:
+        metrics.finish(ok, prometheus_file=args.metrics_textfile)
+        if args.profile:
+            metrics.dump_profile()
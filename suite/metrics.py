@@ -0,0 +1,243 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import resource
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from prometheus_client import CollectorRegistry, Gauge, generate_latest, write_to_textfile
+
+load_dotenv()
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Una línea JSON por etapa terminada y una al final de cada corrida
+METRICS_FILE = os.getenv("ETL_METRICS_FILE", os.path.join(script_dir, ".etl_metrics.jsonl"))
+# Archivo .prom para el textfile collector de node_exporter (opcional)
+PROMETHEUS_FILE = os.getenv("ETL_PROMETHEUS_FILE")
+PROFILE_DIR = os.getenv("ETL_PROFILE_DIR", script_dir)
+
+
+def peak_rss_mb() -> float:
+    # En Linux ru_maxrss viene en KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RunMetrics:
+    """
+    Métricas de una corrida del ETL, seguras entre hilos:
+    - etapas: tiempo, veces, registros de entrada y salida
+    - contadores: requests HTTP, bytes, reintentos, 429, filas cargadas...
+    - consultas de Snowflake: query id, tabla y filas afectadas
+    """
+
+    def __init__(self, metrics_file: Optional[str] = None):
+        self.metrics_file = metrics_file
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self, run_id: Optional[str] = None):
+        with self.lock:
+            self.run_id = run_id or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+            self.started = time.perf_counter()
+            self.stages: Dict[str, dict] = {}
+            self.counters: Dict[str, float] = defaultdict(int)
+            self.queries: List[dict] = []
+            self.profile_stages: set = set()
+            # Un Profile por hilo: cProfile solo mide el hilo donde se activa
+            self.profilers: Dict[int, cProfile.Profile] = {}
+
+    # --- Registro ---
+
+    def add(self, name: str, value: float = 1):
+        with self.lock:
+            self.counters[name] += value
+
+    def record_query(self, table_name: str, cursor, statement: str):
+        """Guarda el query id y las filas afectadas de la última sentencia del cursor."""
+        rows = getattr(cursor, "rowcount", None)
+        rows = rows if isinstance(rows, int) else None
+        with self.lock:
+            self.queries.append(
+                {
+                    "table": table_name,
+                    "statement": statement,
+                    "query_id": getattr(cursor, "sfqid", None),
+                    "rows": rows,
+                }
+            )
+
+    @contextmanager
+    def stage(self, name: str, records_in: Optional[int] = None):
+        """
+        Mide una etapa. Se puede entrar varias veces (ej. una por chunk): el
+        tiempo y los registros se acumulan. El bloque puede fijar los
+        registros de salida con 'stage.records_out = n'.
+        """
+        info = StageRun()
+        profiler = self._profiler_for(name)
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield info
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            seconds = time.perf_counter() - start
+            with self.lock:
+                stage = self.stages.setdefault(
+                    name, {"seconds": 0.0, "calls": 0, "records_in": 0, "records_out": 0}
+                )
+                stage["seconds"] += seconds
+                stage["calls"] += 1
+                stage["records_in"] += records_in or 0
+                stage["records_out"] += info.records_out or 0
+                stage["peak_rss_mb"] = round(peak_rss_mb(), 1)
+                event = {"event": "stage", "run_id": self.run_id, "stage": name,
+                         "seconds": round(seconds, 4), "records_in": records_in,
+                         "records_out": info.records_out}
+            self._write_line(event)
+
+    # --- Perfilado ---
+
+    def enable_profiling(self, *stages: str):
+        """Corre cProfile dentro de las etapas indicadas (ej. "transform")."""
+        with self.lock:
+            self.profile_stages = set(stages)
+
+    def _profiler_for(self, name: str) -> Optional[cProfile.Profile]:
+        if name not in self.profile_stages:
+            return None
+        with self.lock:
+            return self.profilers.setdefault(threading.get_ident(), cProfile.Profile())
+
+    def dump_profile(self, top: int = 25) -> Optional[str]:
+        """Guarda el perfil en un .prof (para snakeviz/pstats) e imprime lo más caro."""
+        profilers = list(self.profilers.values())
+        if not profilers:
+            return None
+
+        path = os.path.join(PROFILE_DIR, f"etl_{self.run_id}.prof")
+        stats = pstats.Stats(profilers[0])
+        for profiler in profilers[1:]:
+            stats.add(profiler)
+        stats.dump_stats(path)
+
+        output = io.StringIO()
+        stats.stream = output
+        stats.sort_stats("cumulative").print_stats(top)
+        print(output.getvalue())
+        print(f"Perfil guardado en {path}")
+        return path
+
+    # --- Salida ---
+
+    def summary(self, ok: Optional[bool] = None) -> dict:
+        with self.lock:
+            stages = {}
+            for name, stage in self.stages.items():
+                stage = dict(stage)
+                stage["seconds"] = round(stage["seconds"], 4)
+                records = stage["records_out"] or stage["records_in"]
+                if stage["seconds"] and records:
+                    stage["records_per_sec"] = round(records / stage["seconds"])
+                stages[name] = stage
+
+            return {
+                "event": "run",
+                "run_id": self.run_id,
+                "ok": ok,
+                "seconds": round(time.perf_counter() - self.started, 4),
+                "peak_rss_mb": round(peak_rss_mb(), 1),
+                "stages": stages,
+                "counters": dict(self.counters),
+                "snowflake_queries": list(self.queries),
+            }
+
+    def _write_line(self, data: dict):
+        if not self.metrics_file:
+            return
+        try:
+            with open(self.metrics_file, "a") as f:
+                f.write(json.dumps(data, default=str) + "\n")
+        except OSError as e:
+            print(f"No se pudieron escribir las métricas: {e}")
+
+    def prometheus_registry(self, ok: Optional[bool] = None) -> CollectorRegistry:
+        """Registro de Prometheus con el resumen de la corrida."""
+        summary = self.summary(ok)
+        registry = CollectorRegistry()
+
+        for name, help_text, value in (
+            ("etl_run_success", "1 si la última corrida terminó bien.", 1 if ok else 0),
+            ("etl_run_seconds", "Duración de la última corrida.", summary["seconds"]),
+            ("etl_run_peak_rss_megabytes", "Memoria máxima del proceso.", summary["peak_rss_mb"]),
+            (
+                "etl_run_finished_timestamp_seconds",
+                "Cuándo terminó la última corrida.",
+                round(time.time()),
+            ),
+        ):
+            Gauge(name, help_text, registry=registry).set(value)
+
+        for metric, key, help_text in (
+            ("etl_stage_seconds", "seconds", "Tiempo en cada etapa."),
+            ("etl_stage_records_in", "records_in", "Registros que entraron a cada etapa."),
+            ("etl_stage_records_out", "records_out", "Registros que salieron de cada etapa."),
+        ):
+            gauge = Gauge(metric, help_text, ["stage"], registry=registry)
+            for name, stage in sorted(summary["stages"].items()):
+                gauge.labels(stage=name).set(stage[key])
+
+        gauge = Gauge(
+            "etl_run_counter",
+            "Contadores de la última corrida (HTTP, filas...).",
+            ["name"],
+            registry=registry,
+        )
+        for name, value in sorted(summary["counters"].items()):
+            gauge.labels(name=name).set(value)
+
+        return registry
+
+    def prometheus_text(self, ok: Optional[bool] = None) -> str:
+        return generate_latest(self.prometheus_registry(ok)).decode()
+
+    def finish(self, ok: bool, prometheus_file: Optional[str] = PROMETHEUS_FILE) -> dict:
+        """Escribe el resumen de la corrida (JSON lines y, si se pide, Prometheus)."""
+        summary = self.summary(ok)
+        self._write_line(summary)
+
+        if prometheus_file:
+            # Escritura atómica: el collector nunca lee un archivo a medias
+            write_to_textfile(prometheus_file, self.prometheus_registry(ok))
+
+        stages = ", ".join(
+            f"{name} {stage['seconds']:.2f}s" for name, stage in summary["stages"].items()
+        )
+        print(
+            f"Métricas de la corrida {self.run_id}: {summary['seconds']:.2f}s "
+            f"({stages}), {int(summary['counters'].get('http_requests', 0))} requests HTTP, "
+            f"pico de memoria {summary['peak_rss_mb']} MB"
+        )
+        return summary
+
+
+class StageRun:
+    """Lo que el bloque de una etapa puede informar al terminar."""
+
+    def __init__(self):
+        self.records_out: Optional[int] = None
+
+
+# Métricas de la corrida actual, compartidas por todos los módulos del ETL.
+# Solo se escriben a disco si main.py le asigna 'metrics_file'.
+metrics = RunMetrics()
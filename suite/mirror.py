@@ -0,0 +1,255 @@
+import os
+import sqlite3
+from contextlib import closing, contextmanager
+from typing import Optional
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from load import bridge_keys, notify_load_finished, table_keys
+
+load_dotenv()
+
+# Espejo local de las métricas para la API (METRICS_BACKEND=mirror). Vacío = no
+# se escribe. Snowflake sigue siendo la fuente de verdad: el espejo es una copia.
+#   <path>.build  DEALS, LEADS y DEAL_COMPANY, actualizadas carga a carga
+#   <path>        tablas de resumen que lee la API, reemplazadas de forma atómica
+ANALYTICS_MIRROR_PATH = os.getenv("ANALYTICS_MIRROR_PATH")
+
+# Columnas de cada tabla del espejo (la puente de contactos no hace falta:
+# las métricas solo usan DEAL_COMPANY para separar B2B de B2C)
+mirror_tables = {
+    "DEALS": (
+        '"deal_id" TEXT PRIMARY KEY, "deal_name" TEXT, "amount" REAL, "stage" TEXT, '
+        '"created_at" TEXT, "associated_company_id" TEXT, "archived" INTEGER'
+    ),
+    "LEADS": (
+        '"lead_id" TEXT PRIMARY KEY, "email" TEXT, "first_name" TEXT, "last_name" TEXT, '
+        '"status" TEXT, "created_at" TEXT, "archived" INTEGER'
+    ),
+    "DEAL_COMPANY": '"deal_id" TEXT, "company_id" TEXT',
+}
+
+# Marca que el espejo de trabajo ya recibió una carga completa del portal.
+# Sin ella no se publica: una carga incremental solo trae los cambios y el
+# espejo serviría totales equivocados.
+MIRROR_STATE_TABLE = "MIRROR_STATE"
+
+# Los mismos resúmenes que summaries.py arma en Snowflake, en SQL de SQLite
+mirror_summaries = [
+    """
+    CREATE TABLE DEALS_DAILY_SUMMARY AS
+    SELECT
+        date(d."created_at") AS "day",
+        d."stage" AS "stage",
+        CASE WHEN b2b."deal_id" IS NOT NULL THEN 'B2B' ELSE 'B2C' END AS "segment",
+        COUNT(*) AS "deal_count",
+        COALESCE(SUM(d."amount"), 0.0) AS "total_amount"
+    FROM build.DEALS AS d
+    LEFT JOIN (SELECT DISTINCT "deal_id" FROM build.DEAL_COMPANY) AS b2b
+        ON b2b."deal_id" = d."deal_id"
+    WHERE NOT COALESCE(d."archived", 0)
+    GROUP BY 1, 2, 3
+    """,
+    """
+    CREATE TABLE LEADS_DAILY_SUMMARY AS
+    SELECT
+        date("created_at") AS "day",
+        "status",
+        COUNT(*) AS "lead_count"
+    FROM build.LEADS
+    WHERE NOT COALESCE("archived", 0)
+    GROUP BY 1, 2
+    """,
+]
+
+
+def to_rows(df: pd.DataFrame):
+    """Filas del DataFrame como tuplas de valores de Python (None para nulos)."""
+    frame = df.copy()
+    if "created_at" in frame:
+        frame["created_at"] = pd.to_datetime(frame["created_at"], utc=True).dt.strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+    frame = frame.astype(object).where(frame.notna(), None)
+    return list(frame.itertuples(index=False, name=None))
+
+
+class MirrorWriter:
+    """
+    Aplica los lotes de una carga al espejo de trabajo con la misma lógica que
+    la carga a Snowflake (upsert por clave, soft delete de archivados,
+    reemplazo de asociaciones por deal). Cada lote se confirma en su propia
+    transacción, así la escritura no bloquea el archivo durante toda la
+    extracción. publish() reemplaza el archivo que lee la API.
+
+    'complete' indica que la carga trae el portal entero (extracción completa
+    o backfill). El espejo se publica recién después de una carga así.
+    """
+
+    def __init__(self, path: str, mode: str = "upsert", complete: bool = False):
+        self.path = path
+        self.build_path = f"{path}.build"
+        self.mode = mode
+        self.complete = complete
+
+        # Lo escribe la etapa de transformación del pipeline y lo publica el
+        # hilo principal, nunca a la vez
+        self.conn = sqlite3.connect(
+            self.build_path, isolation_level=None, check_same_thread=False
+        )
+        for table_name, columns in mirror_tables.items():
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({columns})")
+        # Cada carga borra las asociaciones de sus deals: sin índice, recorre la tabla
+        self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS DEAL_COMPANY_DEAL_ID ON DEAL_COMPANY ("deal_id")'
+        )
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {MIRROR_STATE_TABLE} (seeded_at TEXT NOT NULL)"
+        )
+
+        # overwrite reemplaza las tablas de Snowflake enteras. Hasta que la
+        # carga se publique el espejo de trabajo queda sin carga completa: si
+        # se corta a mitad, una incremental no publica las tablas a medio llenar
+        if mode == "overwrite":
+            with self.transaction():
+                for table_name in mirror_tables:
+                    self.conn.execute(f"DELETE FROM {table_name}")
+                self.conn.execute(f"DELETE FROM {MIRROR_STATE_TABLE}")
+
+        self.seeded = (
+            self.conn.execute(f"SELECT 1 FROM {MIRROR_STATE_TABLE}").fetchone() is not None
+        )
+
+    @contextmanager
+    def transaction(self):
+        self.conn.execute("BEGIN")
+        try:
+            yield
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def write(self, table_name: str, df: pd.DataFrame):
+        if table_name not in mirror_tables or df.empty:
+            return
+        # Sin una carga completa previa, lo incremental no se publicaría: no se guarda
+        if not (self.seeded or self.complete):
+            return
+        with self.transaction():
+            if table_name in bridge_keys:
+                self.write_bridge(table_name, df)
+            else:
+                self.write_table(table_name, df)
+
+    def write_table(self, table_name: str, df: pd.DataFrame):
+        key = table_keys[table_name]
+        columns = list(df.columns)
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        archived = df["archived"].fillna(False).astype(bool)
+
+        # En overwrite se guardan también los archivados, como en Snowflake
+        rows = df if self.mode == "overwrite" else df[~archived]
+        update_set = ", ".join(
+            f'"{column}" = excluded."{column}"' for column in columns if column != key
+        )
+        self.conn.executemany(
+            f"INSERT INTO {table_name} ({column_list}) VALUES ({placeholders}) "
+            f'ON CONFLICT ("{key}") DO UPDATE SET {update_set}',
+            to_rows(rows),
+        )
+        if self.mode != "overwrite":
+            self.conn.executemany(
+                f'UPDATE {table_name} SET "archived" = 1 WHERE "{key}" = ?',
+                ((value,) for value in df.loc[archived, key].tolist()),
+            )
+
+    def write_bridge(self, table_name: str, df: pd.DataFrame):
+        """Reemplaza las asociaciones de los deals del lote."""
+        key, related = bridge_keys[table_name]
+        if self.mode != "overwrite":
+            self.conn.executemany(
+                f'DELETE FROM {table_name} WHERE "{key}" = ?',
+                ((value,) for value in df[key].drop_duplicates().tolist()),
+            )
+        rows = df[[key, related]].dropna().drop_duplicates()
+        self.conn.executemany(
+            f'INSERT INTO {table_name} ("{key}", "{related}") VALUES (?, ?)', to_rows(rows)
+        )
+
+    def publish(self) -> bool:
+        """
+        Arma las tablas de resumen en un archivo nuevo, que reemplaza al
+        anterior con un rename: la API lee uno u otro entero. Si el espejo
+        nunca recibió una carga completa no se publica nada.
+        """
+        # Recién acá, con la carga terminada, el espejo queda marcado completo
+        if self.complete and not self.seeded:
+            self.conn.execute(
+                f"INSERT INTO {MIRROR_STATE_TABLE} VALUES (datetime('now'))"
+            )
+            self.seeded = True
+        self.conn.close()
+
+        if not self.seeded:
+            print(
+                f"El espejo local {self.build_path} no tiene una carga completa: no se "
+                "publica. Corré una carga completa (sin --incremental) para llenarlo."
+            )
+            return False
+
+        tmp_path = f"{self.path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        with closing(sqlite3.connect(tmp_path)) as snapshot:
+            snapshot.execute("ATTACH DATABASE ? AS build", (self.build_path,))
+            for sql in mirror_summaries:
+                snapshot.execute(sql)
+            snapshot.commit()
+            snapshot.execute("DETACH DATABASE build")
+
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        print(f"Espejo local publicado en {self.path}")
+        return True
+
+    def abort(self):
+        """
+        La carga a Snowflake no terminó bien: no se publica. Los lotes ya
+        escritos quedan en el espejo de trabajo; la próxima carga los vuelve a
+        traer porque la marca de agua no avanzó.
+        """
+        self.conn.close()
+
+
+def open_mirror(
+    mode: str = "upsert",
+    complete: bool = False,
+    path: Optional[str] = ANALYTICS_MIRROR_PATH,
+) -> Optional[MirrorWriter]:
+    """El espejo de esta carga, o None si no está configurado."""
+    if not path:
+        return None
+    return MirrorWriter(path, mode, complete)
+
+
+def finish_mirror(mirror: Optional[MirrorWriter], ok: bool):
+    """
+    Publica el espejo si la carga terminó bien, o lo descarta. Un error acá no
+    hace fallar la corrida: los datos ya están en Snowflake.
+    """
+    if mirror is None:
+        return
+    try:
+        if not ok:
+            mirror.abort()
+            return
+        # La carga ya avisó a la API, pero antes de que cambiara el espejo
+        if mirror.publish():
+            notify_load_finished()
+    except Exception as e:
+        print(f"No se pudo actualizar el espejo local: {e}")
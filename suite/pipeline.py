@@ -0,0 +1,249 @@
+import os
+import queue
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from extract import extract_pages_since, max_updated_at, now_ms
+from transform import transform_deal_tables, transform_leads
+from load import (
+    bridge_keys,
+    get_snowflake_connection,
+    notify_load_finished,
+    table_keys,
+    write_table,
+)
+from landing import create_run_dir, load_landing, write_landing_files
+from metrics import metrics
+from row_hashes import RowHashIndex, select_bridge_rows
+from mirror import MirrorWriter
+from summaries import refresh_summaries, touched_days
+
+load_dotenv()
+
+# Registros por chunk que se transforman y cargan de una vez
+CHUNK_SIZE = int(os.getenv("ETL_CHUNK_SIZE", 5000))
+# Elementos que puede haber en cada cola entre etapas. Si una etapa es lenta,
+# la cola se llena y la etapa anterior se bloquea hasta que haya lugar.
+QUEUE_SIZE = int(os.getenv("ETL_QUEUE_SIZE", 4))
+
+# Tipo de objeto de HubSpot -> función que arma sus tablas en Snowflake
+# (los deals traen además las tablas puente de sus asociaciones)
+pipeline_objects = {
+    "deals": transform_deal_tables,
+    "contacts": lambda records: {"LEADS": transform_leads(records)},
+}
+
+# Marca el final de una cola
+DONE = object()
+
+
+class PipelineAborted(Exception):
+    """Otra etapa falló y el pipeline se está deteniendo."""
+
+
+def put(q: queue.Queue, item, stop: threading.Event):
+    """Como q.put() pero se rinde si otra etapa ya falló."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+    raise PipelineAborted()
+
+
+def get(q: queue.Queue, stop: threading.Event):
+    """Como q.get() pero se rinde si otra etapa ya falló."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    raise PipelineAborted()
+
+
+def run_pipeline(
+    mode: str = "upsert",
+    state: Optional[Dict[str, str]] = None,
+    chunk_size: int = CHUNK_SIZE,
+    queue_size: int = QUEUE_SIZE,
+    landing: bool = False,
+    row_index: Optional[RowHashIndex] = None,
+    skip_unchanged: bool = True,
+    mirror: Optional[MirrorWriter] = None,
+) -> Tuple[bool, Dict[str, str]]:
+    """
+    Corre extracción, transformación y carga al mismo tiempo, conectadas por
+    colas acotadas, así la memoria depende del tamaño de chunk y de las colas
+    y no del tamaño del portal.
+
+    Con 'state' solo extrae lo modificado desde la última carga (incremental).
+    Con 'landing' cada chunk se escribe como Parquet en disco y al final se
+    carga cada tabla con un solo PUT + COPY INTO.
+    Con 'row_index' las filas de DEALS y LEADS que no cambiaron desde la
+    última carga no se cargan (ni las filas de sus tablas puente); sus hashes
+    se guardan después, si todo sale bien.
+    Con 'mirror' cada chunk (completo) se escribe también en el espejo local.
+    Devuelve si terminó bien y el nuevo estado (marcas de agua).
+    """
+    if mode not in ("append", "upsert"):
+        raise ValueError(f"El pipeline solo carga en modo append o upsert, no {mode}")
+
+    print("Iniciando pipeline por chunks...")
+
+    state = state or {}
+    incremental = bool(state)
+    until_ms = now_ms()
+
+    pages_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    chunks_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    new_state = dict(state)
+    loaded_rows = {table_name: 0 for table_name in ("DEALS", "LEADS")}
+    run_id, run_dir = create_run_dir() if landing else (None, None)
+
+    def run_stage(target, *args):
+        try:
+            target(*args)
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    def extract_stage(object_type: str):
+        since = state.get(object_type) if incremental else None
+        high_water_mark = since
+        # Tiempo de pared: incluye la espera cuando la cola está llena
+        try:
+            with metrics.stage(f"extract:{object_type}") as stage:
+                stage.records_out = 0
+                for page in extract_pages_since(object_type, since, until_ms):
+                    high_water_mark = max_updated_at(high_water_mark, page)
+                    stage.records_out += len(page)
+                    put(pages_queue, (object_type, page), stop)
+        finally:
+            if high_water_mark:
+                new_state[object_type] = high_water_mark
+        put(pages_queue, (object_type, DONE), stop)
+
+    def transform_stage():
+        buffers: Dict[str, List[dict]] = {object_type: [] for object_type in pipeline_objects}
+        pending = set(pipeline_objects)
+
+        def flush(object_type: str):
+            records = buffers[object_type]
+            if not records:
+                return
+            buffers[object_type] = []
+            with metrics.stage("transform", records_in=len(records)) as stage:
+                tables = pipeline_objects[object_type](records)
+                stage.records_out = len(records)
+            if mirror is not None:
+                for table_name, df in tables.items():
+                    mirror.write(table_name, df)
+            if row_index is not None:
+                associations = {
+                    table_name: df
+                    for table_name, df in tables.items()
+                    if table_name in bridge_keys
+                }
+                tables = {
+                    table_name: (
+                        row_index.select_changed(
+                            df, table_name, skip_unchanged, associations=associations
+                        )
+                        if table_name in table_keys
+                        else df
+                    )
+                    for table_name, df in tables.items()
+                }
+                # Solo las asociaciones de los deals que se cargan
+                if "DEALS" in tables:
+                    tables.update(select_bridge_rows(associations, tables["DEALS"]))
+            for table_name, df in tables.items():
+                put(chunks_queue, (table_name, df), stop)
+
+        while pending:
+            object_type, page = get(pages_queue, stop)
+            if page is DONE:
+                pending.discard(object_type)
+                flush(object_type)
+                continue
+
+            buffers[object_type].extend(page)
+            if len(buffers[object_type]) >= chunk_size:
+                flush(object_type)
+
+        put(chunks_queue, DONE, stop)
+
+    def landing_stage():
+        while True:
+            item = get(chunks_queue, stop)
+            if item is DONE:
+                return
+            table_name, df = item
+            with metrics.stage("landing", records_in=len(df)) as stage:
+                write_landing_files(df, table_name, run_dir)
+                stage.records_out = len(df)
+            if table_name in loaded_rows:
+                loaded_rows[table_name] += len(df)
+
+    def load_stage():
+        conn = get_snowflake_connection()
+        touched = {table_name: set() for table_name in loaded_rows}
+        try:
+            while True:
+                item = get(chunks_queue, stop)
+                if item is DONE:
+                    break
+                table_name, df = item
+                with metrics.stage("load", records_in=len(df)) as stage:
+                    write_table(conn, df, table_name, mode)
+                    stage.records_out = len(df)
+                if table_name in loaded_rows:
+                    loaded_rows[table_name] += len(df)
+                    touched[table_name] |= touched_days(df["created_at"])
+                print(f"  Chunk cargado en {table_name}: {len(df)} filas")
+
+            refresh_summaries(conn, touched)
+        finally:
+            conn.close()
+
+    threads = [
+        threading.Thread(target=run_stage, args=(extract_stage, object_type))
+        for object_type in pipeline_objects
+    ]
+    threads.append(threading.Thread(target=run_stage, args=(transform_stage,)))
+    threads.append(
+        threading.Thread(
+            target=run_stage, args=(landing_stage if landing else load_stage,)
+        )
+    )
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        print(f"Error en el pipeline: {errors[0]}")
+        return False, state
+
+    # load_landing ya avisa a la API al terminar
+    if landing:
+        with metrics.stage("load"):
+            ok = load_landing(run_id, mode)
+        if not ok:
+            return False, state
+    else:
+        notify_load_finished()
+
+    print(
+        f"Pipeline completado: {loaded_rows['DEALS']} deals y "
+        f"{loaded_rows['LEADS']} leads cargados."
+    )
+    return True, new_state
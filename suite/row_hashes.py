@@ -0,0 +1,176 @@
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from itertools import repeat
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from load import bridge_keys, table_keys
+from metrics import metrics
+
+load_dotenv()
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Índice local con el hash del contenido de cada fila cargada en DEALS y LEADS.
+# HubSpot marca como modificados registros en los que no cambió ninguna de las
+# columnas que guardamos: con el hash se reconocen y no se vuelven a cargar.
+ROW_HASH_FILE = os.getenv(
+    "ETL_ROW_HASH_FILE", os.path.join(script_dir, ".etl_row_hashes.sqlite")
+)
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """
+    Hash de 64 bits del contenido de cada fila (no depende del índice).
+    Los números se pasan a float antes, para que un monto 5 y 5.0 den lo mismo.
+    Si otra versión de pandas cambiara los hashes, la siguiente corrida solo
+    cargaría todo de nuevo.
+    """
+    frame = df.copy()
+    numeric = frame.select_dtypes(include="number").columns
+    frame[numeric] = frame[numeric].astype("float64")
+    # SQLite guarda enteros con signo: se reinterpretan los bits como int64
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy().view(np.int64)
+
+
+def association_columns(
+    df: pd.DataFrame, key: str, associations: Dict[str, pd.DataFrame]
+) -> pd.DataFrame:
+    """
+    Una columna por tabla puente con los ids asociados a cada fila, ordenados
+    y unidos (ej. "12,40"), para que el hash cambie si cambian las asociaciones.
+    """
+    keys = df[key].astype(str)
+    columns = {}
+    for table_name, bridge in sorted(associations.items()):
+        _, related = bridge_keys[table_name]
+        ids = (
+            bridge.dropna(subset=[related])
+            .astype({key: str, related: str})
+            .drop_duplicates()
+            .sort_values(related)
+            .groupby(key)[related]
+            .agg(",".join)
+        )
+        columns[table_name] = keys.map(ids).fillna("").to_numpy()
+    return pd.DataFrame(columns, index=df.index)
+
+
+def select_bridge_rows(
+    associations: Dict[str, pd.DataFrame], deals: pd.DataFrame
+) -> Dict[str, pd.DataFrame]:
+    """
+    Las filas de las tablas puente de los deals que se van a cargar. Las de un
+    deal sin cambios ya están en Snowflake: sus asociaciones entran en su hash.
+    """
+    deal_ids = deals[table_keys["DEALS"]].astype(str)
+    selected = {}
+    for table_name, df in associations.items():
+        key, _ = bridge_keys[table_name]
+        selected[table_name] = df[df[key].astype(str).isin(deal_ids)]
+    return selected
+
+
+class RowHashIndex:
+    """
+    Hashes de las filas de la última carga, en SQLite. Los hashes nuevos
+    quedan pendientes hasta save(), que se llama solo si la carga terminó bien:
+    si falla, la próxima corrida vuelve a ver esas filas como cambiadas.
+    """
+
+    def __init__(self, path: str = ROW_HASH_FILE):
+        self.path = path
+        self.pending: Dict[str, List[pd.DataFrame]] = {}
+        self.lock = threading.Lock()
+
+        with closing(sqlite3.connect(self.path)) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS row_hashes ("
+                "table_name TEXT NOT NULL, key TEXT NOT NULL, hash INTEGER NOT NULL, "
+                "PRIMARY KEY (table_name, key)) WITHOUT ROWID"
+            )
+
+    def stored_hashes(self, table_name: str, keys: pd.Series) -> pd.DataFrame:
+        """Los hashes guardados de 'keys' (las que no están, no vienen)."""
+        with closing(sqlite3.connect(self.path)) as conn:
+            conn.execute("CREATE TEMP TABLE batch_keys (key TEXT PRIMARY KEY)")
+            conn.executemany(
+                "INSERT OR IGNORE INTO batch_keys VALUES (?)", zip(keys.tolist())
+            )
+            rows = conn.execute(
+                "SELECT r.key, r.hash FROM row_hashes AS r "
+                "JOIN batch_keys AS b ON r.key = b.key WHERE r.table_name = ?",
+                (table_name,),
+            ).fetchall()
+
+        stored = pd.DataFrame(rows, columns=["key", "stored_hash"])
+        return stored.astype({"key": object, "stored_hash": "Int64"})
+
+    def select_changed(
+        self,
+        df: pd.DataFrame,
+        table_name: str,
+        skip_unchanged: bool = True,
+        associations: Optional[Dict[str, pd.DataFrame]] = None,
+    ) -> pd.DataFrame:
+        """
+        Devuelve solo las filas nuevas o con algún cambio respecto de la última
+        carga, y deja pendientes sus hashes. Con 'skip_unchanged' en False
+        devuelve todas (ej. overwrite) pero igual registra sus hashes.
+        'associations' son las tablas puente del mismo lote: sus ids entran en
+        el hash, así un deal al que solo le cambiaron las asociaciones cuenta
+        como cambiado.
+        """
+        key = table_keys[table_name]
+        hashed = df
+        if associations:
+            hashed = pd.concat([df, association_columns(df, key, associations)], axis=1)
+        batch = pd.DataFrame(
+            {"key": df[key].astype(str).to_numpy(), "hash": row_hashes(hashed)}
+        )
+
+        if skip_unchanged and len(batch):
+            merged = batch.merge(
+                self.stored_hashes(table_name, batch["key"]), on="key", how="left"
+            )
+            unchanged = (merged["hash"] == merged["stored_hash"]).fillna(False)
+            changed = ~unchanged.to_numpy(dtype=bool)
+        else:
+            changed = np.ones(len(batch), dtype=bool)
+
+        with self.lock:
+            self.pending.setdefault(table_name, []).append(batch[changed])
+
+        skipped = int(len(batch) - changed.sum())
+        metrics.add(f"rows_changed_{table_name.lower()}", len(batch) - skipped)
+        metrics.add(f"rows_skipped_{table_name.lower()}", skipped)
+        if skipped:
+            print(f"{table_name}: {skipped} filas sin cambios no se cargan.")
+
+        return df[changed]
+
+    def save(self, replace: bool = False):
+        """
+        Guarda los hashes pendientes en una sola transacción. Con 'replace' se
+        borra antes el índice de cada tabla (la tabla se reescribió completa).
+        """
+        with self.lock:
+            pending, self.pending = self.pending, {}
+
+        with closing(sqlite3.connect(self.path)) as conn:
+            with conn:
+                for table_name, frames in pending.items():
+                    if replace:
+                        conn.execute(
+                            "DELETE FROM row_hashes WHERE table_name = ?", (table_name,)
+                        )
+                    for batch in frames:
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO row_hashes VALUES (?, ?, ?)",
+                            zip(repeat(table_name), batch["key"], batch["hash"].tolist()),
+                        )
@@ -1,5 +1,5 @@
 # Importa estos al inicio de tu etl.py
-from typing import List, Tuple, Optional, TypedDict, Generic, TypeVar
+from typing import List, Tuple, Optional, TypedDict, Generic, TypeVar, NotRequired
 
 # --- Plantillas de Tipo para la API de HubSpot ---
 
@@ -7,11 +7,22 @@ from typing import List, Tuple, Optional, TypedDict, Generic, TypeVar
 T = TypeVar("T")
 
 
+# El cursor de la siguiente página (ej. {"after": "NTI1Cg%3D%3D", "link": "..."})
+class HubSpotPagingNext(TypedDict):
+    after: str
+    link: NotRequired[str]
+
+
+# El bloque 'paging'. Solo viene si hay más páginas por leer.
+class HubSpotPaging(TypedDict):
+    next: NotRequired[HubSpotPagingNext]
+
+
 # 2. Define la "envoltura" de la API.
 #    Usa Generic[T] para decir que 'results' será una lista del tipo 'T'
 class HubSpotApiResponse(TypedDict, Generic[T]):
     results: List[T]
-    # Aquí también iría 'paging', si lo estuvieras usando
+    paging: NotRequired[HubSpotPaging]
 
 
 # Un solo resultado de asociación (ej. un ID de compañía)
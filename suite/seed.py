@@ -1,15 +1,39 @@
-import requests
+import argparse
 import os
-import time
-from dotenv import load_dotenv
-from faker import Faker
 import random
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from faker import Faker
+import requests
+
+from hubspot_client import (
+    HUBSPOT_API_BASE,
+    HUBSPOT_KEY,
+    DailyQuotaExceeded,
+    hubspot_request,
+)
+from state import write_atomic
+
+load_dotenv()
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# HubSpot acepta hasta 100 registros por llamada a /batch/create
+BATCH_SIZE = 100
+# Archivo donde se anota qué lotes ya se crearon, para poder retomar el seeding
+SEED_STATE_FILE = os.getenv(
+    "SEED_STATE_FILE", os.path.join(script_dir, ".seed_state.jsonl")
+)
+
+FALLBACK_INDUSTRIES = ["COMPUTER_SOFTWARE", "BANKING"]
 
 
 def get_industries():
     try:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
         json_path = os.path.join(script_dir, "industries.json")
 
         with open(json_path, "r") as f:
@@ -22,148 +46,315 @@ def get_industries():
         print(
             "ERROR: No se encontró el archivo 'industries.json'. Usando lista de fallback."
         )
-        valid_industries = ["COMPUTER_SOFTWARE", "BANKING"]
+        return FALLBACK_INDUSTRIES
 
 
-industries = get_industries()
-load_dotenv()
-API_KEY = os.getenv("HUBSPOT_ACCESS_TOKEN")
-if not API_KEY:
-    raise EnvironmentError("No se encontró HUBSPOT_ACCESS_TOKEN en el archivo .env")
-
-HEADERS = {"Authorization": f"Bearer {API_KEY}", "Content-Type": "application/json"}
-
-COMPANIES_URL = "https://api.hubapi.com/crm/v3/objects/companies"
-CONTACTS_URL = "https://api.hubapi.com/crm/v3/objects/contacts"
-DEALS_URL = "https://api.hubapi.com/crm/v3/objects/deals"
-
-faker = Faker()
-
-company_ids = []
-contact_ids = []
-
-# --- 1. Crear Compañías ---
-print("--- Iniciando creación de Compañías ---")
-for _ in range(5):
-    properties = {
-        "name": faker.company(),
-        "industry": faker.random_element(elements=industries),
-        "domain": faker.domain_name(),
-        "city": faker.city(),
-        "country": faker.country(),
-    }
-    payload = {"properties": properties}
+# Faker no es seguro entre hilos: cada hilo del seeding usa el suyo
+_worker = threading.local()
 
-    try:
-        r = requests.post(COMPANIES_URL, headers=HEADERS, json=payload)
-        r.raise_for_status()
-
-        company_id = r.json()["id"]
-        company_ids.append(company_id)
-        print(f"Compañía creada con ID: {company_id}")
-
-    except requests.exceptions.HTTPError as e:
-        print(f"Error creando compañía: {e.response.text}")
-
-    time.sleep(0.4)
-
-# --- 2. Crear Contactos (y asociarlos a Compañías) ---
-print("\n--- Iniciando creación de Contactos ---")
-for company_id in company_ids:
-    for _ in range(3):  # 3 contactos por compañía
-        properties = {
-            "firstname": faker.first_name(),
-            "lastname": faker.last_name(),
-            "email": faker.unique.email(),
-            "phone": faker.phone_number(),
-            # ¡Esta es la propiedad clave para que sean "Leads"!
-            "hs_lead_status": faker.random_element(
-                elements=("NEW", "OPEN", "IN_PROGRESS", "UNQUALIFIED")
-            ),
-        }
-
-        # Payload de asociación (Tipo ID 2 = Contacto a Compañía)
-        association = {
-            "to": {"id": company_id},
-            "types": [
-                {"associationCategory": "HUBSPOT_DEFINED", "associationTypeId": 1}
-            ],
-        }
-
-        payload = {"properties": properties, "associations": [association]}
 
-        try:
-            r = requests.post(CONTACTS_URL, headers=HEADERS, json=payload)
-            r.raise_for_status()
-
-            contact_id = r.json()["id"]
-            # Guardamos el contact_id Y a qué compañía pertenece para el paso 3
-            contact_ids.append({"contact_id": contact_id, "company_id": company_id})
-            print(
-                f"  Contacto creado con ID: {contact_id} (Asociado a Compañía {company_id})"
-            )
+def worker_faker() -> Faker:
+    """Faker del hilo actual, con su propia semilla."""
+    faker = getattr(_worker, "faker", None)
+    if faker is None:
+        faker = _worker.faker = Faker()
+        faker.seed_instance(random.SystemRandom().randrange(2**32))
+    return faker
 
-        except requests.exceptions.HTTPError as e:
-            print(f"Error creando contacto: {e.response.text}")
-
-        time.sleep(0.4)
 
-# --- 3. Crear Deals (y asociarlos a Compañías y Contactos) ---
-print("\n--- Iniciando creación de Deals (B2B y B2C) ---")
-for item in contact_ids:
-    contact_id = item["contact_id"]
-    company_id = item["company_id"]
+def batch_create_url(object_type: str) -> str:
+    return f"{HUBSPOT_API_BASE}/crm/v3/objects/{object_type}/batch/create"
 
-    # Decidimos aleatoriamente si será B2B o B2C
-    deal_type = random.choice(["B2B", "B2C"])
 
-    properties = {
-        # Añadimos el tipo al nombre para verlo fácil en la UI de HubSpot
-        "dealname": f"Deal ({deal_type}) - {faker.bs()}",
-        "amount": faker.random_int(min=5000, max=100000),
-        "dealstage": "appointmentscheduled",
-        "pipeline": "default",
+def association(to_id: str, type_id: int) -> dict:
+    return {
+        "to": {"id": to_id},
+        "types": [{"associationCategory": "HUBSPOT_DEFINED", "associationTypeId": type_id}],
     }
 
-    # Asociación 1: Deal a Contacto (Siempre presente)
-    assoc_contact = {
-        "to": {"id": contact_id},
-        "types": [{"associationCategory": "HUBSPOT_DEFINED", "associationTypeId": 3}],
-    }
-
-    # Lista de asociaciones
-    associations = [assoc_contact]
-
-    log_message = f"    Deal (B2C) creado... (Asociado a Contacto {contact_id})"
 
-    # Asociación 2: Deal a Compañía (SOLO si es B2B)
-    if deal_type == "B2B":
-        assoc_company = {
-            "to": {"id": company_id},
-            "types": [
-                {"associationCategory": "HUBSPOT_DEFINED", "associationTypeId": 5}
-            ],
-        }
-        associations.append(assoc_company)
-        log_message = f"    Deal (B2B) creado... (Asociado a Contacto {contact_id} y Compañía {company_id})"
-
-    # El payload ahora usa la lista de asociaciones condicional
-    payload = {"properties": properties, "associations": associations}
-
-    try:
-        r = requests.post(DEALS_URL, headers=HEADERS, json=payload)
-        r.raise_for_status()
+class IncompleteBatch(Exception):
+    """HubSpot creó solo parte del lote (respuesta 207 con errores)."""
+
+
+def batch_create(object_type: str, inputs: List[dict]) -> List[dict]:
+    """
+    Crea hasta BATCH_SIZE registros en una sola request y devuelve los creados.
+    Si no se crearon todos, el lote cuenta como fallido y se reintenta al retomar.
+    """
+    response = hubspot_request(
+        "POST", batch_create_url(object_type), json={"inputs": inputs}
+    )
+    body = response.json()
+    results = body.get("results", [])
+    if len(results) != len(inputs):
+        errors = [error.get("message", "") for error in body.get("errors", [])]
+        raise IncompleteBatch(
+            f"se crearon {len(results)} de {len(inputs)} {object_type}: "
+            + ("; ".join(errors[:3]) or f"status {response.status_code}")
+        )
+    return results
+
+
+class SeedProgress:
+    """
+    Lotes ya creados en cada fase. El archivo es JSON lines: la primera línea
+    tiene los parámetros del seeding y después se agrega una línea por lote,
+    {"phase": "contacts", "batch": 3, "created": [...]}, sin reescribir las
+    anteriores.
+    """
+
+    def __init__(self, path: str, config: dict, fresh: bool = False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.batches: Dict[str, Dict[str, list]] = {}
+        saved_config = None if fresh else self._load()
+
+        if saved_config is not None and saved_config != config:
+            raise SystemExit(
+                f"{path} es de un seeding con otros parámetros. "
+                "Usa los mismos parámetros o --fresh para empezar de cero."
+            )
+        if saved_config is None:
+            self.batches = {}
+            write_atomic(path, (json.dumps({"config": config}) + "\n").encode())
 
-        deal_id = r.json()["id"]
-        # Usamos un log más claro
-        print(log_message.replace("...", f"con ID: {deal_id}"))
+    def _load(self) -> Optional[dict]:
+        try:
+            with open(self.path, "r") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return None
+
+        config = None
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Línea a medio escribir cuando se cortó el proceso: ese lote se vuelve a crear
+                continue
+            if "config" in entry:
+                config = entry["config"]
+            else:
+                self.done(entry["phase"])[str(entry["batch"])] = entry["created"]
+
+        if lines and not lines[-1].endswith("\n"):
+            # Que la próxima línea no quede pegada a la cortada
+            with open(self.path, "a") as f:
+                f.write("\n")
+        return config
+
+    def done(self, phase: str) -> Dict[str, list]:
+        return self.batches.setdefault(phase, {})
+
+    def record(self, phase: str, batch_index: int, created: list):
+        line = json.dumps({"phase": phase, "batch": batch_index, "created": created})
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.done(phase)[str(batch_index)] = created
+
+    def all(self, phase: str) -> list:
+        batches = self.done(phase)
+        return [item for index in sorted(batches, key=int) for item in batches[index]]
+
+
+def run_phase(
+    phase: str,
+    items: list,
+    build_batch,
+    progress: SeedProgress,
+    workers: int,
+):
+    """
+    Parte 'items' en lotes de BATCH_SIZE y los crea en paralelo con
+    'build_batch(lote) -> lista de creados'. Los lotes que ya figuran en el
+    archivo de progreso se saltean. El ritmo real lo pone hubspot_request.
+    """
+    batches = [items[i : i + BATCH_SIZE] for i in range(0, len(items), BATCH_SIZE)]
+    pending = [
+        (index, batch)
+        for index, batch in enumerate(batches)
+        if str(index) not in progress.done(phase)
+    ]
+    print(
+        f"\n--- {phase}: {len(items)} registros en {len(batches)} lotes "
+        f"({len(batches) - len(pending)} ya creados) ---"
+    )
+
+    def create(index_and_batch) -> bool:
+        index, batch = index_and_batch
+        try:
+            created = build_batch(batch)
+        except requests.exceptions.HTTPError as e:
+            print(f"Error creando lote {index} de {phase}: {e.response.text}")
+            return False
+        except (requests.RequestException, DailyQuotaExceeded, IncompleteBatch) as e:
+            print(f"Error creando lote {index} de {phase}: {e}")
+            return False
+        progress.record(phase, index, created)
+        print(f"  Lote {index} de {phase}: {len(created)} creados")
+        return True
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(create, pending))
+
+    # La fase siguiente se arma con lo creado en esta: si faltan lotes, se
+    # corta acá para que al retomar los lotes sigan siendo los mismos
+    failed = results.count(False)
+    if failed:
+        raise SystemExit(
+            f"{failed} lote(s) de {phase} fallaron. "
+            "Vuelve a correr el seed con los mismos parámetros para reintentarlos."
+        )
 
-    except requests.exceptions.HTTPError as e:
-        print(f"Error creando deal: {e.response.text}")
 
-    time.sleep(0.4)
+def seed(args):
+    industries = get_industries()
+    config = {
+        "companies": args.companies,
+        "contacts_per_company": args.contacts_per_company,
+        "b2b_ratio": args.b2b_ratio,
+    }
+    progress = SeedProgress(args.resume_file, config, fresh=args.fresh)
+
+    # --- 1. Crear Compañías ---
+    def create_companies(batch):
+        faker = worker_faker()
+        inputs = [
+            {
+                "properties": {
+                    "name": faker.company(),
+                    "industry": faker.random_element(elements=industries),
+                    "domain": faker.domain_name(),
+                    "city": faker.city(),
+                    "country": faker.country(),
+                }
+            }
+            for _ in batch
+        ]
+        return [result["id"] for result in batch_create("companies", inputs)]
+
+    run_phase("companies", list(range(args.companies)), create_companies, progress, args.workers)
+    company_ids = progress.all("companies")
+
+    # --- 2. Crear Contactos (y asociarlos a Compañías) ---
+    def create_contacts(batch):
+        faker = worker_faker()
+        inputs = []
+        company_by_email = {}
+        for company_id in batch:
+            # uuid en el email: único aunque se corra en varios procesos o se retome
+            email = f"{faker.user_name()}.{faker.uuid4()[:8]}@{faker.free_email_domain()}"
+            company_by_email[email.lower()] = company_id
+            inputs.append(
+                {
+                    "properties": {
+                        "firstname": faker.first_name(),
+                        "lastname": faker.last_name(),
+                        "email": email,
+                        "phone": faker.phone_number(),
+                        # ¡Esta es la propiedad clave para que sean "Leads"!
+                        "hs_lead_status": faker.random_element(
+                            elements=("NEW", "OPEN", "IN_PROGRESS", "UNQUALIFIED")
+                        ),
+                    },
+                    # Tipo ID 1 = Contacto a Compañía
+                    "associations": [association(company_id, 1)],
+                }
+            )
 
-print("\n--- Proceso de 'seeding' completado ---")
-print(f"Total Compañías creadas: {len(company_ids)}")
-print(f"Total Contactos (Leads) creados: {len(contact_ids)}")
-print(f"Total Deals creados: {len(contact_ids)}")
+        # El orden de los resultados no está garantizado: se emparejan por email
+        return [
+            {
+                "contact_id": result["id"],
+                "company_id": company_by_email[result["properties"]["email"].lower()],
+            }
+            for result in batch_create("contacts", inputs)
+        ]
+
+    contacts_plan = [
+        company_id for company_id in company_ids for _ in range(args.contacts_per_company)
+    ]
+    run_phase("contacts", contacts_plan, create_contacts, progress, args.workers)
+    contacts = progress.all("contacts")
+
+    # --- 3. Crear Deals (y asociarlos a Compañías y Contactos) ---
+    def create_deals(batch):
+        faker = worker_faker()
+        inputs = []
+        for item in batch:
+            # Decidimos aleatoriamente si será B2B o B2C
+            deal_type = "B2B" if faker.random.random() < args.b2b_ratio else "B2C"
+
+            # Asociación 1: Deal a Contacto (Siempre presente)
+            associations = [association(item["contact_id"], 3)]
+            # Asociación 2: Deal a Compañía (SOLO si es B2B)
+            if deal_type == "B2B":
+                associations.append(association(item["company_id"], 5))
+
+            inputs.append(
+                {
+                    "properties": {
+                        # Añadimos el tipo al nombre para verlo fácil en la UI de HubSpot
+                        "dealname": f"Deal ({deal_type}) - {faker.bs()}",
+                        "amount": faker.random_int(min=5000, max=100000),
+                        "dealstage": "appointmentscheduled",
+                        "pipeline": "default",
+                    },
+                    "associations": associations,
+                }
+            )
+        return [result["id"] for result in batch_create("deals", inputs)]
+
+    run_phase("deals", contacts, create_deals, progress, args.workers)
+
+    print("\n--- Proceso de 'seeding' completado ---")
+    print(f"Total Compañías creadas: {len(company_ids)}")
+    print(f"Total Contactos (Leads) creados: {len(contacts)}")
+    print(f"Total Deals creados: {len(progress.all('deals'))}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Crea datos de prueba en HubSpot usando los endpoints /batch/create."
+    )
+    parser.add_argument("--companies", type=int, default=5, help="Compañías a crear.")
+    parser.add_argument(
+        "--contacts-per-company",
+        type=int,
+        default=3,
+        help="Contactos por compañía. Cada contacto tiene un deal.",
+    )
+    parser.add_argument(
+        "--b2b-ratio",
+        type=float,
+        default=0.5,
+        help="Proporción de deals asociados también a la compañía (B2B).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Lotes que se crean en paralelo (el rate limiter decide el ritmo real).",
+    )
+    parser.add_argument(
+        "--resume-file",
+        default=SEED_STATE_FILE,
+        help="Archivo de progreso para retomar un seeding interrumpido.",
+    )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="Ignora el archivo de progreso y empieza de cero.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    if not HUBSPOT_KEY:
+        raise EnvironmentError("No se encontró HUBSPOT_ACCESS_TOKEN en el archivo .env")
+
+    seed(parse_args())
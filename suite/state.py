@@ -0,0 +1,39 @@
+import json
+import os
+from typing import Dict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Archivo local donde se guarda la "marca de agua" (último updatedAt cargado)
+# de cada tipo de objeto, ej. {"deals": "2025-01-01T10:00:00.000Z"}
+STATE_FILE = os.getenv("ETL_STATE_FILE", os.path.join(script_dir, ".etl_state.json"))
+
+
+def load_state(path: str = STATE_FILE) -> Dict[str, str]:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_atomic(path: str, data: bytes):
+    """
+    Escribe un archivo de forma atómica (archivo temporal + rename): si el
+    proceso muere a mitad, queda el archivo anterior completo, nunca uno cortado.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def save_state(state: Dict[str, str], path: str = STATE_FILE):
+    """Escribe el estado de forma atómica."""
+    write_atomic(path, json.dumps(state, indent=2, sort_keys=True).encode())
@@ -0,0 +1,129 @@
+import os
+from typing import Dict, Iterable, Optional, Set
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from metrics import metrics
+
+load_dotenv()
+
+# Si un lote toca más días que esto, se reconstruye el resumen entero
+# (un DELETE ... IN con miles de fechas es más lento que recalcular todo)
+SUMMARY_MAX_DAYS = int(os.getenv("ETL_SUMMARY_MAX_DAYS", 366))
+
+# Tablas de resumen que lee la API. Son chicas (una fila por día y grupo),
+# así que consultarlas no depende del tamaño de DEALS y LEADS.
+# Tabla de hechos -> (tabla de resumen, DDL, SELECT que agrega por día).
+# Un deal es B2B si tiene al menos una compañía en la tabla puente DEAL_COMPANY.
+summary_tables = {
+    "DEALS": (
+        "DEALS_DAILY_SUMMARY",
+        """
+        CREATE TABLE IF NOT EXISTS DEALS_DAILY_SUMMARY (
+            "day" DATE,
+            "stage" VARCHAR,
+            "segment" VARCHAR,
+            "deal_count" NUMBER,
+            "total_amount" FLOAT
+        )
+        """,
+        """
+        SELECT
+            TO_DATE("created_at") AS "day",
+            "stage",
+            CASE WHEN b2b."deal_id" IS NOT NULL THEN 'B2B' ELSE 'B2C' END AS "segment",
+            COUNT(*) AS "deal_count",
+            COALESCE(SUM("amount"), 0) AS "total_amount"
+        FROM DEALS
+        LEFT JOIN (SELECT DISTINCT "deal_id" FROM DEAL_COMPANY) AS b2b
+            ON b2b."deal_id" = DEALS."deal_id"
+        WHERE NOT COALESCE("archived", FALSE) {day_filter}
+        GROUP BY 1, 2, 3
+        """,
+    ),
+    "LEADS": (
+        "LEADS_DAILY_SUMMARY",
+        """
+        CREATE TABLE IF NOT EXISTS LEADS_DAILY_SUMMARY (
+            "day" DATE,
+            "status" VARCHAR,
+            "lead_count" NUMBER
+        )
+        """,
+        """
+        SELECT
+            TO_DATE("created_at") AS "day",
+            "status",
+            COUNT(*) AS "lead_count"
+        FROM LEADS
+        WHERE NOT COALESCE("archived", FALSE) {day_filter}
+        GROUP BY 1, 2
+        """,
+    ),
+}
+
+
+def touched_days(created_at: Iterable) -> Set[str]:
+    """Días (YYYY-MM-DD, UTC) de creación de los registros de un lote."""
+    days = pd.to_datetime(pd.Series(created_at), utc=True, errors="coerce").dropna()
+    return set(days.dt.strftime("%Y-%m-%d"))
+
+
+def build_refresh_sql(table_name: str, days: Optional[Set[str]]):
+    """
+    Devuelve las sentencias que recalculan el resumen de 'table_name'.
+    Con 'days' solo se recalculan esos días; con None, todo el resumen.
+    """
+    summary_table, _, select_sql = summary_tables[table_name]
+
+    if days is None:
+        return [
+            f"DELETE FROM {summary_table}",
+            f"INSERT INTO {summary_table} {select_sql.format(day_filter='').strip()}",
+        ]
+
+    # Los días salen de strftime, así que son seguros como literales
+    day_list = ", ".join(f"'{day}'::DATE" for day in sorted(days))
+    return [
+        f'DELETE FROM {summary_table} WHERE "day" IN ({day_list})',
+        f"INSERT INTO {summary_table} "
+        + select_sql.format(
+            day_filter=f'AND TO_DATE("created_at") IN ({day_list})'
+        ).strip(),
+    ]
+
+
+def refresh_summaries(conn, touched: Dict[str, Optional[Set[str]]]):
+    """
+    Actualiza las tablas de resumen después de una carga. 'touched' tiene,
+    por tabla de hechos, los días afectados por el lote (None = todos).
+    Cada resumen se reemplaza en una transacción: la API nunca ve un día a medias.
+    """
+    cursor = conn.cursor()
+    try:
+        for table_name, days in touched.items():
+            if table_name not in summary_tables:
+                continue
+            if days is not None and not days:
+                continue
+            if days is not None and len(days) > SUMMARY_MAX_DAYS:
+                days = None
+
+            summary_table, create_sql, _ = summary_tables[table_name]
+            cursor.execute(create_sql.strip())
+
+            cursor.execute("BEGIN")
+            try:
+                for sql in build_refresh_sql(table_name, days):
+                    cursor.execute(sql)
+                    metrics.record_query(summary_table, cursor, sql.split(None, 1)[0])
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+            scope = "completo" if days is None else f"{len(days)} día(s)"
+            print(f"Resumen {summary_table} actualizado ({scope}).")
+    finally:
+        cursor.close()
@@ -0,0 +1,120 @@
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+import extract
+import load
+from transform import transform_data
+
+
+def response(body: dict):
+    mock = MagicMock()
+    mock.content = json.dumps(body).encode()
+    return mock
+
+
+def deal(deal_id: str, companies=(), contacts=(), archived=False) -> dict:
+    groups = {}
+    if companies:
+        groups["companies"] = {"results": [{"id": c, "type": "deal_to_company"} for c in companies]}
+    if contacts:
+        groups["contacts"] = {"results": [{"id": c, "type": "deal_to_contact"} for c in contacts]}
+    return {
+        "id": deal_id,
+        "properties": {"dealname": f"Deal {deal_id}", "createdate": "2025-01-01T10:00:00Z"},
+        "associations": groups or None,
+        "archived": archived,
+    }
+
+
+class TestDealAssociations(unittest.TestCase):
+
+    def test_bridge_tables_keep_every_association(self):
+        """Prueba que se guardan todas las compañías y contactos, no solo la primera."""
+        deals = [
+            deal("1", companies=["10", "11"], contacts=["20", "21", "22"]),
+            deal("2", contacts=["23"]),
+            deal("3", companies=["12"], archived=True),
+        ]
+
+        df_deals, _, associations = transform_data(deals, [])
+
+        companies = associations["DEAL_COMPANY"]
+        contacts = associations["DEAL_CONTACT"]
+        self.assertEqual(
+            companies.values.tolist(), [["1", "10"], ["1", "11"], ["2", None]]
+        )
+        self.assertEqual(
+            contacts.values.tolist(), [["1", "20"], ["1", "21"], ["1", "22"], ["2", "23"]]
+        )
+        # La columna de DEALS se mantiene con la primera compañía
+        self.assertEqual(df_deals["associated_company_id"].tolist(), ["10", None, "12"])
+
+    @patch("extract.hubspot_request")
+    def test_read_associations_follows_paging(self, mock_request):
+        """Prueba que un deal con muchas asociaciones se sigue leyendo por páginas."""
+        mock_request.side_effect = [
+            response(
+                {
+                    "results": [
+                        {
+                            "from": {"id": "1"},
+                            "to": [{"toObjectId": 10}, {"toObjectId": 11}],
+                            "paging": {"next": {"after": "2"}},
+                        },
+                        {"from": {"id": "2"}, "to": [{"toObjectId": 10}, {"toObjectId": 10}]},
+                    ]
+                }
+            ),
+            response({"results": [{"toObjectId": 12}], "paging": {"next": {"after": "3"}}}),
+            response({"results": [{"toObjectId": 13}]}),
+        ]
+
+        associated = extract.read_associations("deals", "companies", ["1", "2"])
+
+        self.assertEqual(associated, {"1": ["10", "11", "12", "13"], "2": ["10"]})
+        self.assertEqual(
+            mock_request.call_args_list[1].args[1],
+            f"{extract.HUBSPOT_API_BASE}/crm/v4/objects/deals/1/associations/companies",
+        )
+
+    @patch("extract.ASSOCIATION_BATCH_SIZE", 2)
+    @patch("extract.hubspot_request")
+    def test_attach_reads_in_batches(self, mock_request):
+        """Prueba que las asociaciones se piden en lote y los archivados se saltean."""
+        mock_request.return_value = response({"results": []})
+        deals = [{"id": str(i)} for i in range(3)] + [{"id": "9", "archived": True}]
+
+        extract.attach_deal_associations(deals)
+
+        # 2 lotes (2 + 1 ids) por cada tipo de asociación
+        self.assertEqual(mock_request.call_count, 4)
+        for call in mock_request.call_args_list:
+            ids = [item["id"] for item in call.kwargs["json"]["inputs"]]
+            self.assertNotIn("9", ids)
+        self.assertIsNone(deals[0]["associations"])
+        self.assertNotIn("associations", deals[3])
+
+    def test_bridge_upsert_replaces_batch_rows(self):
+        """Prueba que la carga borra las asociaciones de los deals del lote e inserta las nuevas."""
+        cursor = MagicMock()
+
+        load.replace_bridge_rows(cursor, "DEAL_COMPANY", "DEAL_COMPANY_STAGE")
+
+        statements = [call.args[0] for call in cursor.execute.call_args_list]
+        self.assertEqual(
+            statements,
+            [
+                'CREATE TABLE IF NOT EXISTS DEAL_COMPANY ("deal_id" VARCHAR, "company_id" VARCHAR)',
+                "BEGIN",
+                'DELETE FROM DEAL_COMPANY WHERE "deal_id" IN (SELECT "deal_id" FROM DEAL_COMPANY_STAGE)',
+                'INSERT INTO DEAL_COMPANY ("deal_id", "company_id") '
+                'SELECT DISTINCT "deal_id", "company_id" FROM DEAL_COMPANY_STAGE '
+                'WHERE "company_id" IS NOT NULL',
+                "COMMIT",
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
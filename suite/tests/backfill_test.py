@@ -0,0 +1,81 @@
+import unittest
+from datetime import timedelta
+from unittest.mock import patch
+
+import backfill
+import extract
+import hubspot_client
+from emulator import EPOCH, FakePortal, HubSpotEmulator, to_ms
+
+
+class TestBackfill(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HubSpotEmulator(
+            FakePortal(deals=300, contacts=200, companies=10, b2b_ratio=0.5)
+        ).start()
+        self.addCleanup(self.server.stop)
+
+        # Los procesos hijos (fork) heredan estos cambios. Limitadores propios
+        # y generosos: el test no mide el rate limiting.
+        for target, value in {
+            "extract.HUBSPOT_API_BASE": self.server.base_url,
+            "hubspot_client.rate_limiter": hubspot_client.TokenBucket(1000, 100),
+            "extract.search_rate_limiter": hubspot_client.TokenBucket(1000, 100),
+            "builtins.print": lambda *args, **kwargs: None,
+        }.items():
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.dict(
+            extract.object_urls,
+            {t: f"{self.server.base_url}/crm/v3/objects/{t}" for t in extract.object_urls},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Los registros emulados se crean cada 30 s desde EPOCH: entran en un día
+        self.start_ms = to_ms(EPOCH)
+        self.end_ms = to_ms(EPOCH + timedelta(days=1))
+
+    def test_partitions_stay_under_size(self):
+        """Prueba que los rangos de createdate cubren todo sin pasar el tamaño pedido."""
+        partitions = backfill.plan_partitions(
+            ["deals"], self.start_ms, self.end_ms, partition_size=100
+        )
+
+        self.assertGreater(len(partitions), 2)
+        counts = [
+            extract.search_modified("deals", start, end, 1, prop="createdate")["total"]
+            for _, start, end in partitions
+        ]
+        self.assertTrue(all(count <= 100 for count in counts))
+        self.assertEqual(sum(counts), 300)
+
+    def test_partition_returns_tables_and_counters(self):
+        """Prueba que cada rango se extrae y transforma, y devuelve sus contadores HTTP."""
+        (_, start, end), *_ = backfill.plan_partitions(
+            ["deals"], self.start_ms, self.end_ms, partition_size=100
+        )
+
+        tables, counters = backfill.extract_transform_partition("deals", start, end)
+
+        self.assertEqual(set(tables), {"DEALS", "DEAL_COMPANY", "DEAL_CONTACT"})
+        self.assertLessEqual(len(tables["DEALS"]), 100)
+        self.assertGreater(counters["http_requests"], 0)
+
+    def test_backfill_across_processes(self):
+        """Prueba que el backfill en varios procesos trae todos los deals y leads una vez."""
+        df_deals, df_leads, associations = backfill.run_backfill(
+            workers=2, start=EPOCH.isoformat(), partition_size=100
+        )
+
+        self.assertEqual(df_deals["deal_id"].nunique(), 300)
+        self.assertEqual(len(df_deals), 300)
+        self.assertEqual(len(df_leads), 200)
+        # Cada deal de la emulación tiene un contacto
+        self.assertEqual(associations["DEAL_CONTACT"]["deal_id"].nunique(), 300)
+
+
+if __name__ == "__main__":
+    unittest.main()
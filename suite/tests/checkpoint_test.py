@@ -0,0 +1,116 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import extract
+import hubspot_client
+from checkpoint import Checkpoint, open_checkpoint
+from emulator import FakePortal, HubSpotEmulator
+
+
+class TestExtractCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HubSpotEmulator(FakePortal(deals=0, contacts=250, companies=10)).start()
+        self.addCleanup(self.server.stop)
+        patcher = patch.dict(
+            extract.object_urls,
+            {t: f"{self.server.base_url}/crm/v3/objects/{t}" for t in extract.object_urls},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.directory = os.path.join(self.tmp.name, "checkpoint")
+
+    def extract_contacts(self, fail_on_request=None):
+        """Extrae los contactos contando las requests; falla en la número 'fail_on_request'."""
+        calls = []
+
+        def request(*args, **kwargs):
+            calls.append(kwargs.get("params", {}).get("after"))
+            if len(calls) == fail_on_request:
+                raise RuntimeError("corte de red")
+            return hubspot_client.hubspot_request(*args, **kwargs)
+
+        checkpoint = open_checkpoint(directory=self.directory)
+        with patch("extract.hubspot_request", side_effect=request), patch("builtins.print"):
+            records = extract.extract_object("contacts", checkpoint)
+        return records, calls
+
+    def test_resume_after_failure(self):
+        """Prueba que tras un corte la extracción sigue desde el cursor guardado."""
+        with self.assertRaises(RuntimeError):
+            self.extract_contacts(fail_on_request=3)
+
+        saved = Checkpoint(self.directory).object("contacts")
+        self.assertEqual((saved.pages, saved.after, saved.done), (2, "200", False))
+
+        records, calls = self.extract_contacts()
+
+        # Solo se pide la página que faltaba
+        self.assertEqual(calls, ["200"])
+        self.assertEqual(len({record["id"] for record in records}), 250)
+
+    def test_finished_checkpoint_skips_hubspot(self):
+        """Prueba que si la extracción ya terminó no se vuelve a llamar a HubSpot."""
+        self.extract_contacts()
+
+        records, calls = self.extract_contacts()
+
+        self.assertEqual(calls, [])
+        self.assertEqual(len(records), 250)
+
+    def test_unrecorded_page_is_fetched_again(self):
+        """Prueba que una página escrita sin su cursor (corte entre ambos) no se usa."""
+        with self.assertRaises(RuntimeError):
+            self.extract_contacts(fail_on_request=2)
+        saved = Checkpoint(self.directory).object("contacts")
+        with open(saved.page_file(2), "w") as f:
+            json.dump([{"id": "basura"}], f)
+
+        records, calls = self.extract_contacts()
+
+        self.assertEqual(calls, ["100", "200"])
+        self.assertNotIn("basura", {record["id"] for record in records})
+        self.assertEqual(len(records), 250)
+
+
+class TestOpenCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.directory = os.path.join(self.tmp.name, "checkpoint")
+
+        with patch("builtins.print"):
+            checkpoint = open_checkpoint(directory=self.directory)
+        checkpoint.object("deals").save_page([{"id": "1"}], "1")
+
+    def open(self, **kwargs):
+        with patch("builtins.print"):
+            return open_checkpoint(directory=self.directory, **kwargs)
+
+    def test_keeps_recent_checkpoint(self):
+        """Prueba que un checkpoint reciente se retoma."""
+        self.assertEqual(self.open().object("deals").pages, 1)
+
+    def test_fresh_discards_checkpoint(self):
+        """Prueba que --fresh descarta el checkpoint anterior."""
+        self.assertEqual(self.open(fresh=True).object("deals").pages, 0)
+
+    def test_old_checkpoint_is_discarded(self):
+        """Prueba que un checkpoint más viejo que el máximo se descarta."""
+        with patch("checkpoint.time.time", return_value=time.time() + 3 * 3600):
+            checkpoint = self.open(max_age_hours=2)
+
+        self.assertEqual(checkpoint.object("deals").pages, 0)
+        self.assertIsNotNone(checkpoint.created_at())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import requests
+
+import extract
+import hubspot_client
+from emulator import FakePortal, HubSpotEmulator
+from transform import transform_deal_tables, transform_deals
+
+
+class TestExtractAgainstEmulator(unittest.TestCase):
+
+    def setUp(self):
+        self.portal = FakePortal(deals=250, contacts=120, companies=10, b2b_ratio=0.5)
+        self.server = HubSpotEmulator(self.portal).start()
+        self.addCleanup(self.server.stop)
+        self.base = self.server.base_url
+
+        # Las URLs del ETL se arman con HUBSPOT_API_BASE al importar
+        for name, value in {
+            "HUBSPOT_API_BASE": self.base,
+            "deals_url": f"{self.base}/crm/v3/objects/deals",
+            "leads_url": f"{self.base}/crm/v3/objects/contacts",
+        }.items():
+            patcher = patch(f"extract.{name}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.dict(
+            extract.object_urls,
+            {t: f"{self.base}/crm/v3/objects/{t}" for t in extract.object_urls},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_list_pages_follow_cursor(self):
+        """Prueba que el listado se recorre completo siguiendo 'paging.next.after'."""
+        pages = list(extract.extract_deal_pages())
+
+        self.assertEqual([len(page) for page in pages], [100, 100, 50])
+        ids = [deal["id"] for page in pages for deal in page]
+        self.assertEqual(len(set(ids)), 250)
+
+    def test_responses_are_gzipped(self):
+        """Prueba que se pide gzip y la página se parsea igual que con response.json()."""
+        response = hubspot_client.hubspot_request(
+            "GET", extract.deals_url, params=extract.params
+        )
+
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertLess(hubspot_client.wire_bytes(response), len(response.content))
+        self.assertEqual(hubspot_client.parse_json(response), response.json())
+
+    def test_list_includes_associations(self):
+        """Prueba que los deals B2B llegan con su compañía asociada."""
+        deals = [deal for page in extract.extract_deal_pages() for deal in page]
+        df = transform_deals(deals)
+
+        b2b = df["associated_company_id"].notna().sum()
+        expected = sum(
+            1 for i in range(250) if self.portal.deal_company(i) is not None
+        )
+        self.assertEqual(b2b, expected)
+        self.assertGreater(b2b, 0)
+
+    def test_search_with_windows_and_associations(self):
+        """Prueba la extracción incremental por búsqueda + asociaciones v4."""
+        since = "2024-01-01T00:50:00.000Z"  # el deal 100 (índice 100) en adelante
+        until_ms = extract.to_epoch_ms("2024-01-01T01:40:00.000Z")  # hasta el 200
+
+        with patch("extract.SEARCH_RESULT_CAP", 40):
+            records, mark = extract.extract_object_since("deals", since, until_ms)
+
+        self.assertEqual([int(r["id"]) for r in records], list(range(101, 201)))
+        self.assertEqual(mark, "2024-01-01T01:39:30.000Z")
+        with_company = [r for r in records if "companies" in (r["associations"] or {})]
+        self.assertEqual(
+            len(with_company),
+            sum(1 for i in range(100, 200) if self.portal.deal_company(i) is not None),
+        )
+        self.assertTrue(all("contacts" in r["associations"] for r in records))
+
+    def test_bridge_tables_have_every_association(self):
+        """Prueba que DEAL_COMPANY y DEAL_CONTACT tienen las asociaciones de todos los deals."""
+        deals = [deal for page in extract.extract_deal_pages() for deal in page]
+        tables = transform_deal_tables(deals)
+
+        companies = tables["DEAL_COMPANY"].dropna()
+        expected = {
+            (str(i + 1), str(self.portal.deal_company(i) + 1))
+            for i in range(250)
+            if self.portal.deal_company(i) is not None
+        }
+        self.assertEqual(set(map(tuple, companies.values.tolist())), expected)
+        self.assertEqual(tables["DEAL_CONTACT"]["contact_id"].notna().sum(), 250)
+        # Los B2C quedan marcados para que la carga borre asociaciones viejas
+        self.assertEqual(
+            tables["DEAL_COMPANY"]["company_id"].isna().sum(), 250 - len(expected)
+        )
+
+    def test_batch_create(self):
+        """Prueba que lo creado por /batch/create aparece luego en el listado."""
+        response = requests.post(
+            f"{self.base}/crm/v3/objects/deals/batch/create",
+            json={"inputs": [{"properties": {"dealname": "Nuevo"}}] * 3},
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()["results"]), 3)
+        self.assertEqual(sum(len(page) for page in extract.extract_deal_pages()), 253)
+
+    def test_search_includes_created_records(self):
+        """Prueba que la búsqueda también encuentra lo creado por /batch/create."""
+        requests.post(
+            f"{self.base}/crm/v3/objects/deals/batch/create",
+            json={"inputs": [{"properties": {"dealname": "Nuevo"}}] * 3},
+        )
+
+        # Desde el deal 240 (índice 240) hasta ahora: 10 generados y los 3 nuevos
+        since = "2024-01-01T02:00:00.000Z"
+        records, _ = extract.extract_object_since("deals", since, extract.now_ms() + 1000)
+
+        ids = [int(record["id"]) for record in records]
+        self.assertEqual(ids, list(range(241, 254)))
+        self.assertEqual(records[-1]["properties"]["dealname"], "Nuevo")
+
+    def test_concurrent_requests_are_all_counted(self):
+        """Prueba que el contador de requests no pierde incrementos con requests en paralelo."""
+        url = f"{self.base}/crm/v3/objects/deals"
+
+        def get_page(_):
+            return requests.get(url, params={"limit": 1}).status_code
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            statuses = list(executor.map(get_page, range(80)))
+
+        self.assertEqual(statuses, [200] * 80)
+        self.assertEqual(self.server.request_count, 80)
+
+
+class TestEmulatorRateLimit(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HubSpotEmulator(
+            FakePortal(deals=10, contacts=0, companies=1),
+            rate_limit=2,
+            rate_interval_ms=200,
+        ).start()
+        self.addCleanup(self.server.stop)
+        self.url = f"{self.server.base_url}/crm/v3/objects/deals"
+
+        # Un bucket propio y generoso: el que frena es el emulador
+        patcher = patch("hubspot_client.rate_limiter", hubspot_client.TokenBucket(1000, 100))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_pages(self, count: int):
+        for _ in range(count):
+            response = hubspot_client.hubspot_request("GET", self.url, params={"limit": 1})
+            self.assertEqual(response.status_code, 200)
+
+    @patch("hubspot_client.observe_rate_limit_headers")
+    def test_429_is_retried(self, _):
+        """Prueba que hubspot_request espera y reintenta cuando el emulador responde 429."""
+        self.get_pages(5)
+
+        self.assertGreater(self.server.throttled_count, 0)
+
+    def test_rate_limit_headers_avoid_429(self):
+        """Prueba que leyendo X-HubSpot-RateLimit-* el cliente frena antes del 429."""
+        self.get_pages(5)
+
+        self.assertEqual(self.server.throttled_count, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
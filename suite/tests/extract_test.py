@@ -0,0 +1,164 @@
+import unittest
+from unittest.mock import patch
+
+import extract
+from transform import transform_data
+
+
+class FakeSearch:
+    """
+    Reemplaza a search_modified: busca en una lista de fechas (ms) con el
+    mismo filtro [start_ms, end_ms) y el mismo paginado que la API.
+    """
+
+    def __init__(self, timestamps, cap=extract.SEARCH_RESULT_CAP):
+        self.timestamps = sorted(timestamps)
+        self.cap = cap
+        self.calls = 0
+
+    def __call__(self, object_type, start_ms, end_ms, limit, after=None, prop=None):
+        self.calls += 1
+        matches = [
+            {"id": str(i), "created": ts}
+            for i, ts in enumerate(self.timestamps)
+            if start_ms <= ts < end_ms
+        ]
+        offset = int(after or 0)
+        # La búsqueda nunca entrega más allá del límite de resultados
+        end = min(offset + limit, len(matches), self.cap)
+        page = {"total": len(matches), "results": matches[offset:end]}
+        if end < min(len(matches), self.cap):
+            page["paging"] = {"next": {"after": str(end)}}
+        return page
+
+
+class TestSearchWindows(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch("builtins.print")
+        self.print = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def windows(self, search, start_ms, end_ms, max_results):
+        with patch("extract.search_modified", search):
+            windows = extract.split_search_windows(
+                "contacts", start_ms, end_ms, max_results=max_results
+            )
+            return list(windows)
+
+    def read_all(self, search, windows):
+        with patch("extract.search_modified", search):
+            return [
+                record["id"]
+                for start_ms, end_ms in windows
+                for page in extract.extract_window_pages("contacts", start_ms, end_ms)
+                for record in page
+            ]
+
+    def test_windows_stay_under_cap_and_cover_everything(self):
+        """Prueba que las ventanas no pasan el límite y cada registro se lee una vez."""
+        search = FakeSearch(range(0, 1000, 3))
+
+        windows = self.windows(search, 0, 1000, max_results=50)
+
+        self.assertGreater(len(windows), 1)
+        self.assertTrue(all(search(None, s, e, 1)["total"] <= 50 for s, e in windows))
+        ids = self.read_all(search, windows)
+        self.assertEqual(sorted(ids, key=int), [str(i) for i in range(334)])
+
+    def test_boundary_records_land_in_one_window(self):
+        """Prueba que un registro justo en el punto de corte no se lee dos veces."""
+        # 0 y 10 parten en 5: los registros en 5 van solo a [5, 10)
+        search = FakeSearch([1, 2, 5, 5, 5, 9])
+
+        windows = self.windows(search, 0, 10, max_results=4)
+
+        self.assertEqual(windows, [(0, 5), (5, 10)])
+        self.assertEqual(sorted(self.read_all(search, windows)), ["0", "1", "2", "3", "4", "5"])
+
+    def test_one_millisecond_window_over_cap(self):
+        """Prueba que una ventana de 1 ms por encima del límite no se sigue partiendo."""
+        search = FakeSearch([7] * 12, cap=10)
+
+        with patch("extract.SEARCH_RESULT_CAP", 10):
+            windows = self.windows(search, 0, 16, max_results=10)
+            ids = self.read_all(search, windows)
+
+        self.assertEqual(windows, [(7, 8)])
+        # La API corta en el límite: se avisa y se leen solo esos
+        self.assertEqual(len(ids), 10)
+        self.assertIn("solo se leerán 10", self.print.call_args.args[0])
+
+    def test_empty_window(self):
+        """Prueba que con inicio igual al fin no hay ventanas ni búsquedas."""
+        search = FakeSearch([5])
+
+        self.assertEqual(self.windows(search, 5, 5, max_results=10), [])
+        self.assertEqual(search.calls, 0)
+
+    def test_empty_halves_are_dropped(self):
+        """Prueba que las mitades sin resultados no generan ventanas."""
+        search = FakeSearch([900, 901, 902])
+
+        windows = self.windows(search, 0, 1024, max_results=2)
+
+        self.assertTrue(all(start >= 512 for start, _ in windows))
+        self.assertEqual(sorted(self.read_all(search, windows)), ["0", "1", "2"])
+
+class FakePortalListing:
+    """Reemplaza a extract_pages: deals vivos y archivados de un portal que cambia."""
+
+    def __init__(self, live, archived=()):
+        self.live = list(live)
+        self.archived = list(archived)
+
+    def __call__(self, url, base_params=extract.params):
+        archived = base_params.get("archived") == "true"
+        ids = self.archived if archived else self.live
+        if url == extract.object_urls["deals"] and ids:
+            yield [
+                {
+                    "id": deal_id,
+                    "properties": {
+                        "dealname": f"Deal {deal_id}",
+                        "createdate": "2025-01-01T10:00:00Z",
+                    },
+                    "archived": archived,
+                }
+                for deal_id in ids
+            ]
+
+
+class TestFullExtractionArchived(unittest.TestCase):
+
+    def setUp(self):
+        for target in ("extract.attach_deal_associations", "builtins.print"):
+            patcher = patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def full_run(self, portal):
+        with patch("extract.extract_pages", portal):
+            deals, leads = extract.extract_data()
+        df_deals, _, _ = transform_data(deals, leads)
+        return dict(zip(df_deals["deal_id"], df_deals["archived"]))
+
+    def test_deal_deleted_between_full_runs(self):
+        """Prueba que un deal borrado entre dos cargas completas llega archivado."""
+        self.assertEqual(self.full_run(FakePortalListing(["1", "2"])), {"1": False, "2": False})
+
+        second = self.full_run(FakePortalListing(["1"], archived=["2"]))
+
+        # El MERGE lo marca como archivado en lugar de dejarlo vivo
+        self.assertEqual(second, {"1": False, "2": True})
+
+    def test_stream_full_run_lists_archived(self):
+        """Prueba que el pipeline sin marca de agua también lista los archivados."""
+        with patch("extract.extract_pages", FakePortalListing(["1"], archived=["2"])):
+            pages = list(extract.extract_pages_since("deals", None, until_ms=0))
+
+        self.assertEqual([[deal["id"] for deal in page] for page in pages], [["1"], ["2"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
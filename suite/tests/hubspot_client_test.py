@@ -0,0 +1,68 @@
+import json
+import time
+import unittest
+from unittest.mock import patch
+
+import requests
+
+import hubspot_client
+
+
+class TestRateLimiters(unittest.TestCase):
+
+    def test_bucket_is_capped_by_server_remaining(self):
+        """Prueba que el bucket no deja gastar más de lo que HubSpot dice que queda."""
+        bucket = hubspot_client.TokenBucket(rate=1000, capacity=10)
+
+        bucket.limit_to(2)
+
+        self.assertLessEqual(bucket.tokens, 2)
+
+    def test_bucket_pauses_when_window_is_exhausted(self):
+        """Prueba que sin cupo en la ventana se espera a la próxima."""
+        bucket = hubspot_client.TokenBucket(rate=100, capacity=10)
+
+        bucket.limit_to(0, pause=0.1)
+        start = time.monotonic()
+        bucket.acquire()
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_daily_quota_syncs_with_server(self):
+        """Prueba que la cuota diaria toma en cuenta lo que informa HubSpot."""
+        quota = hubspot_client.DailyQuota(limit=100)
+
+        quota.sync(remaining=1)
+        quota.consume()
+
+        with self.assertRaises(RuntimeError):
+            quota.consume()
+
+
+class TestParseJson(unittest.TestCase):
+
+    def make_response(self, body: bytes) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response._content = body
+        return response
+
+    def test_parse_json_matches_response_json(self):
+        """Prueba que parsear desde bytes da lo mismo que response.json()."""
+        body = {"results": [{"id": "1", "properties": {"dealname": "Ñandú €"}}]}
+        response = self.make_response(json.dumps(body, ensure_ascii=False).encode())
+
+        self.assertEqual(hubspot_client.parse_json(response), response.json())
+
+    def test_stdlib_fallback(self):
+        """Prueba que sin orjson se usa json de la librería estándar."""
+        response = self.make_response(b'{"results": [], "paging": {"next": {"after": "5"}}}')
+
+        with patch("hubspot_client.json_loads", json.loads):
+            page = hubspot_client.parse_json(response)
+
+        self.assertEqual(page["paging"]["next"]["after"], "5")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+import landing
+
+
+def make_deals(rows: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "deal_id": [str(i) for i in range(rows)],
+            "deal_name": [f"Deal {i}" for i in range(rows)],
+            "amount": [float(i) for i in range(rows)],
+            "stage": ["appointmentscheduled"] * rows,
+            "created_at": pd.to_datetime(["2025-01-01T10:00:00.000Z"] * rows),
+            "associated_company_id": [None if i % 2 else str(i) for i in range(rows)],
+            "archived": [False] * rows,
+        }
+    )
+
+
+class TestLanding(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.landing_dir = os.path.join(self.tmp.name, "landing")
+        self.run_dir = os.path.join(self.landing_dir, "run-1")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_landing_files_splits_in_parts(self):
+        """Prueba que el DataFrame se parte en varios Parquet numerados."""
+        df = make_deals(25)
+
+        first = landing.write_landing_files(df, "DEALS", self.run_dir, rows_per_file=10)
+        second = landing.write_landing_files(df, "DEALS", self.run_dir, rows_per_file=10)
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(
+            [os.path.basename(path) for path in second],
+            ["part-00003.parquet", "part-00004.parquet", "part-00005.parquet"],
+        )
+        self.assertEqual(len(landing.list_landing_files(self.run_dir, "DEALS")), 6)
+
+    def test_load_landing_table_upsert(self):
+        """Prueba que el modo upsert hace PUT, COPY INTO a una temporal y MERGE."""
+        landing.write_landing_files(make_deals(5), "DEALS", self.run_dir)
+        cursor = MagicMock()
+
+        stage = landing.SnowflakeStage(cursor)
+        landing.load_landing_table(stage, "run-1", self.run_dir, "DEALS", "upsert")
+
+        statements = [call.args[0] for call in cursor.execute.call_args_list]
+        self.assertTrue(any(s.startswith("PUT 'file://") for s in statements))
+        self.assertTrue(
+            any(s.startswith("COPY INTO DEALS_LANDING FROM @") for s in statements)
+        )
+        self.assertTrue(any(s.startswith("MERGE INTO DEALS") for s in statements))
+        self.assertIn("COMMIT", statements)
+
+    def test_load_landing_table_append(self):
+        """Prueba que el modo append copia directo a la tabla destino."""
+        landing.write_landing_files(make_deals(5), "DEALS", self.run_dir)
+        cursor = MagicMock()
+
+        stage = landing.SnowflakeStage(cursor)
+        landing.load_landing_table(stage, "run-1", self.run_dir, "DEALS", "append")
+
+        statements = [call.args[0] for call in cursor.execute.call_args_list]
+        self.assertTrue(any(s.startswith("COPY INTO DEALS FROM @") for s in statements))
+        self.assertFalse(any(s.startswith("MERGE") for s in statements))
+
+    def test_overwrite_with_empty_batch_truncates(self):
+        """Prueba que overwrite con un lote vacío vacía la tabla en una transacción."""
+        landing.write_landing_files(make_deals(0), "DEALS", self.run_dir)
+        cursor = MagicMock()
+
+        stage = landing.SnowflakeStage(cursor)
+        landing.load_landing_table(stage, "run-1", self.run_dir, "DEALS", "overwrite")
+        landing.load_landing_table(stage, "run-1", self.run_dir, "LEADS", "overwrite")
+
+        statements = [call.args[0] for call in cursor.execute.call_args_list]
+        self.assertEqual(
+            statements[-3:], ["BEGIN", "TRUNCATE TABLE IF EXISTS DEALS", "COMMIT"]
+        )
+        self.assertFalse(any("LEADS" in s for s in statements))
+        self.assertFalse(any(s.startswith("PUT") for s in statements))
+
+    def test_bridge_table_replaces_batch_associations(self):
+        """Prueba que una tabla puente se carga reemplazando las asociaciones del lote."""
+        # Ningún deal tiene compañía: la columna se guarda igual como texto
+        df = pd.DataFrame({"deal_id": ["1", "2"], "company_id": [None, None]})
+        files = landing.write_landing_files(df, "DEAL_COMPANY", self.run_dir)
+        self.assertEqual(str(pq.read_schema(files[0]).field("company_id").type), "string")
+        cursor = MagicMock()
+
+        stage = landing.SnowflakeStage(cursor)
+        landing.load_landing_table(stage, "run-1", self.run_dir, "DEAL_COMPANY", "append")
+
+        statements = [call.args[0] for call in cursor.execute.call_args_list]
+        self.assertTrue(
+            any(s.startswith("COPY INTO DEAL_COMPANY_LANDING FROM @") for s in statements)
+        )
+        self.assertTrue(
+            any(s.startswith('DELETE FROM DEAL_COMPANY WHERE "deal_id" IN') for s in statements)
+        )
+        self.assertFalse(any(s.startswith("COPY INTO DEAL_COMPANY FROM") for s in statements))
+
+    def test_run_ids_are_unique(self):
+        """Prueba que dos corridas en el mismo segundo no comparten directorio."""
+        first_id, first_dir = landing.create_run_dir(self.landing_dir)
+        second_id, second_dir = landing.create_run_dir(self.landing_dir)
+
+        self.assertNotEqual(first_id, second_id)
+        self.assertTrue(os.path.isdir(first_dir) and os.path.isdir(second_dir))
+
+    @patch("landing.new_run_id", return_value="run-1")
+    def test_existing_run_dir_fails(self, _):
+        """Prueba que no se reutiliza el directorio de una corrida anterior."""
+        os.makedirs(self.run_dir)
+
+        with self.assertRaises(FileExistsError):
+            landing.create_run_dir(self.landing_dir)
+
+    @patch("landing.notify_load_finished")
+    @patch("landing.refresh_summaries")
+    @patch("landing.get_snowflake_connection")
+    def test_load_landing_loads_every_table(self, mock_connection, mock_refresh, _):
+        """Prueba que load_landing sube y carga cada tabla de la corrida a Snowflake."""
+        landing.write_landing_files(make_deals(5), "DEALS", self.run_dir)
+        df = pd.DataFrame({"deal_id": ["1"], "company_id": ["10"]})
+        landing.write_landing_files(df, "DEAL_COMPANY", self.run_dir)
+        cursor = mock_connection.return_value.cursor.return_value
+
+        with patch("builtins.print"):
+            ok = landing.load_landing("run-1", "upsert", self.landing_dir)
+
+        self.assertTrue(ok)
+        statements = [call.args[0] for call in cursor.execute.call_args_list]
+        puts = [s for s in statements if s.startswith("PUT ")]
+        self.assertEqual(len(puts), 2)
+        self.assertTrue(any("@ETL_LANDING_STAGE/run-1/DEALS/" in s for s in puts))
+        self.assertTrue(any(s.startswith("MERGE INTO DEALS") for s in statements))
+        self.assertTrue(any(s.startswith("DELETE FROM DEAL_COMPANY") for s in statements))
+        mock_refresh.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+
+import load
+
+COLUMNS = ["deal_id", "deal_name", "amount", "archived"]
+
+
+class FakeCursor:
+    """Cursor que guarda las sentencias y puede fallar en la que se le indique."""
+
+    def __init__(self, fail_on=None):
+        self.statements = []
+        self.fail_on = fail_on
+
+    def execute(self, sql, *args):
+        self.statements.append(sql)
+        if self.fail_on and sql.startswith(self.fail_on):
+            raise RuntimeError("falló la consulta")
+
+    def close(self):
+        pass
+
+
+class TestMergeSql(unittest.TestCase):
+
+    def setUp(self):
+        self.sql = load.build_merge_sql("DEALS", "DEALS_STAGE", COLUMNS, "deal_id")
+        # Cada cláusula WHEN con lo que hace, en orden
+        self.clauses = [
+            " ".join(clause.split()) for clause in self.sql.split("WHEN")[1:]
+        ]
+
+    def test_merge_matches_on_key(self):
+        """Prueba que el MERGE cruza la tabla con el stage por la clave."""
+        self.assertTrue(self.sql.startswith("MERGE INTO DEALS AS target"))
+        self.assertIn("USING DEALS_STAGE AS source", self.sql)
+        self.assertIn('ON target."deal_id" = source."deal_id"', self.sql)
+
+    def test_archived_rows_are_soft_deleted(self):
+        """Prueba que un registro archivado que ya existe solo se marca como archivado."""
+        self.assertEqual(
+            self.clauses[0],
+            'MATCHED AND source."archived" THEN UPDATE SET target."archived" = TRUE',
+        )
+
+    def test_updated_rows_overwrite_every_column_but_the_key(self):
+        """Prueba que un registro existente sin archivar actualiza todas sus columnas."""
+        self.assertEqual(
+            self.clauses[1],
+            'MATCHED THEN UPDATE SET target."deal_name" = source."deal_name", '
+            'target."amount" = source."amount", target."archived" = source."archived"',
+        )
+
+    def test_new_rows_are_inserted_unless_archived(self):
+        """Prueba que los registros nuevos se insertan y los archivados no."""
+        self.assertEqual(
+            self.clauses[2],
+            'NOT MATCHED AND NOT source."archived" THEN '
+            'INSERT ("deal_id", "deal_name", "amount", "archived") '
+            'VALUES (source."deal_id", source."deal_name", source."amount", source."archived")',
+        )
+        self.assertEqual(len(self.clauses), 3)
+
+
+class TestUpsertTable(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = MagicMock()
+        patcher = patch("load.metrics", self.metrics)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_merge_runs_in_a_transaction(self):
+        """Prueba el orden: DDL, BEGIN, MERGE y COMMIT."""
+        cursor = FakeCursor()
+
+        load.merge_stage_table(cursor, "DEALS", "DEALS_STAGE", COLUMNS)
+
+        self.assertEqual(
+            [statement.split(None, 2)[:2] for statement in cursor.statements],
+            [["CREATE", "TABLE"], ["ALTER", "TABLE"], ["BEGIN"], ["MERGE", "INTO"], ["COMMIT"]],
+        )
+
+    def test_failed_merge_rolls_back(self):
+        """Prueba que si el MERGE falla se hace ROLLBACK y el error sigue."""
+        cursor = FakeCursor(fail_on="MERGE")
+
+        with self.assertRaises(RuntimeError):
+            load.merge_stage_table(cursor, "DEALS", "DEALS_STAGE", COLUMNS)
+
+        self.assertEqual(cursor.statements[-1], "ROLLBACK")
+        self.assertNotIn("COMMIT", cursor.statements)
+
+    @patch("load.write_pandas")
+    def test_upsert_stages_deduplicated_batch(self, mock_write_pandas):
+        """Prueba que el lote va a una tabla temporal sin claves repetidas y se borra al final."""
+        mock_write_pandas.return_value = (True, 1, 2, None)
+        cursor = FakeCursor()
+        conn = MagicMock()
+        conn.cursor.return_value = cursor
+        df = pd.DataFrame(
+            {
+                "deal_id": ["1", "1", "2"],
+                "deal_name": ["viejo", "nuevo", "otro"],
+                "amount": [1.0, 2.0, 3.0],
+                "archived": [False, False, True],
+            }
+        )
+
+        load.upsert_table(conn, df, "DEALS")
+
+        staged = mock_write_pandas.call_args.args[1]
+        self.assertEqual(staged["deal_name"].tolist(), ["nuevo", "otro"])
+        self.assertEqual(mock_write_pandas.call_args.args[2], "DEALS_STAGE")
+        self.assertEqual(mock_write_pandas.call_args.kwargs["table_type"], "temporary")
+        self.assertEqual(cursor.statements[-2:], ["COMMIT", "DROP TABLE IF EXISTS DEALS_STAGE"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import argparse
+import unittest
+from unittest.mock import MagicMock, patch
+
+import main
+
+
+class TestRun(unittest.TestCase):
+
+    def setUp(self):
+        self.open_mirror = MagicMock(return_value=None)
+        self.run_pipeline = MagicMock(return_value=(True, {}))
+
+        for target, value in {
+            "main.open_mirror": self.open_mirror,
+            "main.run_pipeline": self.run_pipeline,
+            "main.RowHashIndex": MagicMock(),
+            "main.save_state": MagicMock(),
+        }.items():
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def args(self, **kwargs):
+        values = {
+            "landing": False,
+            "replay": None,
+            "load_mode": "upsert",
+            "all_rows": False,
+            "stream": True,
+            "incremental": True,
+            "chunk_size": 100,
+            "backfill": False,
+        }
+        values.update(kwargs)
+        return argparse.Namespace(**values)
+
+    def test_incremental_without_state_fills_the_mirror(self):
+        """Prueba que --incremental sin marca de agua guardada cuenta como carga completa."""
+        with patch("main.load_state", return_value={}):
+            main.run(self.args())
+
+        self.open_mirror.assert_called_once_with("upsert", complete=True)
+        self.assertEqual(self.run_pipeline.call_args.args[1], {})
+
+    def test_incremental_with_state_is_partial(self):
+        """Prueba que una carga que parte de una marca de agua no marca el espejo completo."""
+        state = {"deals": "1735725600000"}
+        with patch("main.load_state", return_value=state):
+            main.run(self.args())
+
+        self.open_mirror.assert_called_once_with("upsert", complete=False)
+        self.assertEqual(self.run_pipeline.call_args.args[1], state)
+
+    def test_full_run_is_complete(self):
+        """Prueba que una carga sin --incremental no lee la marca de agua."""
+        with patch("main.load_state") as load_state:
+            main.run(self.args(incremental=False))
+
+        load_state.assert_not_called()
+        self.open_mirror.assert_called_once_with("upsert", complete=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
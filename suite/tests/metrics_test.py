@@ -0,0 +1,158 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+import hubspot_client
+from metrics import RunMetrics
+
+
+def fake_response(status_code: int, body: bytes = b"{}", headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response.headers.update(headers or {})
+    return response
+
+
+class TestRunMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.metrics_file = os.path.join(self.tmp.name, "metrics.jsonl")
+        self.metrics = RunMetrics(self.metrics_file)
+
+    def read_lines(self):
+        with open(self.metrics_file) as f:
+            return [json.loads(line) for line in f]
+
+    def test_stage_accumulates_calls(self):
+        """Prueba que una etapa usada por chunks suma tiempo y registros."""
+        for size in (10, 20):
+            with self.metrics.stage("transform", records_in=size) as stage:
+                stage.records_out = size - 1
+
+        stage = self.metrics.summary()["stages"]["transform"]
+        self.assertEqual(stage["calls"], 2)
+        self.assertEqual(stage["records_in"], 30)
+        self.assertEqual(stage["records_out"], 28)
+        self.assertGreater(stage["peak_rss_mb"], 0)
+
+    def test_stage_is_recorded_when_it_fails(self):
+        """Prueba que una etapa que falla igual deja su tiempo registrado."""
+        with self.assertRaises(ValueError):
+            with self.metrics.stage("load"):
+                raise ValueError("falló")
+
+        self.assertEqual(self.metrics.summary()["stages"]["load"]["calls"], 1)
+
+    def test_counters_are_thread_safe(self):
+        """Prueba que los contadores no pierden incrementos entre hilos."""
+        def work():
+            for _ in range(1000):
+                self.metrics.add("http_requests")
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.metrics.summary()["counters"]["http_requests"], 8000)
+
+    def test_record_query(self):
+        """Prueba que se guardan el query id y las filas de Snowflake."""
+        cursor = MagicMock(sfqid="01b2-query", rowcount=42)
+
+        self.metrics.record_query("DEALS", cursor, "MERGE")
+
+        self.assertEqual(
+            self.metrics.summary()["snowflake_queries"],
+            [{"table": "DEALS", "statement": "MERGE", "query_id": "01b2-query", "rows": 42}],
+        )
+
+    def test_json_lines(self):
+        """Prueba que se escribe una línea por etapa y una por corrida."""
+        with self.metrics.stage("extract") as stage:
+            stage.records_out = 5
+
+        self.metrics.finish(True)
+
+        lines = self.read_lines()
+        self.assertEqual([line["event"] for line in lines], ["stage", "run"])
+        self.assertEqual(lines[0]["records_out"], 5)
+        self.assertTrue(lines[1]["ok"])
+        self.assertEqual(lines[1]["run_id"], self.metrics.run_id)
+
+    def test_prometheus_textfile(self):
+        """Prueba el formato de texto de Prometheus para el textfile collector."""
+        prometheus_file = os.path.join(self.tmp.name, "etl.prom")
+        with self.metrics.stage("transform", records_in=3) as stage:
+            stage.records_out = 3
+        self.metrics.add("http_429", 2)
+
+        self.metrics.finish(False, prometheus_file=prometheus_file)
+
+        with open(prometheus_file) as f:
+            text = f.read()
+        self.assertIn("etl_run_success 0.0\n", text)
+        self.assertIn('etl_stage_records_out{stage="transform"} 3.0\n', text)
+        self.assertIn('etl_run_counter{name="http_429"} 2.0\n', text)
+        self.assertIn("# TYPE etl_stage_seconds gauge\n", text)
+        # No queda el archivo temporal de la escritura atómica
+        prom_files = [f for f in os.listdir(self.tmp.name) if f.startswith("etl.prom")]
+        self.assertEqual(prom_files, ["etl.prom"])
+
+    def test_profile_only_selected_stage(self):
+        """Prueba que --profile perfila la transformación y guarda un .prof."""
+        self.metrics.enable_profiling("transform")
+        with self.metrics.stage("extract"):
+            pass
+        with self.metrics.stage("transform"):
+            sorted(range(1000), key=lambda x: -x)
+
+        with patch("metrics.PROFILE_DIR", self.tmp.name), patch("builtins.print"):
+            path = self.metrics.dump_profile()
+
+        self.assertEqual(len(self.metrics.profilers), 1)
+        self.assertTrue(os.path.exists(path))
+
+
+class TestHubSpotRequestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = RunMetrics()
+        for target, value in {
+            "hubspot_client.metrics": self.metrics,
+            "hubspot_client.rate_limiter": hubspot_client.TokenBucket(1000, 100),
+            "hubspot_client.time.sleep": lambda _: None,
+        }.items():
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_http_counters(self):
+        """Prueba que se cuentan requests, bytes, 429 y reintentos."""
+        session = MagicMock()
+        session.request.side_effect = [
+            fake_response(429, b"", {"Retry-After": "0"}),
+            fake_response(200, b'{"results": []}'),
+        ]
+
+        with patch("hubspot_client.get_session", return_value=session):
+            hubspot_client.hubspot_request("GET", "https://api.hubapi.com/x")
+
+        counters = self.metrics.summary()["counters"]
+        self.assertEqual(counters["http_requests"], 2)
+        self.assertEqual(counters["http_429"], 1)
+        self.assertEqual(counters["http_retries"], 1)
+        self.assertEqual(counters["http_bytes"], len(b'{"results": []}'))
+
+
+if __name__ == "__main__":
+    unittest.main()
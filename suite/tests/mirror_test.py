@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from contextlib import closing
+from unittest.mock import patch
+
+from mirror import MirrorWriter, finish_mirror
+from transform import transform_data
+
+
+def deal(deal_id: str, amount: str, companies=(), archived=False, day="2025-01-01") -> dict:
+    associations = None
+    if companies:
+        associations = {
+            "companies": {"results": [{"id": c, "type": "deal_to_company"} for c in companies]}
+        }
+    return {
+        "id": deal_id,
+        "properties": {
+            "dealname": f"Deal {deal_id}",
+            "amount": amount,
+            "dealstage": "closedwon",
+            "createdate": f"{day}T10:00:00Z",
+        },
+        "associations": associations,
+        "archived": archived,
+    }
+
+
+def lead(lead_id: str, status: str = "NEW") -> dict:
+    return {
+        "id": lead_id,
+        "properties": {
+            "email": f"{lead_id}@example.com",
+            "hs_lead_status": status,
+            "createdate": "2025-01-02T10:00:00Z",
+        },
+        "archived": False,
+    }
+
+
+class TestMirror(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "metrics.sqlite")
+
+        for target in ("builtins.print", "mirror.notify_load_finished"):
+            patcher = patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def load(self, deals, leads=(), mode="upsert", ok=True, complete=True):
+        df_deals, df_leads, associations = transform_data(deals, list(leads))
+        mirror = MirrorWriter(self.path, mode, complete)
+        mirror.write("DEALS", df_deals)
+        mirror.write("LEADS", df_leads)
+        for table_name, df in associations.items():
+            mirror.write(table_name, df)
+        finish_mirror(mirror, ok)
+
+    def query(self, sql: str):
+        with closing(sqlite3.connect(self.path)) as conn:
+            return conn.execute(sql).fetchall()
+
+    def deal_summary(self):
+        return self.query(
+            'SELECT "day", "segment", "deal_count", "total_amount" '
+            'FROM DEALS_DAILY_SUMMARY ORDER BY "day", "segment"'
+        )
+
+    def test_publish_builds_summaries(self):
+        """Prueba que el espejo publicado tiene los resúmenes que lee la API."""
+        deals = [
+            deal("1", "100", companies=["10"]),
+            deal("2", "50"),
+            deal("3", "5", day="2025-01-03"),
+        ]
+        self.load(deals, [lead("1"), lead("2"), lead("3", status="OPEN")])
+
+        self.assertEqual(
+            self.deal_summary(),
+            [
+                ("2025-01-01", "B2B", 1, 100.0),
+                ("2025-01-01", "B2C", 1, 50.0),
+                ("2025-01-03", "B2C", 1, 5.0),
+            ],
+        )
+        self.assertEqual(
+            self.query('SELECT "status", "lead_count" FROM LEADS_DAILY_SUMMARY ORDER BY 1'),
+            [("NEW", 2), ("OPEN", 1)],
+        )
+        self.assertFalse(os.path.exists(f"{self.path}.tmp"))
+
+    def test_later_loads_upsert_and_archive(self):
+        """Prueba que las cargas siguientes actualizan, archivan y reemplazan asociaciones."""
+        self.load([deal("1", "100", companies=["10"]), deal("2", "50")])
+
+        # El deal 1 pierde su compañía, el 2 se archiva y llega uno nuevo
+        self.load(
+            [deal("1", "120"), deal("2", "50", archived=True), deal("4", "7")],
+            complete=False,
+        )
+
+        self.assertEqual(self.deal_summary(), [("2025-01-01", "B2C", 2, 127.0)])
+
+    def test_not_published_until_complete_load(self):
+        """Prueba que una carga incremental sobre un espejo vacío no se publica."""
+        self.load([deal("1", "100")], complete=False)
+
+        self.assertFalse(os.path.exists(self.path))
+
+        # La carga completa llena el espejo; lo incremental de antes no quedó
+        self.load([deal("2", "50")])
+        self.load([deal("3", "5")], complete=False)
+
+        self.assertEqual(self.deal_summary(), [("2025-01-01", "B2C", 2, 55.0)])
+
+    def test_failed_load_keeps_previous_mirror(self):
+        """Prueba que si la carga falla el espejo publicado no cambia."""
+        self.load([deal("1", "100")])
+
+        self.load([deal("2", "50")], ok=False)
+
+        self.assertEqual(self.deal_summary(), [("2025-01-01", "B2C", 1, 100.0)])
+
+    def test_each_batch_is_committed(self):
+        """Prueba que cada lote se confirma en el espejo de trabajo sin esperar a publish()."""
+        mirror = MirrorWriter(self.path, "upsert", complete=True)
+        df_deals, _, _ = transform_data([deal("1", "100")], [])
+        mirror.write("DEALS", df_deals)
+
+        with closing(sqlite3.connect(f"{self.path}.build", timeout=0)) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM DEALS").fetchone(), (1,))
+            # Otra conexión puede escribir: no quedó una transacción abierta
+            conn.execute("DELETE FROM DEALS")
+            conn.commit()
+        mirror.abort()
+
+    def test_failed_overwrite_is_not_published_by_incremental(self):
+        """Prueba que un overwrite cortado deja el espejo sin carga completa."""
+        self.load([deal("1", "100"), deal("2", "50")])
+
+        self.load([deal("3", "9")], mode="overwrite", ok=False)
+        self.load([deal("4", "7")], complete=False)
+
+        self.assertEqual(
+            self.deal_summary(), [("2025-01-01", "B2C", 2, 150.0)]
+        )
+
+    def test_overwrite_replaces_everything(self):
+        """Prueba que overwrite deja en el espejo solo lo de esta carga."""
+        self.load([deal("1", "100"), deal("2", "50")])
+
+        self.load([deal("3", "9")], mode="overwrite")
+
+        self.assertEqual(self.deal_summary(), [("2025-01-01", "B2C", 1, 9.0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
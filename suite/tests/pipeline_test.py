@@ -0,0 +1,152 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pipeline
+from row_hashes import RowHashIndex
+
+
+def deal(deal_id: int) -> dict:
+    return {
+        "id": str(deal_id),
+        "properties": {"dealname": f"Deal {deal_id}", "createdate": "2025-01-01T10:00:00Z"},
+        "archived": False,
+    }
+
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.pages_yielded = 0
+        self.loaded = []
+        self.write_table = MagicMock(side_effect=self.record_load)
+
+        for target, value in {
+            "pipeline.extract_pages_since": self.extract_pages,
+            "pipeline.get_snowflake_connection": MagicMock(),
+            "pipeline.write_table": self.write_table,
+            "pipeline.refresh_summaries": MagicMock(),
+            "pipeline.notify_load_finished": MagicMock(),
+            "pipeline.load_landing": MagicMock(return_value=True),
+            "pipeline.write_landing_files": MagicMock(),
+            "pipeline.create_run_dir": MagicMock(return_value=("run-1", "/tmp/run-1")),
+            "builtins.print": MagicMock(),
+        }.items():
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def extract_pages(self, object_type, since, until_ms):
+        """50 páginas de un deal cada una; los contactos no traen nada."""
+        if object_type != "deals":
+            return
+        for i in range(50):
+            self.pages_yielded += 1
+            yield [deal(i)]
+
+    def record_load(self, conn, df, table_name, mode):
+        self.loaded.append((table_name, len(df)))
+
+    def run_pipeline(self, timeout=10, **kwargs):
+        """Corre el pipeline en otro hilo: si alguna etapa se colgara, el test falla."""
+        result = {}
+        runner = threading.Thread(
+            target=lambda: result.update(
+                value=pipeline.run_pipeline(chunk_size=1, queue_size=1, **kwargs)
+            )
+        )
+        runner.start()
+        runner.join(timeout)
+        self.assertFalse(runner.is_alive(), "el pipeline no terminó")
+        return result["value"]
+
+    def test_bounded_queues_apply_backpressure(self):
+        """Prueba que si la carga se traba la extracción no sigue leyendo páginas."""
+        release = threading.Event()
+        self.write_table.side_effect = lambda *args: release.wait(5)
+
+        runner = threading.Thread(
+            target=pipeline.run_pipeline, kwargs={"chunk_size": 1, "queue_size": 1}
+        )
+        runner.start()
+        time.sleep(0.3)
+
+        # Solo avanzan los elementos que entran en las colas y las etapas
+        self.assertLess(self.pages_yielded, 10)
+        release.set()
+        runner.join(10)
+        self.assertEqual(self.pages_yielded, 50)
+
+    def test_failed_load_stops_every_stage(self):
+        """Prueba que si la carga falla las demás etapas se detienen y no se cierra la carga."""
+
+        def fail_on_third_chunk(conn, df, table_name, mode):
+            if self.write_table.call_count == 3:
+                raise RuntimeError("falló el MERGE")
+            self.record_load(conn, df, table_name, mode)
+
+        self.write_table.side_effect = fail_on_third_chunk
+        state = {"deals": "2025-01-01T00:00:00Z"}
+
+        ok, new_state = self.run_pipeline(state=state)
+
+        self.assertFalse(ok)
+        self.assertEqual(new_state, state)
+        self.assertLess(self.pages_yielded, 50)
+        self.assertEqual(self.write_table.call_count, 3)
+        pipeline.refresh_summaries.assert_not_called()
+        pipeline.notify_load_finished.assert_not_called()
+
+    def test_failed_transform_loads_nothing_from_landing(self):
+        """Prueba que si falla la transformación la corrida en disco no se carga."""
+        calls = []
+
+        def transform(records):
+            calls.append(records)
+            if len(calls) == 2:
+                raise ValueError("registro inválido")
+            return pipeline.transform_deal_tables(records)
+
+        with patch.dict(pipeline.pipeline_objects, {"deals": transform}):
+            ok, _ = self.run_pipeline(landing=True)
+
+        self.assertFalse(ok)
+        self.assertLess(self.pages_yielded, 50)
+        pipeline.load_landing.assert_not_called()
+        pipeline.notify_load_finished.assert_not_called()
+
+    def test_successful_run_loads_every_chunk(self):
+        """Prueba que sin errores se cargan todos los chunks y se avisa a la API."""
+        ok, _ = self.run_pipeline()
+
+        self.assertTrue(ok)
+        self.assertEqual(sum(rows for table, rows in self.loaded if table == "DEALS"), 50)
+        pipeline.refresh_summaries.assert_called_once()
+        pipeline.notify_load_finished.assert_called_once()
+
+    def test_unchanged_deals_do_not_restage_bridge_rows(self):
+        """Prueba que las tablas puente de los deals sin cambios no se vuelven a cargar."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        index = RowHashIndex(os.path.join(tmp.name, "hashes.sqlite"))
+
+        def bridge_rows():
+            return sum(rows for table, rows in self.loaded if table.startswith("DEAL_"))
+
+        self.assertTrue(self.run_pipeline(row_index=index)[0])
+        index.save()
+        first_run = bridge_rows()
+        self.loaded.clear()
+        self.assertTrue(self.run_pipeline(row_index=index)[0])
+
+        # Cada deal sin asociaciones deja una fila nula por tabla puente
+        self.assertEqual(first_run, 100)
+        self.assertEqual(bridge_rows(), 0)
+        self.assertEqual(sum(rows for table, rows in self.loaded if table == "DEALS"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from metrics import RunMetrics
+from row_hashes import RowHashIndex, select_bridge_rows
+from transform import transform_deal_tables, transform_deals
+
+
+def deal(
+    deal_id: str, amount: str = "100", stage: str = "appointmentscheduled", contacts=()
+) -> dict:
+    return {
+        "id": deal_id,
+        "properties": {
+            "dealname": f"Deal {deal_id}",
+            "amount": amount,
+            "dealstage": stage,
+            "createdate": "2025-01-01T10:00:00Z",
+        },
+        "associations": (
+            {"contacts": {"results": [{"id": c, "type": "deal_to_contact"} for c in contacts]}}
+            if contacts
+            else None
+        ),
+        "archived": False,
+    }
+
+
+class TestRowHashIndex(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "hashes.sqlite")
+
+        self.metrics = RunMetrics()
+        patcher = patch("row_hashes.metrics", self.metrics)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("builtins.print")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def load(self, deals, save=True, **kwargs):
+        index = RowHashIndex(self.path)
+        changed = index.select_changed(transform_deals(deals), "DEALS", **kwargs)
+        if save:
+            index.save()
+        return changed["deal_id"].tolist()
+
+    def test_unchanged_rows_are_skipped(self):
+        """Prueba que en la segunda carga solo pasan las filas nuevas o cambiadas."""
+        self.load([deal("1"), deal("2"), deal("3")])
+
+        changed = self.load([deal("1"), deal("2", stage="closedwon"), deal("3"), deal("4")])
+
+        self.assertEqual(changed, ["2", "4"])
+        counters = self.metrics.summary()["counters"]
+        self.assertEqual(counters["rows_skipped_deals"], 2)
+        self.assertEqual(counters["rows_changed_deals"], 3 + 2)
+
+    def test_hash_ignores_numeric_dtype(self):
+        """Prueba que un monto entero y el mismo monto como float dan el mismo hash."""
+        self.load([deal("1", amount="100"), deal("2", amount="50")])
+
+        # Con un decimal en el lote, toda la columna pasa a float
+        changed = self.load([deal("1", amount="100"), deal("2", amount="50.5")])
+
+        self.assertEqual(changed, ["2"])
+
+    def test_hashes_only_saved_after_load(self):
+        """Prueba que si la carga falla (no hay save) las filas se vuelven a cargar."""
+        self.load([deal("1")], save=False)
+
+        self.assertEqual(self.load([deal("1")]), ["1"])
+
+    def load_with_associations(self, deals):
+        tables = transform_deal_tables(deals)
+        associations = {name: df for name, df in tables.items() if name != "DEALS"}
+        index = RowHashIndex(self.path)
+        changed = index.select_changed(tables["DEALS"], "DEALS", associations=associations)
+        index.save()
+        return changed["deal_id"].tolist()
+
+    def test_changed_associations_change_the_hash(self):
+        """Prueba que un deal al que solo le cambiaron los contactos se vuelve a cargar."""
+        self.load_with_associations(
+            [deal("1", contacts=["20", "21"]), deal("2", contacts=["30"]), deal("3")]
+        )
+
+        changed = self.load_with_associations(
+            [deal("1", contacts=["21", "20"]), deal("2", contacts=["30", "31"]), deal("3")]
+        )
+
+        # El orden de las asociaciones no importa; agregar un contacto sí
+        self.assertEqual(changed, ["2"])
+
+    def test_bridge_rows_follow_changed_deals(self):
+        """Prueba que de las tablas puente solo quedan las filas de los deals a cargar."""
+        tables = transform_deal_tables(
+            [deal("1", contacts=["20", "21"]), deal("2", contacts=["30"])]
+        )
+        associations = {name: df for name, df in tables.items() if name != "DEALS"}
+
+        selected = select_bridge_rows(associations, tables["DEALS"].iloc[1:])
+
+        self.assertEqual(selected["DEAL_CONTACT"]["contact_id"].tolist(), ["30"])
+        self.assertEqual(selected["DEAL_COMPANY"]["deal_id"].tolist(), ["2"])
+
+    def test_replace_rebuilds_index(self):
+        """Prueba que overwrite carga todo y deja en el índice solo lo cargado."""
+        self.load([deal("1"), deal("2")])
+
+        index = RowHashIndex(self.path)
+        changed = index.select_changed(
+            transform_deals([deal("1")]), "DEALS", skip_unchanged=False
+        )
+        index.save(replace=True)
+
+        self.assertEqual(changed["deal_id"].tolist(), ["1"])
+        self.assertEqual(self.load([deal("1"), deal("2")]), ["2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
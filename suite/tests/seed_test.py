@@ -0,0 +1,199 @@
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import seed
+
+
+class FakeBatchCreate:
+    """Simula /batch/create: devuelve los registros con IDs nuevos y en otro orden."""
+
+    def __init__(self, fail_on_call=None):
+        self.ids = itertools.count(1)
+        self.calls = []
+        self.lock = threading.Lock()
+        self.fail_on_call = fail_on_call
+
+    def __call__(self, object_type, inputs):
+        with self.lock:
+            self.calls.append((object_type, len(inputs)))
+            if len(self.calls) == self.fail_on_call:
+                raise seed.requests.exceptions.HTTPError(
+                    response=type("Response", (), {"text": "error"})()
+                )
+            results = [
+                {"id": str(next(self.ids)), "properties": item["properties"]}
+                for item in inputs
+            ]
+        return list(reversed(results))
+
+
+class TestSeed(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.resume_file = os.path.join(self.tmp.name, "seed.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def args(self, **kwargs):
+        values = {
+            "companies": 150,
+            "contacts_per_company": 2,
+            "b2b_ratio": 0.5,
+            "workers": 4,
+            "resume_file": self.resume_file,
+            "fresh": False,
+        }
+        values.update(kwargs)
+        return argparse.Namespace(**values)
+
+    def test_records_are_created_in_batches_of_100(self):
+        """Prueba que cada llamada crea hasta 100 registros."""
+        fake = FakeBatchCreate()
+        with patch("seed.batch_create", fake):
+            seed.seed(self.args())
+
+        sizes = {}
+        for object_type, size in fake.calls:
+            sizes.setdefault(object_type, []).append(size)
+        self.assertEqual(sorted(sizes["companies"]), [50, 100])
+        self.assertEqual(sorted(sizes["contacts"]), [100, 100, 100])
+        self.assertEqual(sorted(sizes["deals"]), [100, 100, 100])
+
+    def test_contacts_keep_their_company(self):
+        """Prueba que los contactos se emparejan con su compañía aunque vuelvan desordenados."""
+        with patch("seed.batch_create", FakeBatchCreate()):
+            seed.seed(self.args(companies=3, contacts_per_company=2))
+
+        progress = seed.SeedProgress(
+            self.resume_file,
+            {"companies": 3, "contacts_per_company": 2, "b2b_ratio": 0.5},
+        )
+        contacts = progress.all("contacts")
+        self.assertEqual(len(contacts), 6)
+        for company_id in progress.all("companies"):
+            self.assertEqual(
+                sum(1 for item in contacts if item["company_id"] == company_id), 2
+            )
+
+    def test_resume_skips_created_batches(self):
+        """Prueba que tras un corte solo se crean los lotes que faltaban."""
+        with patch("seed.batch_create", FakeBatchCreate(fail_on_call=2)):
+            with self.assertRaises(SystemExit):
+                seed.seed(self.args())
+
+        fake = FakeBatchCreate()
+        with patch("seed.batch_create", fake):
+            seed.seed(self.args())
+
+        object_types = [object_type for object_type, _ in fake.calls]
+        self.assertEqual(object_types.count("companies"), 1)
+        self.assertEqual(object_types.count("deals"), 3)
+
+    def test_partial_batch_is_not_recorded(self):
+        """Prueba que un 207 con menos resultados que inputs cuenta como lote fallido."""
+        def partial_request(method, url, json):
+            inputs = json["inputs"]
+            body = {
+                "results": [
+                    {"id": str(i), "properties": item["properties"]}
+                    for i, item in enumerate(inputs[1:])
+                ],
+                "errors": [{"message": "propiedad inválida"}],
+            }
+            return type("Response", (), {"status_code": 207, "json": lambda self: body})()
+
+        with patch("seed.hubspot_request", partial_request):
+            with self.assertRaises(SystemExit):
+                seed.seed(self.args(companies=1))
+
+        fake = FakeBatchCreate()
+        with patch("seed.batch_create", fake):
+            seed.seed(self.args(companies=1))
+
+        self.assertEqual(fake.calls[0], ("companies", 1))
+
+    def test_connection_error_stops_the_seeding(self):
+        """Prueba que un corte de red termina el seeding sin registrar el lote."""
+        def failing(object_type, inputs):
+            raise seed.requests.exceptions.ConnectionError("corte de red")
+
+        with patch("seed.batch_create", failing):
+            with self.assertRaises(SystemExit):
+                seed.seed(self.args(companies=1))
+
+        fake = FakeBatchCreate()
+        with patch("seed.batch_create", fake):
+            seed.seed(self.args(companies=1))
+        self.assertEqual(fake.calls[0], ("companies", 1))
+
+    def test_resume_with_other_parameters_fails(self):
+        """Prueba que no se mezcla el progreso de seedings distintos."""
+        with patch("seed.batch_create", FakeBatchCreate()):
+            seed.seed(self.args(companies=1))
+
+        with self.assertRaises(SystemExit):
+            seed.seed(self.args(companies=2))
+
+    def test_progress_appends_one_line_per_batch(self):
+        """Prueba que cada lote agrega una línea al progreso en lugar de reescribirlo."""
+        with patch("seed.batch_create", FakeBatchCreate()):
+            seed.seed(self.args())
+
+        with open(self.resume_file) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertIn("config", lines[0])
+        # 2 lotes de compañías, 3 de contactos y 3 de deals
+        self.assertEqual(len(lines), 1 + 2 + 3 + 3)
+
+    def test_resume_ignores_cut_line(self):
+        """Prueba que una línea a medio escribir se ignora y ese lote se vuelve a crear."""
+        with patch("seed.batch_create", FakeBatchCreate()):
+            seed.seed(self.args())
+        with open(self.resume_file) as f:
+            lines = f.readlines()
+        with open(self.resume_file, "w") as f:
+            f.writelines(lines[:-1])
+            f.write(lines[-1][:20])
+
+        fake = FakeBatchCreate()
+        with patch("seed.batch_create", fake):
+            seed.seed(self.args())
+
+        self.assertEqual(fake.calls, [("deals", 100)])
+        progress = seed.SeedProgress(
+            self.resume_file,
+            {"companies": 150, "contacts_per_company": 2, "b2b_ratio": 0.5},
+        )
+        self.assertEqual(len(progress.all("deals")), 300)
+
+    def test_each_thread_has_its_own_faker(self):
+        """Prueba que los hilos no comparten la instancia de Faker."""
+        fakers = []
+        threads = [
+            threading.Thread(target=lambda: fakers.append(seed.worker_faker()))
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertIsNot(fakers[0], fakers[1])
+        self.assertIs(seed.worker_faker(), seed.worker_faker())
+
+    @patch("seed.script_dir", "/no/existe")
+    def test_industries_fallback(self):
+        """Prueba que sin industries.json se usa la lista de fallback."""
+        self.assertEqual(seed.get_industries(), seed.FALLBACK_INDUSTRIES)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+
+import summaries
+
+
+def executed(conn: MagicMock):
+    return [call.args[0] for call in conn.cursor.return_value.execute.call_args_list]
+
+
+class TestSummaries(unittest.TestCase):
+
+    def test_touched_days(self):
+        """Prueba que se obtienen los días UTC distintos del lote."""
+        created_at = pd.to_datetime(
+            ["2025-01-01T10:00:00Z", "2025-01-01T23:00:00Z", "2025-01-02T00:30:00Z", None],
+            utc=True,
+        )
+
+        self.assertEqual(
+            summaries.touched_days(created_at), {"2025-01-01", "2025-01-02"}
+        )
+
+    def test_incremental_refresh_only_touches_batch_days(self):
+        """Prueba que solo se borran y recalculan los días del lote."""
+        conn = MagicMock()
+
+        summaries.refresh_summaries(conn, {"DEALS": {"2025-01-02", "2025-01-01"}})
+
+        statements = executed(conn)
+        self.assertTrue(statements[0].startswith("CREATE TABLE IF NOT EXISTS DEALS_DAILY_SUMMARY"))
+        self.assertEqual(statements[1], "BEGIN")
+        self.assertEqual(
+            statements[2],
+            "DELETE FROM DEALS_DAILY_SUMMARY WHERE \"day\" IN "
+            "('2025-01-01'::DATE, '2025-01-02'::DATE)",
+        )
+        self.assertTrue(statements[3].startswith("INSERT INTO DEALS_DAILY_SUMMARY SELECT"))
+        self.assertIn(
+            "TO_DATE(\"created_at\") IN ('2025-01-01'::DATE, '2025-01-02'::DATE)",
+            statements[3],
+        )
+        self.assertEqual(statements[4], "COMMIT")
+
+    def test_full_refresh(self):
+        """Prueba que con None (ej. overwrite) se recalcula el resumen completo."""
+        conn = MagicMock()
+
+        summaries.refresh_summaries(conn, {"LEADS": None})
+
+        statements = executed(conn)
+        self.assertIn("DELETE FROM LEADS_DAILY_SUMMARY", statements)
+        insert = next(s for s in statements if s.startswith("INSERT"))
+        self.assertNotIn("IN (", insert)
+
+    @patch("summaries.SUMMARY_MAX_DAYS", 2)
+    def test_too_many_days_rebuilds_everything(self):
+        """Prueba que un lote con demasiados días pasa a recalcular todo."""
+        conn = MagicMock()
+
+        summaries.refresh_summaries(conn, {"DEALS": {"2025-01-01", "2025-01-02", "2025-01-03"}})
+
+        self.assertIn("DELETE FROM DEALS_DAILY_SUMMARY", executed(conn))
+
+    def test_empty_batch_does_nothing(self):
+        """Prueba que un lote sin registros no toca los resúmenes."""
+        conn = MagicMock()
+
+        summaries.refresh_summaries(conn, {"DEALS": set(), "LEADS": set()})
+
+        self.assertEqual(executed(conn), [])
+
+    def test_rollback_on_error(self):
+        """Prueba que si falla el INSERT el resumen no queda a medias."""
+        conn = MagicMock()
+        cursor = conn.cursor.return_value
+
+        def execute(sql):
+            if sql.startswith("INSERT"):
+                raise Exception("Error de SQL")
+
+        cursor.execute.side_effect = execute
+
+        with self.assertRaises(Exception):
+            summaries.refresh_summaries(conn, {"DEALS": {"2025-01-01"}})
+
+        self.assertIn("ROLLBACK", executed(conn))
+        self.assertNotIn("COMMIT", executed(conn))
+        cursor.close.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
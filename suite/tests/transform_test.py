@@ -0,0 +1,115 @@
+import unittest
+
+import pandas as pd
+
+from transform import transform_data
+
+
+def baseline_transform(deals_data, leads_data):
+    """La transformación original, fila por fila con pandas (referencia)."""
+    deals_list = []
+    for deal in deals_data:
+        props = deal["properties"]
+        assoc_company_id = None
+        try:
+            assoc_company_id = deal["associations"]["companies"]["results"][0]["id"]
+        except (KeyError, IndexError, TypeError):
+            pass
+        deals_list.append(
+            {
+                "deal_id": deal["id"],
+                "deal_name": props.get("dealname"),
+                "amount": props.get("amount"),
+                "stage": props.get("dealstage"),
+                "created_at": props.get("createdate"),
+                "associated_company_id": assoc_company_id,
+            }
+        )
+    df_deals = pd.DataFrame(deals_list)
+    df_deals["amount"] = pd.to_numeric(df_deals["amount"]).fillna(0)
+    df_deals["created_at"] = pd.to_datetime(df_deals["created_at"])
+
+    leads_list = []
+    for lead in leads_data:
+        props = lead["properties"]
+        leads_list.append(
+            {
+                "lead_id": lead["id"],
+                "email": props.get("email"),
+                "first_name": props.get("firstname"),
+                "last_name": props.get("lastname"),
+                "status": props.get("hs_lead_status"),
+                "created_at": props.get("createdate"),
+            }
+        )
+    df_leads = pd.DataFrame(leads_list)
+    df_leads["created_at"] = pd.to_datetime(df_leads["created_at"])
+    df_leads["status"] = df_leads["status"].fillna("UNKNOWN")
+    return df_deals, df_leads
+
+
+def deal(deal_id: str, amount, company=None) -> dict:
+    properties = {
+        "dealname": f"Deal {deal_id}",
+        "dealstage": "closedwon",
+        "createdate": "2025-01-01T10:00:00Z",
+    }
+    if amount is not ...:
+        properties["amount"] = amount
+    associations = None
+    if company:
+        associations = {
+            "companies": {"results": [{"id": company, "type": "deal_to_company"}]}
+        }
+    return {"id": deal_id, "properties": properties, "associations": associations}
+
+
+def lead(lead_id: str, status=None) -> dict:
+    return {
+        "id": lead_id,
+        "properties": {
+            "email": f"{lead_id}@example.com",
+            "firstname": "Ana",
+            "hs_lead_status": status,
+            "createdate": "2025-01-02T10:00:00.123Z",
+        },
+    }
+
+
+class TestTransform(unittest.TestCase):
+
+    def test_matches_baseline_transform(self):
+        """Prueba que DEALS y LEADS salen igual que con la transformación original."""
+        deals = [
+            deal("1", "100", company="10"),
+            deal("2", ""),
+            deal("3", None),
+            deal("4", "12.5"),
+            deal("5", ...),
+        ]
+        leads = [lead("1", "OPEN"), lead("2")]
+
+        df_deals, df_leads, _ = transform_data(deals, leads)
+        expected_deals, expected_leads = baseline_transform(deals, leads)
+
+        pd.testing.assert_frame_equal(df_deals[expected_deals.columns], expected_deals)
+        pd.testing.assert_frame_equal(df_leads[expected_leads.columns], expected_leads)
+        self.assertEqual(df_deals["amount"].tolist(), [100.0, 0.0, 0.0, 12.5, 0.0])
+
+    def test_blank_amount_is_zero(self):
+        """Prueba que un monto con solo espacios también se toma como 0."""
+        df_deals, _, _ = transform_data([deal("1", "  "), deal("2", " 3 ")], [])
+
+        self.assertEqual(df_deals["amount"].tolist(), [0.0, 3.0])
+
+    def test_amount_is_always_float(self):
+        """Prueba que el monto es float64 aunque el lote traiga solo enteros."""
+        whole, _, _ = transform_data([deal("1", "100"), deal("2", "7")], [])
+        mixed, _, _ = transform_data([deal("3", "1.5"), deal("4", "")], [])
+
+        self.assertEqual(whole["amount"].dtype, "float64")
+        self.assertEqual(mixed["amount"].dtype, "float64")
+
+
+if __name__ == "__main__":
+    unittest.main()
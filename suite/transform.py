@@ -1,57 +1,234 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from schemas import HubSpotDealObject, HubSpotContactObject
-from typing import List, Tuple
+from typing import Dict, List, Tuple
+
+# Columnas de salida de cada tabla (en el orden en que se cargan)
+DEALS_COLUMNS = [
+    "deal_id",
+    "deal_name",
+    "amount",
+    "stage",
+    "created_at",
+    "associated_company_id",
+    "archived",
+]
+LEADS_COLUMNS = [
+    "lead_id",
+    "email",
+    "first_name",
+    "last_name",
+    "status",
+    "created_at",
+    "archived",
+]
+
+# Tablas puente de las asociaciones de cada deal:
+# tabla -> (grupo en 'associations', columna con el id del objeto asociado)
+deal_association_tables = {
+    "DEAL_COMPANY": ("companies", "company_id"),
+    "DEAL_CONTACT": ("contacts", "contact_id"),
+}
+
+
+# Esquema Arrow de los objetos de HubSpot. Con el tipo explícito pyarrow no
+# tiene que inferirlo recorriendo todos los registros, e ignora lo que sobra.
+ASSOCIATION_GROUP_TYPE = pa.struct(
+    [("results", pa.list_(pa.struct([("id", pa.string()), ("type", pa.string())])))]
+)
+
+DEAL_TYPE = pa.struct(
+    [
+        ("id", pa.string()),
+        (
+            "properties",
+            pa.struct(
+                [
+                    ("dealname", pa.string()),
+                    ("amount", pa.string()),
+                    ("dealstage", pa.string()),
+                    ("createdate", pa.string()),
+                ]
+            ),
+        ),
+        (
+            "associations",
+            pa.struct(
+                [("companies", ASSOCIATION_GROUP_TYPE), ("contacts", ASSOCIATION_GROUP_TYPE)]
+            ),
+        ),
+        ("archived", pa.bool_()),
+    ]
+)
+
+CONTACT_TYPE = pa.struct(
+    [
+        ("id", pa.string()),
+        (
+            "properties",
+            pa.struct(
+                [
+                    ("email", pa.string()),
+                    ("firstname", pa.string()),
+                    ("lastname", pa.string()),
+                    ("hs_lead_status", pa.string()),
+                    ("createdate", pa.string()),
+                ]
+            ),
+        ),
+        ("archived", pa.bool_()),
+    ]
+)
+
+
+def get_field(array: pa.Array, *path: str) -> pa.Array:
+    """Saca un campo anidado de un StructArray (ej. 'properties', 'amount')."""
+    for name in path:
+        array = pc.struct_field(array, name)
+    return array
+
+
+def get_first_association_id(array: pa.Array, association: str) -> pa.Array:
+    """Id de la primera asociación de cada registro (o nulo si no tiene)."""
+    results = get_field(array, "associations", association, "results")
+
+    # list_element falla con listas vacías: se convierten antes en nulos
+    has_items = pc.fill_null(pc.greater(pc.list_value_length(results), 0), False)
+    results = pc.if_else(has_items, results, pa.scalar(None, results.type))
+    return get_field(pc.list_element(results, 0), "id")
+
+
+def to_amount(amounts: pa.Array) -> pd.Series:
+    """
+    Montos como float64, con 0.0 para los nulos. HubSpot manda "" cuando se
+    borra el monto: se toma como nulo, igual que pd.to_numeric(...).fillna(0).
+    Siempre float64, para que la columna no cambie de tipo entre lotes.
+    """
+    amounts = pc.utf8_trim_whitespace(amounts)
+    blank = pc.fill_null(pc.equal(amounts, ""), False)
+    amounts = pc.if_else(blank, pa.scalar(None, pa.string()), amounts)
+    return pc.fill_null(pc.cast(amounts, pa.float64()), 0.0).to_pandas()
+
+
+def to_datetime(dates: pa.Array) -> pd.Series:
+    """Fechas ISO 8601 de HubSpot a datetime64[ns, UTC]."""
+    return pc.cast(dates, pa.timestamp("ns", tz="UTC")).to_pandas()
+
+
+def to_column(array: pa.Array) -> pd.Series:
+    """Convierte a una columna de pandas de tipo object (None para nulos)."""
+    return pd.Series(array.to_pandas(), dtype=object)
+
+
+def to_archived(array: pa.Array) -> pd.Series:
+    return pc.fill_null(get_field(array, "archived"), False).to_pandas()
+
+
+def get_association_rows(deals: pa.Array, association: str, column: str) -> pd.DataFrame:
+    """
+    Una fila (deal_id, id asociado) por asociación de cada deal activo.
+    Los deals activos sin asociaciones quedan con una fila con el id nulo:
+    la carga la usa para borrar las asociaciones que el deal ya no tiene.
+    """
+    active = pc.invert(pc.fill_null(get_field(deals, "archived"), False))
+    deals = deals.filter(active)
+    ids = get_field(deals, "id")
+    results = get_field(deals, "associations", association, "results")
+
+    # list_flatten saltea las listas nulas y vacías; list_parent_indices dice
+    # de qué deal es cada elemento
+    deal_ids = pc.take(ids, pc.list_parent_indices(results))
+    related_ids = get_field(pc.list_flatten(results), "id")
+
+    lengths = pc.fill_null(pc.list_value_length(results), 0)
+    without = ids.filter(pc.equal(lengths, 0))
+
+    return pd.DataFrame(
+        {
+            "deal_id": to_column(pa.concat_arrays([deal_ids, without])),
+            column: to_column(
+                pa.concat_arrays([related_ids, pa.nulls(len(without), pa.string())])
+            ),
+        }
+    ).drop_duplicates(ignore_index=True)
+
+
+def deals_to_frame(deals: pa.Array) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "deal_id": to_column(get_field(deals, "id")),
+            "deal_name": to_column(get_field(deals, "properties", "dealname")),
+            "amount": to_amount(get_field(deals, "properties", "amount")),
+            "stage": to_column(get_field(deals, "properties", "dealstage")),
+            "created_at": to_datetime(get_field(deals, "properties", "createdate")),
+            "associated_company_id": to_column(
+                get_first_association_id(deals, "companies")
+            ),
+            "archived": to_archived(deals),
+        }
+    )
+
+
+def transform_deals(deals_data: List[HubSpotDealObject]) -> pd.DataFrame:
+    if not deals_data:
+        return pd.DataFrame(columns=DEALS_COLUMNS)
+
+    # pyarrow lee la lista de dicts en C++ y la deja en columnas tipadas
+    return deals_to_frame(pa.array(deals_data, type=DEAL_TYPE))
+
+
+def transform_deal_tables(deals_data: List[HubSpotDealObject]) -> Dict[str, pd.DataFrame]:
+    """DEALS y las tablas puente de sus asociaciones (DEAL_COMPANY, DEAL_CONTACT)."""
+    if not deals_data:
+        return {
+            "DEALS": pd.DataFrame(columns=DEALS_COLUMNS),
+            **{
+                table_name: pd.DataFrame(columns=["deal_id", column])
+                for table_name, (_, column) in deal_association_tables.items()
+            },
+        }
+
+    deals = pa.array(deals_data, type=DEAL_TYPE)
+    return {
+        "DEALS": deals_to_frame(deals),
+        **{
+            table_name: get_association_rows(deals, association, column)
+            for table_name, (association, column) in deal_association_tables.items()
+        },
+    }
+
+
+def transform_leads(leads_data: List[HubSpotContactObject]) -> pd.DataFrame:
+    if not leads_data:
+        return pd.DataFrame(columns=LEADS_COLUMNS)
+
+    leads = pa.array(leads_data, type=CONTACT_TYPE)
+
+    return pd.DataFrame(
+        {
+            "lead_id": to_column(get_field(leads, "id")),
+            "email": to_column(get_field(leads, "properties", "email")),
+            "first_name": to_column(get_field(leads, "properties", "firstname")),
+            "last_name": to_column(get_field(leads, "properties", "lastname")),
+            "status": to_column(
+                pc.fill_null(get_field(leads, "properties", "hs_lead_status"), "UNKNOWN")
+            ),
+            "created_at": to_datetime(get_field(leads, "properties", "createdate")),
+            "archived": to_archived(leads),
+        }
+    )
 
 
 def transform_data(
     deals_data: List[HubSpotDealObject], leads_data: List[HubSpotContactObject]
-) -> Tuple[pd.DataFrame, pd.DataFrame]:
+) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, pd.DataFrame]]:
+    """Devuelve DEALS, LEADS y las tablas puente de asociaciones de los deals."""
     print("Iniciando transformación...")
 
-    deals_list = []
-    for deal in deals_data:
-        props = deal["properties"]
-
-        assoc_company_id = None
-
-        try:
-            assoc_company_id = deal["associations"]["companies"]["results"][0]["id"]
-        except:
-            pass
-
-        deals_list.append(
-            {
-                "deal_id": deal["id"],
-                "deal_name": props.get("dealname"),
-                "amount": props.get("amount"),
-                "stage": props.get("dealstage"),
-                "created_at": props.get("createdate"),
-                "associated_company_id": assoc_company_id,
-            }
-        )
-
-    df_deals = pd.DataFrame(deals_list)
-
-    df_deals["amount"] = pd.to_numeric(df_deals["amount"]).fillna(0)
-    df_deals["created_at"] = pd.to_datetime(df_deals["created_at"])
-
-    leads_list = []
-    for lead in leads_data:
-        props = lead["properties"]
-        leads_list.append(
-            {
-                "lead_id": lead["id"],
-                "email": props.get("email"),
-                "first_name": props.get("firstname"),
-                "last_name": props.get("lastname"),
-                "status": props.get("hs_lead_status"),
-                "created_at": props.get("createdate"),
-            }
-        )
-    df_leads = pd.DataFrame(leads_list)
-
-    df_leads["created_at"] = pd.to_datetime(df_leads["created_at"])
-    df_leads["status"] = df_leads["status"].fillna("UNKNOWN")
+    deal_tables = transform_deal_tables(deals_data)
+    df_deals = deal_tables.pop("DEALS")
+    df_leads = transform_leads(leads_data)
 
     print("Transformación completa.")
-    return df_deals, df_leads
+    return df_deals, df_leads, deal_tables